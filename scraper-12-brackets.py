@@ -1,9 +1,16 @@
-import requests
-from bs4 import BeautifulSoup, Tag
+from bs4 import SoupStrainer, Tag
 from bs4.element import NavigableString
 from urllib.parse import urljoin
 import re
 
+from spider.clean import Cleaner
+from spider.cli import make_parser, setup
+from spider.fetch import FetchResult, fetch_many, print_report
+from spider.journal import CrawlJournal, iter_chapters
+from spider.page import Page, as_page
+from spider.profile import stage, timed
+from spider.writer import MarkdownWriter, ordered
+
 BASE_URL = "https://pages.uoregon.edu/fyin/%E7%81%B5%E7%B2%AE/%E5%8D%81%E4%BA%8C%E7%AF%AE/%E5%8D%81%E4%BA%8C%E7%AF%AE%20%E7%9B%AE%E5%BD%95.htm"
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36"
@@ -11,14 +18,25 @@ HEADERS = {
 
 CN_NUM = ["第一辑","第二辑","第三辑","第四辑","第五辑","第六辑","第七辑","第八辑","第九辑","第十辑","第十一辑","第十二辑"]
 
-def fetch_html(url: str) -> str:
-    r = requests.get(url, headers=HEADERS, timeout=25)
-    r.encoding = "gb18030"  # 该站点国标编码
-    return r.text
+def fetch_pages(urls: list[str]) -> list[Page]:
+    """并发抓取一批页面，按传入顺序返回"""
+    results = fetch_many(urls, headers=HEADERS, encoding="gb18030")  # 该站点国标编码
+    for r in results:
+        # 目录页抓不到就没法继续，不要把错误页当目录解析
+        r.raise_for_status()
+    return [Page.from_result(r) for r in results]
+
+def fetch_page(url: str) -> Page:
+    return fetch_pages([url])[0]
 
-def extract_main_links(html: str, base_url: str) -> list[str]:
+# 各抽取函数只解析自己需要的子树；找不到时 Page.region 会退回整页解析
+TOC_TABLE = SoupStrainer(id="table3")
+SUB_TOC_CELL = SoupStrainer("td", attrs={"colspan": ["5", "4"]})
+PARAGRAPHS = SoupStrainer("p")
+
+def extract_main_links(page: Page | str, base_url: str) -> list[str]:
     """目录页：提取 12 个一级链接（注意你此前的 1:14 切片修正）"""
-    soup = BeautifulSoup(html, "html.parser")
+    soup = as_page(page).region(TOC_TABLE)
     table3 = soup.find(id="table3")
     if not table3:
         table3 = soup.select_one('#table3, a[name="table3"], [name="table3"]')
@@ -31,9 +49,9 @@ def extract_main_links(html: str, base_url: str) -> list[str]:
     anchors = anchors[1:14]  # 你修过的范围
     return [urljoin(base_url, str(a["href"])) for a in anchors]
 
-def extract_sub_anchors(html: str):
+def extract_sub_anchors(page: Page | str):
     """子页：返回 12 个 <a> 标签（对象），用于拿标题文本和链接"""
-    soup = BeautifulSoup(html, "html.parser")
+    soup = as_page(page).region(SUB_TOC_CELL)
     td = soup.find("td", attrs={"colspan": "5"})
     if not td:
         td = soup.find("td", attrs={"colspan": "4"})
@@ -52,10 +70,9 @@ def anchor_title_after_dunhao(text: str) -> str:
         return cand or t
     return t
 
-def third_p_to_markdown(html: str) -> str:
+def third_p_to_markdown(page: Page | str) -> str:
     """取第三个 <p>，把里面的 <b> 转成 #### 标题；其他按纯文本处理，<br> 转换为换行。"""
-    soup = BeautifulSoup(html, "html.parser")
-    p_list = soup.find_all("p")
+    p_list = as_page(page).region(PARAGRAPHS).find_all("p")
 
     # 选择“可见文本长度”最大的 <p> 作为正文段落；把 <br> 当作换行
     candidates = [p for p in p_list if p.get_text(strip=True)]
@@ -70,6 +87,7 @@ def third_p_to_markdown(html: str) -> str:
     lines = []
     buf = []
 
+    @timed("normalize")
     def flush_buf_as_text():
         text = "".join(buf)
         if not text:
@@ -112,58 +130,73 @@ def third_p_to_markdown(html: str) -> str:
     flush_buf_as_text()
 
     # 规范化：把多余空行压缩为两行
-    md = "\n\n".join([s.strip() for s in lines if s is not None])
-    md = re.sub(r"\n{3,}", "\n\n", md).strip()
+    with stage("normalize"):
+        md = "\n\n".join([s.strip() for s in lines if s is not None])
+        md = re.sub(r"\n{3,}", "\n\n", md).strip()
     return md
 
-def build_book_markdown() -> str:
-    html_main = fetch_html(BASE_URL)
-    main_links = extract_main_links(html_main, BASE_URL)
+def chapter_from_result(result: FetchResult) -> str:
+    """抽取一个章节页（模块级函数，可以交给 --workers 的抽取进程）"""
+    return third_p_to_markdown(Page.from_result(result))
+
+def build_book_markdown(out, journal: CrawlJournal | None = None, clean: Cleaner | None = None) -> None:
+    """抓取整本书，按目录顺序边抓边写入 out（文件路径或文本流）；给了 clean 就边写边清洗"""
+    main_links = extract_main_links(fetch_page(BASE_URL), BASE_URL)
     if len(main_links) != 12:
         print(f"⚠️ 一级链接数量={len(main_links)}（预期 12），将按实际处理。")
 
-    out = []
-    out.append("# 十二篮\n")
-
-    for vol_idx, vol_url in enumerate(main_links, start=1):
-        vol_name = CN_NUM[vol_idx - 1] if vol_idx - 1 < len(CN_NUM) else f"第{vol_idx}辑"
-        out.append(f"## {vol_name}\n")
-
-        sub_html = fetch_html(vol_url)
-        anchors = extract_sub_anchors(sub_html)
-
+    # 先并发抓取所有分卷页，收集每卷的 (标题, 链接)
+    volumes: list[list[tuple[str, str]]] = []
+    for vol_url, sub_page in zip(main_links, fetch_pages(main_links)):
+        entries = []
         # 若不足 12 个锚点，按实际数量写
-        for a in anchors:
+        for a in extract_sub_anchors(sub_page):
             if not isinstance(a, Tag):
                 continue
             title_full = a.get_text(" ", strip=True)
             title = anchor_title_after_dunhao(title_full) or title_full
             href = a.get("href")
             if href:
-                link = urljoin(vol_url, str(href))
-            else:
-                continue
-
-            # 抓内容页的第三个 <p>
-            page_html = fetch_html(link)
-            body_md = third_p_to_markdown(page_html)
-
-            # 写入一个条目
-            out.append(f"### {title}\n")
-            # 可在标题下放原文链接（可选）
-            out.append(f"[原文链接]({link})\n")
-            if body_md:
-                out.append(body_md + "\n")
-            else:
-                out.append("_（本条未检测到第三个段落或内容为空）_\n")
-
-        # 分卷之间加一行
-        out.append("")
-
-    return "\n".join(out).strip() + "\n"
+                entries.append((title, urljoin(vol_url, str(href))))
+        volumes.append(entries)
+
+    # 再一次性提交全部内容页，按目录顺序逐篇取回；抓取日志里已完成的条目不再抓取
+    all_links = [link for entries in volumes for _, link in entries]
+    bodies = ordered(iter_chapters(
+        all_links, chapter_from_result, journal,
+        headers=HEADERS, encoding="gb18030",
+    ))
+
+    with MarkdownWriter(out, clean=clean) as writer:
+        writer.write("# 十二篮\n")
+
+        for vol_idx, entries in enumerate(volumes, start=1):
+            vol_name = CN_NUM[vol_idx - 1] if vol_idx - 1 < len(CN_NUM) else f"第{vol_idx}辑"
+            writer.write(f"## {vol_name}\n")
+
+            for title, link in entries:
+                # 内容页的第三个 <p>
+                body_md = next(bodies)
+
+                # 写入一个条目
+                writer.write(f"### {title}\n")
+                # 可在标题下放原文链接（可选）
+                writer.write(f"[原文链接]({link})\n")
+                if body_md:
+                    writer.write(body_md + "\n")
+                else:
+                    writer.write("_（本条未检测到第三个段落或内容为空）_\n")
+
+            # 分卷之间加一行
+            writer.write("")
 
 if __name__ == "__main__":
-    md = build_book_markdown()
-    with open("十二篮.md", "w", encoding="utf-8") as f:
-        f.write(md)
-    print("✅ 已生成：十二篮.md")
\ No newline at end of file
+    ap = make_parser("抓取《十二篮》并生成 Markdown")
+    ap.add_argument("--clean", action="store_true",
+                    help="写出时直接做 clean_12-brackets.py 的清洗，不必再跑一遍")
+    args = ap.parse_args()
+    if args.base_url:
+        BASE_URL = args.base_url
+    build_book_markdown("十二篮.md", journal=setup(args, "十二篮"), clean=Cleaner() if args.clean else None)
+    print("✅ 已生成：十二篮.md")
+    print_report()
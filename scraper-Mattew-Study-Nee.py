@@ -1,8 +1,13 @@
-import requests
-from bs4 import BeautifulSoup, Tag
+import re
+
+from bs4 import SoupStrainer, Tag
 from urllib.parse import urljoin
-import time
-import random
+
+from spider.cli import make_parser, setup
+from spider.fetch import FetchResult, fetch_one, print_report
+from spider.journal import CrawlJournal, iter_chapters
+from spider.page import Page, as_page
+from spider.writer import MarkdownWriter, ordered
 
 BASE_URL = "http://lightinnj.org/%E5%80%AA%E6%9F%9D%E8%81%B2%E6%96%87%E9%9B%86/%E5%80%AA%E6%9F%9D%E8%81%B2%E6%96%87%E9%9B%86%E7%AC%AC%E4%B8%80%E8%BE%91/15%E9%A9%AC%E5%A4%AA%E7%A6%8F%E9%9F%B3%E6%9F%A5%E7%BB%8F%E8%AE%B0%E5%BD%95/%E9%A9%AC%E5%A4%AA%E7%A6%8F%E9%9F%B3%E6%9F%A5%E7%BB%8F%E8%AE%B0%E5%BD%95%E7%9B%AE%E5%BD%95.htm"
 HEADERS = {
@@ -11,49 +16,49 @@ HEADERS = {
     "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8",
 }
 
-def fetch_html(url: str, encoding: str = "gb18030") -> str:
-    """Fetch HTML with proper encoding and polite delay"""
-    try:
-        r = requests.get(url, headers=HEADERS, timeout=20)
-        r.encoding = encoding
-        time.sleep(random.uniform(0.5, 1.2))  # Polite crawling
-        return r.text
-    except Exception as e:
-        print(f"❌ Failed to fetch {url}: {e}")
+PARAGRAPHS = SoupStrainer("p")
+
+def page_html(result: FetchResult) -> str:
+    """HTML of a fetched page; failed pages (network errors and error statuses) come back as an empty string"""
+    if not result.ok:
+        print(f"❌ Failed to fetch {result.url}: {result.error or result.status}")
         return ""
+    return result.text
+
+def fetch_page(url: str, encoding: str = "gb18030") -> Page:
+    """Fetch a page with proper encoding"""
+    return Page(page_html(fetch_one(url, headers=HEADERS, encoding=encoding)), url)
 
-def extract_chapter_links(html: str, base_url: str) -> list[tuple[str, str]]:
+def extract_chapter_links(page: Page | str, base_url: str) -> list[tuple[str, str]]:
     """Extract chapter links from the table of contents
     Returns: list of (chapter_title, chapter_url)
     """
-    soup = BeautifulSoup(html, "html.parser")
     chapters = []
 
     # Find all links that contain "第" and "章"
-    for a in soup.find_all("a", href=True):
-        text = a.get_text(strip=True)
-        if "第" in text and "章" in text:
-            href = a.get("href")
-            if href and not href.startswith("#"):
-                full_url = urljoin(base_url, href)
-                chapters.append((text, full_url))
+    for link in as_page(page).links:
+        if "第" in link.text and "章" in link.text:
+            if link.href and not link.href.startswith("#"):
+                full_url = urljoin(base_url, link.href)
+                chapters.append((link.text, full_url))
 
     return chapters
 
-def extract_content(html: str) -> str:
+def extract_content(page: Page | str) -> str:
     """Extract the third <p> tag content from the nested table structure
     Structure: html>body>div>table>tbody>tr>td>table>tbody>tr>td>p[2] (third p)
     """
-    if not html:
+    page = as_page(page)
+    if not page.html:
         return ""
 
-    soup = BeautifulSoup(html, "html.parser")
-
-    # Navigate through the nested structure
-    body = soup.find("body")
-    if not body:
+    # Only a page with a <body> has content; checked on the raw HTML since
+    # the tree below holds nothing but the <p> subtrees
+    if not re.search(r"<body[\s>]", page.html, re.I):
         return ""
 
+    soup = page.region(PARAGRAPHS)
+
     # Find the main content div/table structure
     # Try to find all <p> tags and get the third one with substantial content
     all_ps = soup.find_all("p")
@@ -84,50 +89,62 @@ def extract_content(html: str) -> str:
 
     return "\n\n".join(lines)
 
-def build_matthew_study_markdown() -> str:
-    """Main function to scrape all chapters and build markdown"""
+def chapter_from_result(result: FetchResult) -> str:
+    """extract_content for a fetched chapter (module-level, so --workers can pickle it)"""
+    return extract_content(Page(page_html(result), result.url))
+
+def build_matthew_study_markdown(out, journal: CrawlJournal | None = None) -> bool:
+    """Main function to scrape all chapters and stream markdown to ``out``
+
+    Returns False (and writes nothing) if the table of contents can't be fetched.
+    """
     print("📖 开始抓取马太福音查经记录...")
 
     # Fetch table of contents
     print(f"📥 Fetching table of contents: {BASE_URL}")
-    toc_html = fetch_html(BASE_URL)
-    if not toc_html:
+    toc = fetch_page(BASE_URL)
+    if not toc.html:
         print("❌ Failed to fetch table of contents")
-        return ""
+        return False
 
     # Extract chapter links
-    chapters = extract_chapter_links(toc_html, BASE_URL)
+    chapters = extract_chapter_links(toc, BASE_URL)
     print(f"✅ Found {len(chapters)} chapters")
 
-    # Build markdown
-    md_lines = ["# 马太福音查经记录\n"]
+    # Fetch all chapters concurrently, results are released in TOC order
+    print(f"📥 Fetching {len(chapters)} chapters")
+    contents = ordered(iter_chapters(
+        [url for _, url in chapters], chapter_from_result, journal,
+        headers=HEADERS, encoding="gb18030",
+    ))
 
-    for idx, (title, url) in enumerate(chapters, start=1):
-        print(f"📥 Fetching chapter {idx}/{len(chapters)}: {title}")
+    # Build markdown
+    with MarkdownWriter(out) as writer:
+        writer.write("# 马太福音查经记录\n")
 
-        # Fetch chapter content
-        chapter_html = fetch_html(url)
-        content = extract_content(chapter_html)
+        for idx, ((title, url), content) in enumerate(zip(chapters, contents), start=1):
+            print(f"📄 Chapter {idx}/{len(chapters)}: {title}")
 
-        # Add to markdown
-        md_lines.append(f"## {title}\n")
-        if content:
-            md_lines.append(content + "\n")
-        else:
-            md_lines.append("_（本章未检测到内容）_\n")
-            print("❗️ empty content detected")
+            # Add to markdown
+            writer.write(f"## {title}\n")
+            if content:
+                writer.write(content + "\n")
+            else:
+                writer.write("_（本章未检测到内容）_\n")
+                print("❗️ empty content detected")
 
-        md_lines.append("")  # Blank line between chapters
+            writer.write("")  # Blank line between chapters
 
-    return "\n".join(md_lines).strip() + "\n"
+    return True
 
 if __name__ == "__main__":
-    markdown_content = build_matthew_study_markdown()
+    args = make_parser("Scrape 马太福音查经记录 into Markdown").parse_args()
+    if args.base_url:
+        BASE_URL = args.base_url
+    output_file = "马太福音查经记录.md"
 
-    if markdown_content:
-        output_file = "马太福音查经记录.md"
-        with open(output_file, "w", encoding="utf-8") as f:
-            f.write(markdown_content)
+    if build_matthew_study_markdown(output_file, journal=setup(args, "马太福音查经记录")):
         print(f"✅ 已生成：{output_file}")
     else:
-        print("❌ 生成失败")
\ No newline at end of file
+        print("❌ 生成失败")
+    print_report()
@@ -1,10 +1,14 @@
-import requests
-from bs4 import BeautifulSoup, Tag
+from bs4 import SoupStrainer, Tag
 from bs4.element import NavigableString
 from urllib.parse import urljoin
 import re
-import time
-import random
+
+from spider.cli import make_parser, setup
+from spider.fetch import FetchResult, fetch_one, print_report
+from spider.journal import CrawlJournal, iter_chapters
+from spider.page import Page, as_page
+from spider.parse import has_class
+from spider.writer import MarkdownWriter, ordered
 
 BASE_URL = "https://ezoe.work/books/3/3007.html"
 BASE_PATH = "https://ezoe.work/books/3/3007"
@@ -12,51 +16,43 @@ HEADERS = {
     "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36"
 }
 
+# 章节页只解析标题和正文容器（两个抽取步骤共用这一棵树）；
+# 缺少时才用整页（#c、全文搜索）
+CHAPTER_PARTS = SoupStrainer("div", class_=has_class("feature-title", "main"))
+
 def fetch_html(url: str) -> str:
     """Fetch HTML and handle encoding"""
-    r = requests.get(url, headers=HEADERS, timeout=25)
-    r.encoding = "utf-8"
-    # Polite delay to avoid overwhelming the server
-    time.sleep(random.uniform(0.5, 1.5))
-    return r.text
+    # Politeness and retries are handled by spider.fetch; error pages are not content
+    result = fetch_one(url, headers=HEADERS, encoding="utf-8")
+    result.raise_for_status()
+    return result.text
 
-def extract_chapters_from_index(html: str) -> list[tuple[str, str]]:
+def extract_chapters_from_index(page: Page | str) -> list[tuple[str, str]]:
     """Extract chapter titles and links from the index page (3007.html)
 
     Returns list of tuples: (chapter_title, chapter_url)
     """
-    soup = BeautifulSoup(html, "html.parser")
+    page = as_page(page)
     chapters = []
 
     # Find all links in the page
-    anchors = soup.find_all("a", href=True)
-
-    for a in anchors:
-        if not isinstance(a, Tag):
-            continue
-        href_raw = a.get("href", "")
-        if isinstance(href_raw, list):
-            # If BeautifulSoup returns a list (e.g., AttributeValueList), join its parts
-            href = ' '.join(href_raw)
-        else:
-            # Otherwise, it's a string, so just use it
-            href = href_raw
-        href = href.strip()
-        text = a.get_text(strip=True)
+    for link in page.links:
+        href = link.href.strip()
 
         # Look for links matching pattern 3007-1.html, 3007-2.html, etc.
         if href and re.match(r"3007-\d+\.html", href):
             full_url = urljoin(BASE_URL, href)
-            chapters.append((text, full_url))
+            chapters.append((link.text, full_url))
 
     return chapters
 
-def extract_section_heading_from_start(html: str) -> str:
+def extract_section_heading_from_start(page: Page | str) -> str:
     """Extract the main chapter title (e.g., '教会里的职分') without the 第X篇 prefix
 
     This appears at the beginning of each chapter page after navigation.
     """
-    soup = BeautifulSoup(html, 'html.parser')
+    page = as_page(page)
+    soup = page.region(CHAPTER_PARTS)
 
     # Find the feature-title div which contains the chapter heading
     feature_title = soup.find('div', class_='feature-title')
@@ -67,14 +63,13 @@ def extract_section_heading_from_start(html: str) -> str:
         return text.strip()
 
     # Fallback: search in all text
-    text_content = soup.get_text()
-    match = re.search(r'第[^篇]+篇\s*([^\n]+)', text_content)
+    match = re.search(r'第[^篇]+篇\s*([^\n]+)', page.text)
     if match:
         return match.group(1).strip()
 
     return ""
 
-def extract_page_content(html: str) -> str:
+def extract_page_content(page: Page | str) -> str:
     """Extract main content from a chapter page.
 
     Converts HTML structure to Markdown:
@@ -84,13 +79,13 @@ def extract_page_content(html: str) -> str:
     - Plain <div> or <div class='cont'> contain the content paragraphs
     - Preserves paragraph breaks
     """
-    soup = BeautifulSoup(html, "html.parser")
+    page = as_page(page)
 
     # Find the main content container
-    main_div = soup.find('div', class_='main')
+    main_div = page.region(CHAPTER_PARTS).find('div', class_='main')
     if not main_div:
         # Fallback to id='c' if main div not found
-        main_div = soup.find(id='c')
+        main_div = page.soup.find(id='c')
 
     if not main_div:
         return ""
@@ -190,46 +185,62 @@ def extract_page_content(html: str) -> str:
 
     return md
 
-def build_book_markdown() -> str:
-    """Build the complete markdown book"""
-    print("📖 Fetching index page...")
-    html_index = fetch_html(BASE_URL)
-    chapters = extract_chapters_from_index(html_index)
+def chapter_to_markdown(page: Page | str) -> str:
+    """Section heading plus converted content of one chapter page"""
+    page = as_page(page)
+    parts = []
 
-    print(f"✅ Found {len(chapters)} chapters")
+    # Extract section heading
+    section_heading = extract_section_heading_from_start(page)
+    if section_heading:
+        parts.append(f"## {section_heading}\n")
+
+    # Extract main content
+    content = extract_page_content(page)
+    if content:
+        parts.append(content + "\n")
 
-    out = []
-    out.append("# 教会的事务\n")
+    return "\n".join(parts)
 
-    for idx, (chapter_title, chapter_url) in enumerate(chapters, start=1):
-        print(f"📄 Processing chapter {idx}/{len(chapters)}: {chapter_title}")
+def chapter_from_result(result: FetchResult) -> str:
+    """chapter_to_markdown for a fetched page (module-level, so --workers can pickle it)"""
+    return chapter_to_markdown(Page.from_result(result))
 
-        # Fetch chapter page
-        chapter_html = fetch_html(chapter_url)
+def build_book_markdown(out, journal: CrawlJournal | None = None) -> None:
+    """Build the complete markdown book, streaming it to ``out`` (path or text stream)"""
+    print("📖 Fetching index page...")
+    chapters = extract_chapters_from_index(Page(fetch_html(BASE_URL), BASE_URL))
+
+    print(f"✅ Found {len(chapters)} chapters")
 
-        # Extract section heading
-        section_heading = extract_section_heading_from_start(chapter_html)
-        if section_heading:
-            out.append(f"## {section_heading}\n")
+    # Submit every chapter page at once (chapters finished in the journal are reused);
+    # they come back in TOC order as soon as each one is ready
+    chapter_mds = ordered(iter_chapters(
+        [url for _, url in chapters], chapter_from_result, journal,
+        headers=HEADERS, encoding="utf-8",
+    ))
 
-        # Extract main content
-        content = extract_page_content(chapter_html)
+    with MarkdownWriter(out) as writer:
+        writer.write("# 教会的事务\n")
 
-        if content:
-            out.append(content + "\n")
+        for idx, ((chapter_title, chapter_url), chapter_md) in enumerate(zip(chapters, chapter_mds), start=1):
+            print(f"📄 Processing chapter {idx}/{len(chapters)}: {chapter_title}")
 
-        # Add link to original
-        out.append(f"[原文链接]({chapter_url})\n")
-        out.append("")
+            if chapter_md:
+                writer.write(chapter_md)
 
-    return "\n".join(out).strip() + "\n"
+            # Add link to original
+            writer.write(f"[原文链接]({chapter_url})\n")
+            writer.write("")
 
 if __name__ == "__main__":
+    args = make_parser("Scrape '教会的事务' into Markdown").parse_args()
+    if args.base_url:
+        BASE_URL = args.base_url
     print("🚀 Starting scraper for '教会的事务'...\n")
-    md = build_book_markdown()
 
     output_file = "教会的事务.md"
-    with open(output_file, "w", encoding="utf-8") as f:
-        f.write(md)
+    build_book_markdown(output_file, journal=setup(args, "教会的事务"))
 
     print(f"\n✅ Successfully generated: {output_file}")
+    print_report()
@@ -1,73 +1,73 @@
-import requests
-from bs4 import BeautifulSoup, Tag
-import time
-import random
+from bs4 import SoupStrainer, Tag
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Iterable
+from urllib.parse import unquote, urlencode
+import json
 import re
 
-# Use a Session with a real User-Agent and polite headers to avoid 403
-session = requests.Session()
-session.headers.update({
+from spider.cli import make_parser, setup
+from spider.fetch import FetchResult, fetch_many, print_report
+from spider.journal import CrawlJournal, iter_chapters
+from spider.page import Page, as_page
+from spider.verses import VerseStoreWriter
+from spider.writer import MarkdownWriter, ordered
+
+# Use a real User-Agent and polite headers to avoid 403
+HEADERS = {
     "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36 BibleScraper/0.1 (+https://github.com/XavierOwen)",
     "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
     "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8",
     "Referer": "https://zh.wikisource.org/",
     "Connection": "keep-alive",
-})
-
-def fetch(url: str, min_delay: float = 0.8, max_delay: float = 1.6):
-    """GET with session, basic retry, and polite delay to reduce 403 risk."""
-    tries = 3
-    last_exc = None
-    for attempt in range(tries):
-        try:
-            resp = session.get(url, timeout=20)
-            if resp.status_code == 200:
-                # Wikisource is UTF-8
-                resp.encoding = "utf-8"
-                # polite delay between requests
-                time.sleep(random.uniform(min_delay, max_delay))
-                return resp
-            elif resp.status_code in (403, 429):
-                # Backoff and retry
-                time.sleep(1.5 * (attempt + 1))
-            else:
-                # Small delay then retry for transient errors
-                time.sleep(0.8)
-        except Exception as e:
-            last_exc = e
-            time.sleep(0.8)
-    # If all retries failed, raise for visibility
-    if last_exc:
-        raise last_exc
-    raise RuntimeError(f"Failed to fetch {url} after {tries} attempts")
-
-url = "https://zh.wikisource.org/zh-hans/%E8%81%96%E7%B6%93_(%E6%96%87%E7%90%86%E5%92%8C%E5%90%88)"
-# Fetch the page
-response = fetch(url)
-soup = BeautifulSoup(response.text, 'html.parser')
-
-# Filtered extraction
-book_titles_s = []
-for li in soup.find_all("li"):
-    a_tag = li.find("a")
-    if a_tag and a_tag.has_attr("href"):
-        if a_tag["href"].startswith("/wiki/%E8%81%96%E7%B6%93") or \
-           a_tag["href"].startswith("https://zh.wikisource.org/wiki/%E8%81%96%E7%B6%93"):
-            book_titles_s.append(a_tag.get_text(strip=True))
-
-book_titles_s = book_titles_s[3:]
-
-# Container for extracted content
-results = []
-
-for i, book_title in enumerate(book_titles):
-    #chapter_title = "#" + book_titles_s[i]
-    results.append(f"# {book_titles_s[i]}")
-    url = "https://zh.wikisource.org/zh-hans/%E8%81%96%E7%B6%93_(%E6%96%87%E7%90%86%E5%92%8C%E5%90%88)/"+book_title
-    response = fetch(url)
-    soup = BeautifulSoup(response.text, 'html.parser')
+}
+
+BASE_URL = "https://zh.wikisource.org/zh-hans/%E8%81%96%E7%B6%93_(%E6%96%87%E7%90%86%E5%92%8C%E5%90%88)"
+
+# 每次 API 请求解析几卷书；一次解析展开的内容有上限（post-expand include size，2 MB），
+# 诗篇一卷就有几百 KB，不宜再大
+BATCH_SIZE = 5
+# 分隔同一次请求里的各卷书
+BOOK_BREAK = '<div class="spider-book-break"></div>'
+
+# 目录页只看列表项，经文页只有章标题和节段落有用
+LIST_ITEMS = SoupStrainer("li")
+BOOK_PARTS = SoupStrainer(["h2", "p"])
+
+def fetch_all(urls: list[str]) -> list[FetchResult]:
+    """Concurrent GET; retries and 403/429 Retry-After are handled by spider.fetch."""
+    # Wikisource is UTF-8
+    results = fetch_many(urls, headers=HEADERS, encoding="utf-8")
+    for resp in results:
+        # If all retries failed, raise for visibility
+        resp.raise_for_status()
+    return results
+
+def fetch(url: str) -> FetchResult:
+    return fetch_all([url])[0]
+
+def extract_book_titles(page: Page | str) -> list[tuple[str, str]]:
+    """Return (display title, subpage name) for every book linked from the index."""
+    soup = as_page(page).region(LIST_ITEMS)
+
+    # Filtered extraction
+    books = []
+    for li in soup.find_all("li"):
+        a_tag = li.find("a")
+        if a_tag and a_tag.has_attr("href"):
+            if a_tag["href"].startswith("/wiki/%E8%81%96%E7%B6%93") or \
+               a_tag["href"].startswith("https://zh.wikisource.org/wiki/%E8%81%96%E7%B6%93"):
+                subpage = unquote(a_tag["href"]).rsplit("/", 1)[-1]
+                books.append((a_tag.get_text(strip=True), subpage))
+
+    return books[3:]
+
+def extract_book(page: Page | str) -> list[str]:
+    """Convert one book page into Markdown lines (## chapters + numbered verses)."""
+    results = []
+    soup = as_page(page).region(BOOK_PARTS)
     # Walk through elements in document order
-    for elem in soup.body.descendants:
+    for elem in soup.descendants:
         if isinstance(elem, Tag):
             # Handle headings
             if elem.name == 'h2':
@@ -108,11 +108,108 @@ for i, book_title in enumerate(book_titles):
                         if text.endswith("、○"):
                             text = text[:-2] + "。"
                         results.append(text)
-    results.append('\n')
+    return results
+
+def book_to_markdown(response: FetchResult) -> str:
+    # Books that failed after all retries never get here; they are listed by print_report
+    return "\n".join(extract_book(Page.from_result(response)))
+
+# ---- MediaWiki API ------------------------------------------------------
+# BASE_URL 形如 https://zh.wikisource.org/zh-hans/<目录页>：
+# API 在同一站点的 /w/api.php，路径里的 zh-hans 是繁简转换的变体
+
+def api_url(**params: str) -> str:
+    head, variant, title = BASE_URL.rsplit("/", 2)
+    params = {"action": "parse", **params, "variant": variant,
+              "format": "json", "formatversion": "2", "disablelimitreport": "1"}
+    return f"{head}/w/api.php?{urlencode(params)}"
+
+def index_title() -> str:
+    return unquote(BASE_URL.rsplit("/", 1)[-1]).replace("_", " ")
+
+def parsed_html(response: FetchResult) -> str:
+    """The ``parse.text`` of an ``action=parse`` response (the page content, no skin)."""
+    data = json.loads(response.text)
+    if "error" in data:
+        raise RuntimeError(f"MediaWiki API error for {response.url}: {data['error'].get('code')}: {data['error'].get('info')}")
+    return data["parse"]["text"]
+
+def index_url() -> str:
+    return api_url(page=index_title(), prop="text", disableeditsection="1")
+
+def batch_url(subpages: list[str]) -> str:
+    """One ``action=parse`` request that renders several books, separated by ``BOOK_BREAK``."""
+    text = "".join(f"{BOOK_BREAK}\n{{{{:{index_title()}/{subpage}}}}}\n" for subpage in subpages)
+    return api_url(title=index_title(), text=text, contentmodel="wikitext", prop="text",
+                   disableeditsection="1", disabletoc="1")
+
+def batch_to_markdown(response: FetchResult) -> str:
+    """Markdown of every book in one batch, as a JSON list (one journal entry per request)."""
+    pieces = parsed_html(response).split(BOOK_BREAK)[1:]
+    return json.dumps(["\n".join(extract_book(Page(piece, BASE_URL))) for piece in pieces], ensure_ascii=False)
+
+def build_book_markdown(out, journal: CrawlJournal | None = None, api: bool = True,
+                        batch_size: int = BATCH_SIZE, verses: str | Path | None = None) -> None:
+    """Stream the whole Bible to ``out`` (path or text stream), one book at a time.
+
+    With ``api`` (the default) the index and the books come from the MediaWiki
+    API, ``batch_size`` books per request and only their content; otherwise
+    every book page is fetched and scraped whole. With ``verses`` every
+    numbered verse also goes to a ``spider.verses`` store at that path.
+    """
+    if not api:
+        build_from_pages(out, journal, verses)
+        return
+    books = extract_book_titles(Page(parsed_html(fetch(index_url())), BASE_URL))
+    batches = [books[i:i + batch_size] for i in range(0, len(books), batch_size)]
+
+    batch_mds = ordered(iter_chapters(
+        [batch_url([subpage for _, subpage in batch]) for batch in batches], batch_to_markdown, journal,
+        headers=HEADERS, encoding="utf-8",
+    ))
+
+    def books_in_order():
+        for batch, batch_md in zip(batches, batch_mds):
+            # 抓取失败的一批为空串，这几卷只留书名（见 print_report）
+            book_mds = json.loads(batch_md) if batch_md else []
+            for i, (book_title, subpage) in enumerate(batch):
+                yield book_title, subpage, book_mds[i] if i < len(book_mds) else ""
+
+    write_books(out, books_in_order(), verses)
+
+def build_from_pages(out, journal: CrawlJournal | None = None, verses: str | Path | None = None) -> None:
+    """``build_book_markdown`` from the rendered index and book pages (one request per book)."""
+    books = extract_book_titles(Page.from_result(fetch(BASE_URL)))
+
+    # Submit every book page at once; books are written in canon order as they arrive
+    book_mds = ordered(iter_chapters(
+        [f"{BASE_URL}/{subpage}" for _, subpage in books], book_to_markdown, journal,
+        headers=HEADERS, encoding="utf-8",
+    ))
+
+    write_books(out, ((title, subpage, md) for (title, subpage), md in zip(books, book_mds)), verses)
 
-text_output = "\n".join(results)
-#print(text_output)
+def write_books(out, books: Iterable[tuple[str, str, str]], verses: str | Path | None = None) -> None:
+    """Write ``(title, subpage, markdown)`` books to ``out`` and, with ``verses``, the verse store."""
+    with MarkdownWriter(out, trim=False) as writer, \
+            (VerseStoreWriter(verses) if verses else nullcontext()) as store:
+        for book_title, subpage, book_md in books:
+            writer.write(f"# {book_title}")
+            if book_md:
+                writer.write(book_md)
+            writer.write('\n')
+            if store is not None:
+                store.add_markdown(book_title, subpage, book_md)
 
-# Optionally write to file
-with open("bible.md", "w", encoding="utf-8") as f:
-    f.write(text_output)
+if __name__ == "__main__":
+    ap = make_parser("Scrape the High Wenli Union Bible from Wikisource into Markdown")
+    ap.add_argument("--pages", action="store_true",
+                    help="scrape the rendered book pages instead of using the MediaWiki API")
+    ap.add_argument("--batch", type=int, default=BATCH_SIZE, metavar="N",
+                    help=f"books per MediaWiki API request (default: {BATCH_SIZE})")
+    args = ap.parse_args()
+    if args.base_url:
+        BASE_URL = args.base_url
+    build_book_markdown("bible.md", journal=setup(args, "bible"), api=not args.pages, batch_size=args.batch,
+                        verses="bible.verses")
+    print_report()
@@ -1,9 +1,17 @@
-import requests
-from bs4 import BeautifulSoup
+from functools import partial
 from urllib.parse import urljoin
-import time
+
+from bs4 import SoupStrainer
+
+from spider.cli import make_parser, setup
+from spider.fetch import FetchResult, print_report
+from spider.journal import iter_chapters
+from spider.page import Page
+from spider.writer import MarkdownWriter, ordered
 
 BASE_URL = "https://www.newadvent.org/"
+# 文章页只需要标题和段落
+ARTICLE_PARTS = SoupStrainer(["h1", "p"])
 
 def html_to_markdown(paragraph, base_url):
     # 替换斜体
@@ -27,42 +35,45 @@ def html_to_markdown(paragraph, base_url):
         a_tag.replace_with(f"[{text}]({full_url})")
     return paragraph.get_text(strip=False)
 
-def fetch_all_to_one_md(start=1, end=124, output_file='fathers.md'):
-    all_md_lines = []
+def article_to_markdown(page, fallback_title):
+    soup = page.region(ARTICLE_PARTS)
+    md_lines = []
 
-    for i in range(start, end + 1):
-        page_url = f"https://www.newadvent.org/fathers/1701{i:03d}.htm"
-        print(f"📥 Fetching: {page_url}")
-        try:
-            response = requests.get(page_url)
-            response.raise_for_status()
-        except requests.RequestException as e:
-            print(f"❌ Failed to fetch {page_url}: {e}")
-            continue
+    # 提取 <h1> 标题
+    title_tag = soup.find('h1')
+    title = title_tag.get_text(strip=True) if title_tag else fallback_title
+    md_lines.append(f"## {title}")
 
-        soup = BeautifulSoup(response.text, 'html.parser')
+    # 提取 <p> 并跳过第一个
+    paragraphs = soup.find_all('p')
+    for p in paragraphs[1:]:
+        md_line = html_to_markdown(p, base_url=page.url)
+        if md_line.strip():
+            md_lines.append(md_line)
 
-        # 提取 <h1> 标题
-        title_tag = soup.find('h1')
-        title = title_tag.get_text(strip=True) if title_tag else f"Article {i}"
-        all_md_lines.append(f"## {title}")
+    # 分隔线
+    md_lines.append("\n---\n")
+    return '\n\n'.join(md_lines)
 
-        # 提取 <p> 并跳过第一个
-        paragraphs = soup.find_all('p')
-        for p in paragraphs[1:]:
-            md_line = html_to_markdown(p, base_url=page_url)
-            if md_line.strip():
-                all_md_lines.append(md_line)
+def article_from_result(response: FetchResult, numbers: dict[str, int]) -> str:
+    # 抓取失败的页面不会交给抽取函数，运行结束时由 print_report 列出
+    return article_to_markdown(Page.from_result(response), f"Article {numbers[response.url]}")
 
-        # 分隔线
-        all_md_lines.append("\n---\n")
-        time.sleep(5)
+def fetch_all_to_one_md(start=1, end=124, output_file='fathers.md', journal=None):
+    page_urls = [urljoin(BASE_URL, f"fathers/1701{i:03d}.htm") for i in range(start, end + 1)]
+    numbers = dict(zip(page_urls, range(start, end + 1)))
+    print(f"📥 Fetching {len(page_urls)} pages from {BASE_URL}")
 
-    # 写入 Markdown 文件
-    with open(output_file, 'w', encoding='utf-8') as f:
-        f.write('\n\n'.join(all_md_lines))
+    # 抓取日志中已完成的页面直接复用，失败的页面跳过；按顺序边抓边写入 Markdown 文件
+    articles = ordered(iter_chapters(page_urls, partial(article_from_result, numbers=numbers), journal))
+    with MarkdownWriter(output_file, joiner='\n\n', trim=False) as writer:
+        writer.writelines(md for md in articles if md)
 
     print(f"\n✅ All {end-start+1} articles saved to '{output_file}'.")
 
 if __name__ == '__main__':
-    fetch_all_to_one_md()
\ No newline at end of file
+    args = make_parser("Scrape St. Augustine's Lectures on the Gospel of John into Markdown").parse_args()
+    if args.base_url:
+        BASE_URL = args.base_url
+    fetch_all_to_one_md(journal=setup(args, "fathers"))
+    print_report()
@@ -1,34 +1,37 @@
-import requests
-from bs4 import BeautifulSoup, Tag
+from bs4 import SoupStrainer, Tag
 from bs4.element import NavigableString
+from functools import partial
 from urllib.parse import urljoin
 import re
-import time
-import random
+
+from spider.cli import make_parser, setup
+from spider.fetch import FetchResult, fetch_one, print_report
+from spider.journal import CrawlJournal, iter_chapters
+from spider.page import Page, as_page
+from spider.pipeline import ExtractFailed
+from spider.writer import MarkdownWriter, ordered
 
 BASE_URL = "http://www.lightinnj.org/%E5%B1%9E%E7%81%B5%E4%B9%A6%E6%8A%A5/004%E8%AF%BB%E7%BB%8F%E7%B1%BB%20%E7%9B%AE%E5%BD%95/4004%E6%AD%8C%E4%B8%AD%E7%9A%84%E6%AD%8C/%E6%AD%8C%E4%B8%AD%E7%9A%84%E6%AD%8C%20%20%E7%9B%AE%E5%BD%95.htm"
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36"
 }
 
+PARAGRAPHS = SoupStrainer("p")
+
 def fetch_html(url: str) -> str:
     """Fetch HTML and handle encoding"""
-    r = requests.get(url, headers=HEADERS, timeout=25)
-    r.encoding = "gb18030"  # lightinnj uses GB18030 encoding
-    # Polite delay
-    time.sleep(random.uniform(0.5, 1.5))
-    return r.text
+    # lightinnj uses GB18030 encoding
+    result = fetch_one(url, headers=HEADERS, encoding="gb18030")
+    result.raise_for_status()
+    return result.text
 
-def extract_links_from_index(html: str, base_url: str) -> list[tuple[str, str]]:
+def extract_links_from_index(page: Page | str, base_url: str) -> list[tuple[str, str]]:
     """Extract section titles and links from the index page"""
-    soup = BeautifulSoup(html, "html.parser")
-
     links = []
-    anchors = soup.find_all("a", href=True)
 
-    for a in anchors:
-        text = a.get_text(strip=True)
-        href = a.get("href")
+    for link in as_page(page).links:
+        text = link.text
+        href = link.href
 
         # Skip navigation links
         if text in ["回首页"]:
@@ -41,7 +44,7 @@ def extract_links_from_index(html: str, base_url: str) -> list[tuple[str, str]]:
 
     return links
 
-def extract_page_content(html: str) -> str:
+def extract_page_content(page: Page | str) -> str:
     """Extract main text and treat <b> blocks as headings.
 
     - Skips navigation like 书名/回目录
@@ -50,7 +53,7 @@ def extract_page_content(html: str) -> str:
     - Converts <br> tags to paragraph breaks (\n\n) for Markdown
     - Treats <b> that start with simplified numerals followed by fullwidth space (一二三…＋\u3000) as level-4 (####)
     """
-    soup = BeautifulSoup(html, "html.parser")
+    soup = as_page(page).region(PARAGRAPHS)
 
     lines: list[str] = []
     current_heading: str | None = None
@@ -141,13 +144,27 @@ def extract_page_content(html: str) -> str:
     md = "\n\n".join(lines).strip()
     return md
 
-def build_book_markdown() -> str:
-    """Build the complete markdown document"""
-    index_html = fetch_html(BASE_URL)
-    links = extract_links_from_index(index_html, BASE_URL)
+def normalize_markdown(md: str) -> str:
+    """Per-chapter cleanup applied by the writer before text hits the disk"""
+    # Normalize: replace fullwidth space with normal space and remove normal space after ideographic full stop
+    md = md.replace("\u3000", " ")
+    md = re.sub(r"。 +", "。", md)
+    # Remove excessive blank lines
+    md = re.sub(r'\n{3,}', '\n\n', md)
+    return md
+
+def section_from_result(result: FetchResult, titles: dict[str, str]) -> str:
+    """extract_page_content for a fetched section (module-level, so --workers can pickle it)"""
+    try:
+        return extract_page_content(Page.from_result(result))
+    except Exception as e:
+        print(f"  ⚠️ Error scraping {titles.get(result.url, result.url)}: {e}")
+        # 本次跳过这一节，但不记为完成，--resume 会重试
+        return ExtractFailed(f"{type(e).__name__}: {e}")
 
-    lines = []
-    lines.append("# 歌中之歌\n")
+def build_book_markdown(out, journal: CrawlJournal | None = None) -> None:
+    """Build the complete markdown document, streaming it to ``out`` (path or text stream)"""
+    links = extract_links_from_index(Page(fetch_html(BASE_URL), BASE_URL), BASE_URL)
 
     def dedup_leading_title(content: str, title: str) -> str:
         """Remove a leading line that duplicates the section title.
@@ -172,34 +189,32 @@ def build_book_markdown() -> str:
             return content[len(m.group(0)):] .lstrip("\n")
         return content
 
-    for section_title, section_url in links:
-        print(f"Scraping: {section_title}")
+    titles = dict((url, title) for title, url in links)
+
+    contents = ordered(iter_chapters(
+        [url for _, url in links], partial(section_from_result, titles=titles), journal,
+        headers=HEADERS, encoding="gb18030",
+    ))
+
+    with MarkdownWriter(out, normalize=normalize_markdown) as writer:
+        writer.write("# 歌中之歌\n")
+
+        for (section_title, section_url), content in zip(links, contents):
+            print(f"Scraping: {section_title}")
 
-        try:
-            page_html = fetch_html(section_url)
-            content = extract_page_content(page_html)
             # Remove duplicated inline title inside the content if present
             content = dedup_leading_title(content, section_title)
 
             if content:
-                lines.append(f"## {section_title}\n")
-                lines.append(content)
-                lines.append("")
-        except Exception as e:
-            print(f"  ⚠️ Error scraping {section_title}: {e}")
-
-    # Join all lines and clean up
-    md = "\n".join(lines).strip()
-    # Normalize: replace fullwidth space with normal space and remove normal space after ideographic full stop
-    md = md.replace("\u3000", " ")
-    md = re.sub(r"。 +", "。", md)
-    # Remove excessive blank lines
-    md = re.sub(r'\n{3,}', '\n\n', md)
-    return md + "\n"
+                writer.write(f"## {section_title}\n")
+                writer.write(content)
+                writer.write("")
 
 if __name__ == "__main__":
-    md = build_book_markdown()
+    args = make_parser("Scrape 歌中之歌 into Markdown").parse_args()
+    if args.base_url:
+        BASE_URL = args.base_url
     filename = "歌中之歌.md"
-    with open(filename, "w", encoding="utf-8") as f:
-        f.write(md)
+    build_book_markdown(filename, journal=setup(args, "歌中之歌"))
     print(f"✅ 已生成：{filename}")
+    print_report()
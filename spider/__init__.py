@@ -0,0 +1 @@
+"""各抓取脚本共享的基础设施（抓取引擎、解析、输出等）。"""
@@ -0,0 +1,266 @@
+"""Offline micro-benchmarks for the page extractors.
+
+Every extractor runs over the HTML pages checked in under ``bench/fixtures``
+(saved in each site's own encoding, GB18030 for lightinnj/uoregon), so no
+network is needed. For each extractor this reports pages/sec, µs per page
+(the fastest of several runs of each page) and the peak memory allocated
+while extracting one page, and compares them with ``bench/baseline.json``::
+
+    python -m spider.bench                  # run and compare with the baseline
+    python -m spider.bench matthew --min-time 3
+    python -m spider.bench --save           # store this run as the new baseline
+    python -m spider.bench --record         # re-download the fixture pages
+
+The baseline also keeps a digest of every extractor's output, so a change that
+makes an extractor faster but alters its Markdown is reported as well. Timings
+only compare meaningfully on the same machine and parser backend.
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import hashlib
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass
+from pathlib import Path
+from types import ModuleType
+from typing import Callable
+
+from .page import Page
+from .parse import BACKENDS, get_backend, set_backend
+from .scripts import ROOT, load_script
+
+BENCH_DIR = ROOT / "bench"
+FIXTURES = BENCH_DIR / "fixtures"
+BASELINE = BENCH_DIR / "baseline.json"
+
+# 超过这个比例就算变慢（时间）或变胖（内存）
+DEFAULT_THRESHOLD = 0.10
+
+
+@dataclass
+class Benchmark:
+    name: str
+    site: str  # spider.scripts.SCRIPTS 的键，也是 fixtures 下的目录名
+    make: Callable[[ModuleType], Callable[[Page], object]]
+
+
+BENCHMARKS = [
+    Benchmark("12-brackets.third_p_to_markdown", "12-brackets", lambda m: m.third_p_to_markdown),
+    Benchmark("church-affairs.extract_page_content", "church-affairs", lambda m: m.extract_page_content),
+    Benchmark("light-in-nj.extract_page_content", "light-in-nj", lambda m: m.extract_page_content),
+    Benchmark("matthew.extract_content", "matthew", lambda m: m.extract_content),
+    # html_to_markdown 会改动传入的 <p>，所以按整篇文章测（每段调用一次）
+    Benchmark("newadvent.html_to_markdown", "newadvent", lambda m: lambda page: m.article_to_markdown(page, "Article")),
+    # <sup> 节号循环
+    Benchmark("wikisource.extract_book", "wikisource", lambda m: m.extract_book),
+]
+
+
+@dataclass
+class Fixture:
+    site: str
+    path: Path
+    encoding: str
+    url: str
+
+    @property
+    def html(self) -> str:
+        return self.path.read_bytes().decode(self.encoding, errors="replace")
+
+
+def load_fixtures(site: str | None = None) -> list[Fixture]:
+    with open(FIXTURES / "manifest.json", encoding="utf-8") as f:
+        manifest = json.load(f)
+    return [
+        Fixture(e["site"], FIXTURES / e["file"], e["encoding"], e["url"])
+        for e in manifest
+        if site is None or e["site"] == site
+    ]
+
+
+@dataclass
+class Result:
+    name: str
+    pages: int
+    seconds: float    # 每页最快一次用时之和，秒（取最小值以减少噪声）
+    peak_bytes: int   # 单页抽取时的最大内存分配
+    digest: str
+
+    @property
+    def us_per_page(self) -> float:
+        return self.seconds / self.pages * 1e6
+
+    @property
+    def pages_per_sec(self) -> float:
+        return self.pages / self.seconds
+
+    @property
+    def peak_kib(self) -> float:
+        return self.peak_bytes / 1024
+
+    def to_json(self) -> dict:
+        return {
+            "pages": self.pages,
+            "us_per_page": round(self.us_per_page, 1),
+            "peak_kib": round(self.peak_kib, 1),
+            "digest": self.digest,
+        }
+
+
+def run_benchmark(bench: Benchmark, fixtures: list[Fixture], min_time: float = 1.0, min_rounds: int = 3) -> Result:
+    """Time ``bench`` over ``fixtures``; every call gets a fresh ``Page`` (parsing included)."""
+    extract = bench.make(load_script(bench.site))
+    pages = [(f.html, f.url) for f in fixtures]
+
+    # 预热一轮，同时记录输出摘要
+    outputs = [extract(Page(html, url)) for html, url in pages]
+    digest = hashlib.sha256(repr(outputs).encode("utf-8")).hexdigest()[:16]
+
+    best = [float("inf")] * len(pages)
+    total = 0.0
+    rounds = 0
+    gc_was_enabled = gc.isenabled()
+    try:
+        while rounds < min_rounds or total < min_time:
+            gc.collect()
+            gc.disable()
+            for i, (html, url) in enumerate(pages):
+                t0 = time.perf_counter()
+                extract(Page(html, url))
+                elapsed = time.perf_counter() - t0
+                best[i] = min(best[i], elapsed)
+                total += elapsed
+            if gc_was_enabled:
+                gc.enable()
+            rounds += 1
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+    # 内存单独测一轮：tracemalloc 会拖慢执行，不能和计时混在一起
+    peak = 0
+    tracemalloc.start()
+    try:
+        for html, url in pages:
+            base, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            extract(Page(html, url))
+            peak = max(peak, tracemalloc.get_traced_memory()[1] - base)
+    finally:
+        tracemalloc.stop()
+
+    return Result(bench.name, len(pages), sum(best), peak, digest)
+
+
+def load_baseline(path: Path = BASELINE) -> dict:
+    if not path.exists():
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_baseline(results: list[Result], path: Path = BASELINE) -> None:
+    data = load_baseline(path)
+    data.update({
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "parser": get_backend(),
+    })
+    data.setdefault("results", {}).update({r.name: r.to_json() for r in results})
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def compare(result: Result, base: dict | None, threshold: float = DEFAULT_THRESHOLD) -> tuple[str, bool]:
+    """Text for the baseline column and whether this counts as a regression."""
+    if not base:
+        return "(no baseline)", False
+    notes = []
+    regressed = False
+    dt = result.us_per_page / base["us_per_page"] - 1
+    dm = result.peak_kib / base["peak_kib"] - 1 if base.get("peak_kib") else 0.0
+    notes.append(f"time {dt:+.1%}")
+    notes.append(f"mem {dm:+.1%}")
+    if dt > threshold:
+        notes.append("⚠️ slower")
+        regressed = True
+    elif dt < -threshold:
+        notes.append("✅ faster")
+    if dm > threshold:
+        notes.append("⚠️ more memory")
+        regressed = True
+    if result.digest != base.get("digest"):
+        notes.append("❗ output changed")
+        regressed = True
+    return ", ".join(notes), regressed
+
+
+def record_fixtures() -> None:
+    """Download every page in the manifest again and overwrite its fixture (raw bytes)."""
+    from .fetch import fetch_many, print_report
+
+    fixtures = load_fixtures()
+    for fixture, result in zip(fixtures, fetch_many([f.url for f in fixtures])):
+        if not result.ok:
+            print(f"❌ {fixture.url}: {result.error or result.status}")
+            continue
+        fixture.path.parent.mkdir(parents=True, exist_ok=True)
+        fixture.path.write_bytes(result.content)
+        print(f"💾 {fixture.path.relative_to(FIXTURES)} ({len(result.content)} bytes)")
+    print_report()
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description="Benchmark the page extractors on the saved fixture pages")
+    ap.add_argument("sites", nargs="*", help="only these sites (default: all)")
+    ap.add_argument("--min-time", type=float, default=1.0, help="seconds to spend per extractor (default 1)")
+    ap.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                    help="relative change counted as a regression (default 0.10)")
+    ap.add_argument("--parser", choices=BACKENDS, help="HTML parser backend (default: html.parser)")
+    ap.add_argument("--save", action="store_true", help="store the results as the new baseline")
+    ap.add_argument("--baseline", type=Path, default=BASELINE, help="baseline file (default bench/baseline.json)")
+    ap.add_argument("--record", action="store_true", help="re-download the fixture pages and exit")
+    args = ap.parse_args(argv)
+
+    if args.record:
+        record_fixtures()
+        return 0
+    if args.parser:
+        set_backend(args.parser)
+
+    baseline = load_baseline(args.baseline)
+    if baseline and baseline.get("parser", get_backend()) != get_backend():
+        print(f"⚠️ baseline was recorded with {baseline['parser']}, running with {get_backend()}")
+    base_results = baseline.get("results", {})
+
+    print(f"{'extractor':<38} {'pages/s':>9} {'µs/page':>10} {'peak KiB':>9}  vs baseline")
+    results = []
+    regressions = 0
+    for bench in BENCHMARKS:
+        if args.sites and bench.site not in args.sites:
+            continue
+        fixtures = load_fixtures(bench.site)
+        if not fixtures:
+            print(f"{bench.name:<38} (no fixtures)")
+            continue
+        r = run_benchmark(bench, fixtures, min_time=args.min_time)
+        note, regressed = compare(r, base_results.get(r.name), args.threshold)
+        regressions += regressed
+        results.append(r)
+        print(f"{r.name:<38} {r.pages_per_sec:>9.1f} {r.us_per_page:>10.1f} {r.peak_kib:>9.1f}  {note}")
+
+    if args.save:
+        save_baseline(results, args.baseline)
+        print(f"💾 Baseline saved to {args.baseline}")
+        return 0
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+"""Persistent on-disk HTTP response cache.
+
+Layout under ``root``::
+
+    meta/<sha256(url)>.json     URL, status, headers, body hash, timestamps
+    pages/                      bodies, compressed per host (``spider.pagestore``)
+
+Only the raw bytes are kept; the caller decodes them with the site's encoding
+exactly like a live response. With ``compress=False`` (``SPIDER_CACHE_COMPRESS=0``)
+bodies are plain files instead, content-addressed so identical pages (e.g.
+the same error page served for several URLs) are stored once::
+
+    body/<sha256(body)[:2]>/<sha256(body)>
+
+Bodies in either place are read back, so switching keeps an existing cache.
+
+An entry younger than ``max_age`` seconds is served without touching the
+network. Older entries are revalidated with ``If-None-Match`` /
+``If-Modified-Since`` and a ``304`` just refreshes the timestamp.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from .pagestore import PageStore
+
+# 只保存对复现页面有用的响应头
+KEPT_HEADERS = ("content-type", "etag", "last-modified", "content-encoding")
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _atomic_write(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+@dataclass
+class CacheEntry:
+    url: str
+    status: int
+    body_hash: str
+    headers: dict[str, str] = field(default_factory=dict)
+    stored_at: float = 0.0
+    validated_at: float = 0.0
+
+    def is_fresh(self, max_age: float) -> bool:
+        return time.time() - self.validated_at < max_age
+
+    def validators(self) -> dict[str, str]:
+        """Conditional request headers for revalidating this entry."""
+        out = {}
+        if "etag" in self.headers:
+            out["If-None-Match"] = self.headers["etag"]
+        if "last-modified" in self.headers:
+            out["If-Modified-Since"] = self.headers["last-modified"]
+        return out
+
+
+class ResponseCache:
+    def __init__(self, root: str | os.PathLike, max_age: float = 7 * 86400, compress: bool = True):
+        self.root = Path(root)
+        self.max_age = max_age
+        self.pages = PageStore(self.root / "pages") if compress else None
+
+    def _meta_path(self, url: str) -> Path:
+        return self.root / "meta" / f"{_sha256(url.encode('utf-8'))}.json"
+
+    def _body_path(self, body_hash: str) -> Path:
+        return self.root / "body" / body_hash[:2] / body_hash
+
+    def lookup(self, url: str) -> CacheEntry | None:
+        try:
+            meta = json.loads(self._meta_path(url).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        entry = CacheEntry(**meta)
+        if not self._in_store(entry) and not self._body_path(entry.body_hash).exists():
+            return None
+        return entry
+
+    def _in_store(self, entry: CacheEntry) -> bool:
+        return self.pages is not None and self.pages.sha256(entry.url) == entry.body_hash
+
+    def load_body(self, entry: CacheEntry) -> bytes:
+        if self._in_store(entry):
+            body = self.pages.get(entry.url)
+            if body is not None:
+                return body
+        return self._body_path(entry.body_hash).read_bytes()
+
+    def store(self, url: str, status: int, headers: dict[str, str], content: bytes) -> CacheEntry:
+        body_hash = _sha256(content)
+        if self.pages is not None:
+            self.pages.put(url, content)
+        else:
+            body_path = self._body_path(body_hash)
+            if not body_path.exists():
+                _atomic_write(body_path, content)
+        now = time.time()
+        kept = {k.lower(): v for k, v in headers.items() if k.lower() in KEPT_HEADERS}
+        entry = CacheEntry(url, status, body_hash, kept, now, now)
+        self._write_meta(entry)
+        return entry
+
+    def touch(self, entry: CacheEntry, headers: dict[str, str] | None = None) -> None:
+        """Mark ``entry`` as just revalidated (after a 304)."""
+        entry.validated_at = time.time()
+        for k, v in (headers or {}).items():
+            if k.lower() in ("etag", "last-modified"):
+                entry.headers[k.lower()] = v
+        self._write_meta(entry)
+
+    def _write_meta(self, entry: CacheEntry) -> None:
+        data = json.dumps(entry.__dict__, ensure_ascii=False).encode("utf-8")
+        _atomic_write(self._meta_path(entry.url), data)
@@ -0,0 +1,230 @@
+"""Single-pass, streaming text cleaner (the engine behind clean_12-brackets.py).
+
+The rules are the same as before: a replacement map applied in order, then
+deletion of control / private-use / geometric-shape characters. Instead of
+one ``str.replace`` pass per map entry plus a regex pass, ``Cleaner`` compiles
+everything into one regex whose first item is a single character class (so
+``re`` skips ahead quickly over ordinary text) and resolves each match with a
+dict lookup.
+
+Multi-character keys such as ``"——声"`` are matched on the *input* text, so
+they also match where an earlier single-character rule produces part of the
+key (``"\\u2500声"`` becomes ``"——声"`` and then disappears, exactly as with the
+sequential replaces). The result is identical to::
+
+    for src, dst in replace_map.items():
+        s = s.replace(src, dst)
+    s = re.sub(f"[{delete}]", "", s)
+
+as long as multi-character keys do not overlap each other.
+
+``feed()``/``flush()`` clean a stream piece by piece: text after the last
+newline is held back so a match is never split (keys must not contain
+newlines). ``clean_file`` streams a file in chunks and can split a large file
+at line boundaries across several processes::
+
+    python clean_12-brackets.py 十二篮.md --inplace --jobs 4
+"""
+from __future__ import annotations
+
+import codecs
+import os
+import re
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import BinaryIO
+
+from .profile import Totals, collect, merge, stage
+
+# 1) 只替换 U+2500 为 “——”（两枚 EM DASH）
+REPLACE_MAP = {
+    "\u2500": "——",  # BOX DRAWINGS LIGHT HORIZONTAL → EM DASH × 2
+    "——声": "",
+    "﹃": "『",
+    "﹄": "』",
+}
+
+# 2) 需要“删除”的集合（正则字符类的内容）
+# - C0 控制字符（保留 \n \r \t）与 DEL
+CTRL_CHARS = r"\u0000-\u0008\u000B\u000C\u000E-\u001F\u007F"
+# - 私用区 PUA（含 U+E216 等）
+PUA_CHARS = r"\uE000-\uF8FF"
+# - 几何图形块（含 U+25A1 等各类方块符号）
+GEOM_CHARS = r"\u25A0-\u25FF"
+
+DELETE_CHARS = CTRL_CHARS + PUA_CHARS + GEOM_CHARS
+
+CHUNK_SIZE = 1 << 20
+# 并行时每个任务处理的字节数（按行切分，实际略大）
+PART_SIZE = 16 << 20
+
+
+def _preimages(key: str, singles: dict[str, str]) -> list[tuple[str, str, str]]:
+    """Input strings that read as ``key`` once ``singles`` have been applied.
+
+    Returns ``(source, kept_prefix, kept_suffix)``: a single-character rule
+    whose output only partly overlaps the key keeps the rest of its output.
+    """
+    found = []
+
+    def walk(i: int, source: str, prefix: str) -> None:
+        if i == len(key):
+            found.append((source, prefix, ""))
+            return
+        if key[i] not in singles:
+            walk(i + 1, source + key[i], prefix)
+        for src, dst in singles.items():
+            if not dst:
+                continue
+            if key.startswith(dst, i):
+                walk(i + len(dst), source + src, prefix)
+            if i == 0:
+                # 输出的后半段才是 key 的开头，例如 "─—声"
+                for o in range(1, len(dst)):
+                    if key.startswith(dst[-o:]):
+                        walk(o, src, dst[:-o])
+            if i > 0 and len(dst) > len(key) - i and dst.startswith(key[i:]):
+                found.append((source + src, prefix, dst[len(key) - i:]))
+
+    walk(0, "", "")
+    return found
+
+
+class Cleaner:
+    """Apply ``replace_map`` and delete the characters of the class ``delete`` in one regex pass."""
+
+    def __init__(self, replace_map: dict[str, str] | None = None, delete: str = DELETE_CHARS):
+        replace_map = REPLACE_MAP if replace_map is None else replace_map
+        deleted = re.compile(f"[{delete}]") if delete else re.compile(r"(?!)")
+        singles: dict[str, str] = {}
+        table: dict[str, str] = {}
+        tails: dict[str, set[str]] = {}
+        for key, value in replace_map.items():
+            if not key:
+                raise ValueError("empty key in replace map")
+            if len(key) == 1:
+                singles[key] = value
+                table.setdefault(key, value)
+                continue
+            if "\n" in key:
+                raise ValueError(f"multi-character key {key!r} spans a newline")
+            for source, prefix, suffix in _preimages(key, singles):
+                if "\n" in source:
+                    raise ValueError(f"multi-character key {key!r} spans a newline")
+                table.setdefault(source, prefix + value + suffix)
+                tails.setdefault(source[0], set()).add(source[1:])
+                # 只匹配到首字符（后面没接上）时原样保留或按单字符规则替换
+                if not deleted.fullmatch(source[0]):
+                    table.setdefault(source[0], singles.get(source[0], source[0]))
+        self.table = table
+        lead = "".join(re.escape(c) for c in sorted(set(singles) | set(tails)))
+        branches = [
+            f"(?<={re.escape(c)})(?:{'|'.join(re.escape(t) for t in sorted(ts, key=len, reverse=True))})"
+            for c, ts in sorted(tails.items())
+        ]
+        pattern = f"[{lead}{delete}]" if lead or delete else r"(?!)"
+        if branches:
+            pattern += f"(?:{'|'.join(branches)})?"
+        self.pattern = re.compile(pattern)
+        self._carry = ""
+
+    def _sub(self, m: re.Match) -> str:
+        # 表里没有的就是要删除的字符
+        return self.table.get(m.group(), "")
+
+    def clean(self, text: str) -> str:
+        return self.pattern.sub(self._sub, text)
+
+    def feed(self, text: str) -> str:
+        """Clean the next piece of a stream; returns everything up to its last newline."""
+        text = self._carry + text
+        cut = text.rfind("\n") + 1
+        self._carry = text[cut:]
+        return self.clean(text[:cut])
+
+    def flush(self) -> str:
+        """Clean whatever ``feed`` is still holding back (end of stream)."""
+        text, self._carry = self._carry, ""
+        return self.clean(text)
+
+
+def _clean_part(cleaner: Cleaner, path: str, start: int, end: int) -> tuple[bytes, Totals]:
+    with collect() as stages:
+        with stage("read"), open(path, "rb") as f:
+            f.seek(start)
+            data = f.read(end - start)
+        with stage("normalize"):
+            cleaned = cleaner.clean(data.decode("utf-8")).encode("utf-8")
+    return cleaned, stages
+
+
+def _write_part(dst: BinaryIO, fut: Future) -> None:
+    data, stages = fut.result()
+    merge(stages)
+    with stage("write"):
+        dst.write(data)
+
+
+def _split_lines(path: str | Path, size: int, part_size: int) -> list[tuple[int, int]]:
+    """Byte ranges of about ``part_size`` that start right after a newline."""
+    bounds = [0]
+    with open(path, "rb") as f:
+        while bounds[-1] + part_size < size:
+            f.seek(bounds[-1] + part_size)
+            # "\n" 字节不会出现在 UTF-8 多字节字符中间，切在这里解码安全
+            f.readline()
+            pos = f.tell()
+            if pos >= size:
+                break
+            bounds.append(pos)
+    bounds.append(size)
+    return list(zip(bounds, bounds[1:]))
+
+
+def clean_stream(src: BinaryIO, dst: BinaryIO, cleaner: Cleaner, chunk_size: int = CHUNK_SIZE) -> None:
+    """Clean UTF-8 ``src`` into ``dst`` chunk by chunk."""
+    decoder = codecs.getincrementaldecoder("utf-8")("strict")
+    while True:
+        with stage("read"):
+            chunk = src.read(chunk_size)
+        if not chunk:
+            break
+        with stage("normalize"):
+            data = cleaner.feed(decoder.decode(chunk)).encode("utf-8")
+        with stage("write"):
+            dst.write(data)
+    with stage("normalize"):
+        data = (cleaner.feed(decoder.decode(b"", final=True)) + cleaner.flush()).encode("utf-8")
+    with stage("write"):
+        dst.write(data)
+
+
+def clean_file(
+    src: str | Path,
+    dst: BinaryIO,
+    cleaner: Cleaner | None = None,
+    jobs: int = 1,
+    chunk_size: int = CHUNK_SIZE,
+    part_size: int = PART_SIZE,
+) -> None:
+    """Clean the UTF-8 file ``src`` into the binary stream ``dst``.
+
+    With ``jobs > 1`` a file larger than ``part_size`` is cut at line
+    boundaries and the parts are cleaned in parallel, written back in order.
+    """
+    cleaner = cleaner or Cleaner()
+    size = os.path.getsize(src)
+    if jobs <= 1 or size <= part_size:
+        with open(src, "rb") as f:
+            clean_stream(f, dst, cleaner, chunk_size)
+        return
+    parts = _split_lines(src, size, part_size)
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        # 同时最多 2×jobs 个分段在处理或等待写出
+        pending: list[Future] = []
+        for start, end in parts:
+            pending.append(pool.submit(_clean_part, cleaner, str(src), start, end))
+            if len(pending) >= 2 * jobs:
+                _write_part(dst, pending.pop(0))
+        for fut in pending:
+            _write_part(dst, fut)
@@ -0,0 +1,68 @@
+"""Command-line options shared by the scraper scripts."""
+from __future__ import annotations
+
+import argparse
+import os
+
+from . import metrics, pipeline, profile, writer
+from .fetch import configure
+from .journal import DEFAULT_JOURNAL, CrawlJournal
+from .parse import BACKENDS, get_backend, set_backend
+from .warc import WarcArchive, WarcWriter
+
+
+def make_parser(description: str, base_url: bool = True) -> argparse.ArgumentParser:
+    ap = argparse.ArgumentParser(description=description)
+    ap.add_argument("--resume", action="store_true",
+                    help="continue an interrupted build: skip pages already finished in the crawl journal")
+    ap.add_argument("--journal", default=DEFAULT_JOURNAL,
+                    help=f"crawl journal database (default: {DEFAULT_JOURNAL})")
+    ap.add_argument("--incremental", action="store_true",
+                    help="re-fetch every page but only re-extract chapters whose page or extractor changed")
+    ap.add_argument("--parser", choices=BACKENDS, default=None,
+                    help=f"HTML parser backend (default: $SPIDER_PARSER or {get_backend()})")
+    if base_url:
+        ap.add_argument("--base-url", default=None,
+                        help="start from this URL instead of the real site (e.g. the stand-in server, python -m spider.standin)")
+    ap.add_argument("--workers", type=int, default=None,
+                    help="extractor processes for HTML→Markdown (0 = one per CPU; default: $SPIDER_WORKERS or 1)")
+    ap.add_argument("--max-pending", type=int, default=None,
+                    help="pages fetched or queued for extraction at once with --workers (default: 2 per worker)")
+    ap.add_argument("--metrics", metavar="PREFIX", default=os.environ.get("SPIDER_METRICS"),
+                    help="write per-request / per-page metrics to PREFIX.jsonl and PREFIX.prom (default: $SPIDER_METRICS)")
+    ap.add_argument("--epub", action="store_true",
+                    help="also write an EPUB next to the Markdown as it is built (see python -m spider.epub)")
+    profile.add_arguments(ap)
+    archive = ap.add_mutually_exclusive_group()
+    archive.add_argument("--warc", metavar="PATH", default=None,
+                         help="also write every raw response to this .warc.gz archive")
+    archive.add_argument("--replay", metavar="PATH", default=None,
+                         help="build from a .warc.gz archive (see --warc) instead of the network")
+    return ap
+
+
+def apply_options(args: argparse.Namespace, **fetch_kwargs) -> None:
+    """Apply the engine options (parser, workers, WARC); ``fetch_kwargs`` go to ``spider.fetch.configure``."""
+    if args.parser:
+        set_backend(args.parser)
+    profile.start_from_args(args)
+    if args.metrics:
+        metrics.enable(args.metrics)
+    if args.epub:
+        writer.configure(epub=True)
+    if args.workers is not None or args.max_pending is not None:
+        pipeline.configure(args.workers, args.max_pending)
+    if args.replay:
+        replay = WarcArchive(args.replay)
+        print(f"📦 Replaying {len(replay)} archived responses from {args.replay}")
+        fetch_kwargs["replay"] = replay
+    elif args.warc:
+        fetch_kwargs["archive"] = WarcWriter(args.warc)
+    if fetch_kwargs:
+        configure(**fetch_kwargs)
+
+
+def setup(args: argparse.Namespace, book: str) -> CrawlJournal:
+    """Apply the shared options and open the crawl journal for ``book``."""
+    apply_options(args)
+    return CrawlJournal(args.journal, book, resume=args.resume, incremental=args.incremental)
@@ -0,0 +1,121 @@
+"""Adaptive per-host concurrency (AIMD).
+
+``AdaptiveLimit`` is the per-host slot limit of the fetch engine when no fixed
+limit is configured for that host. It behaves like an ``asyncio.Semaphore``
+whose size follows the host's responses:
+
+- additive increase: every clean response raises the limit by ``1/limit``
+  (about +1 per round of ``limit`` responses), but only while the limit is
+  what holds requests back, i.e. about ``limit`` requests are actually on the
+  wire rather than waiting for a rate-limit token;
+- multiplicative decrease: a 403/429/503, a timeout or a latency spike
+  (time to response headers above ``spike`` × the host's unloaded latency)
+  multiplies the limit by ``decrease``. Responses to requests that were
+  already in flight when the limit was cut do not cut it again.
+
+So each host settles just under the parallelism at which it starts pushing
+back. The token-bucket rate (``spider.ratelimit``) stays the politeness
+ceiling on top of this.
+"""
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import deque
+
+# 视为“站点在限流 / 过载”的状态码
+THROTTLE_STATUSES = (403, 429, 503)
+
+
+class AdaptiveLimit:
+    """Concurrency limit for one host, adjusted by AIMD; use from a single event loop."""
+
+    def __init__(
+        self,
+        initial: int = 4,
+        minimum: int = 1,
+        maximum: int = 16,
+        decrease: float = 0.5,
+        spike: float = 2.0,
+        min_spike: float = 0.05,
+        warmup: int = 5,
+    ):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.decrease = decrease
+        self.spike = spike
+        self.min_spike = min_spike  # 比平均慢不到这么多秒的不算尖峰（本机测试时几毫秒的抖动）
+        self.warmup = warmup
+        self.in_flight = 0  # 占着名额的请求（含等令牌的）
+        self.active = 0     # 正在网络上的请求
+        self.baseline: float | None = None
+        self.samples = 0
+        self.peak = self.limit
+        self.cuts = 0
+        self._cut_at = 0.0
+        self._waiters: deque[asyncio.Future] = deque()
+
+    @property
+    def capacity(self) -> int:
+        return max(self.minimum, int(self.limit))
+
+    async def __aenter__(self) -> "AdaptiveLimit":
+        if self.in_flight < self.capacity and not self._waiters:
+            self.in_flight += 1
+            return self
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # 名额已经交给了这个请求，转给下一个
+                self.in_flight -= 1
+                self._wake()
+            else:
+                self._waiters.remove(fut)
+            raise
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self.in_flight -= 1
+        self._wake()
+
+    def _wake(self) -> None:
+        # 按先来后到放行，名额（可能刚涨过）有多少就放多少
+        while self._waiters and self.in_flight < self.capacity:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                fut.set_result(None)
+                self.in_flight += 1
+
+    def start(self) -> float:
+        """Mark a request as on the wire; pass the return value to ``done``."""
+        self.active += 1
+        return time.monotonic()
+
+    def done(self, started: float, latency: float | None, throttled: bool) -> None:
+        """Feed back one response: ``latency`` to the response headers, ``throttled`` for 403/429/timeouts."""
+        busy = self.active >= self.capacity
+        self.active -= 1
+        spiked = False
+        if latency is not None:
+            if self.baseline is not None and self.samples >= self.warmup:
+                spiked = latency > max(self.spike * self.baseline, self.baseline + self.min_spike)
+            # 基线近似“空载”延迟：遇到更快的立即跟上，变慢时每次只跟 1%，
+            # 随并发逐步变慢的站点也能被发现，长期变慢的站点最终成为新基线
+            if self.baseline is None or latency < self.baseline:
+                self.baseline = latency
+            else:
+                self.baseline += 0.01 * (latency - self.baseline)
+            self.samples += 1
+        if throttled or spiked:
+            if started >= self._cut_at:
+                self.limit = max(float(self.minimum), self.limit * self.decrease)
+                self._cut_at = time.monotonic()
+                self.cuts += 1
+        elif busy and latency is not None:
+            self.limit = min(float(self.maximum), self.limit + 1 / self.limit)
+            self.peak = max(self.peak, self.limit)
+            self._wake()
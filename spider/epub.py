@@ -0,0 +1,344 @@
+"""Write a book straight to EPUB, without Node or a headless browser.
+
+``EpubWriter`` takes the same Markdown text the scrapers write (in pieces of
+any size, like a file) and packs it into an EPUB 3 as it arrives: every
+``#`` / ``##`` heading starts a new XHTML file, which is converted block by
+block and streamed into the zip, so only the current paragraph and the list
+of headings are held in memory. The navigation document (and an EPUB 2
+``toc.ncx`` for older readers) is built from the headings at the end::
+
+    python -m spider.epub 十二篮.md
+    python -m spider.epub bible.md --title 深文理和合本 --toc-depth 2
+
+With ``--epub`` every scraper (and ``spider.library``) writes the ``.epub``
+next to the ``.md`` during the build. The Markdown converter covers what the
+books contain: ATX headings, paragraphs, ``**bold**``, ``*italic*``,
+`` `code` ``, links and ``---`` rules; anything else is kept as text.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import re
+import sys
+import time
+import uuid
+import zipfile
+from html import escape
+from pathlib import Path
+from typing import IO, Iterator
+
+from .search import CJK
+
+CONTAINER = """<?xml version="1.0" encoding="utf-8"?>
+<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">
+  <rootfiles>
+    <rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/>
+  </rootfiles>
+</container>
+"""
+
+STYLE = """body { margin: 0 1em; line-height: 1.6; }
+h1, h2, h3, h4, h5, h6 { line-height: 1.3; page-break-after: avoid; }
+h1, h2 { page-break-before: always; }
+p { margin: 0.6em 0; text-align: justify; }
+a { color: inherit; }
+"""
+
+XHTML_HEAD = """<?xml version="1.0" encoding="utf-8"?>
+<!DOCTYPE html>
+<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops">
+<head>
+<meta charset="utf-8"/>
+<title>{title}</title>
+<link rel="stylesheet" type="text/css" href="../style.css"/>
+</head>
+<body>
+"""
+XHTML_TAIL = "</body>\n</html>\n"
+
+HEADING = re.compile(r"(#{1,6})\s+(.*?)\s*#*\s*$")
+RULE = re.compile(r"(?:-{3,}|\*{3,}|_{3,})\s*$")
+INLINE = re.compile(r"\*\*(.+?)\*\*|\*(.+?)\*|`([^`]+)`|\[([^\]]+)\]\(([^)\s]+)\)")
+# XML 1.0 不允许的控制字符
+INVALID_XML = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]")
+CJK_CHAR = re.compile(f"[{CJK}]")
+LATIN = re.compile("[A-Za-z]")
+
+
+def inline(text: str) -> str:
+    """Markdown inline markup → XHTML (escaped)."""
+    out = []
+    pos = 0
+    for m in INLINE.finditer(text):
+        out.append(escape(text[pos:m.start()], quote=False))
+        bold, italic, code, label, url = m.groups()
+        if bold is not None:
+            out.append(f"<strong>{inline(bold)}</strong>")
+        elif italic is not None:
+            out.append(f"<em>{inline(italic)}</em>")
+        elif code is not None:
+            out.append(f"<code>{escape(code, quote=False)}</code>")
+        else:
+            out.append(f'<a href="{escape(url)}">{inline(label)}</a>')
+        pos = m.end()
+    out.append(escape(text[pos:], quote=False))
+    return "".join(out)
+
+
+def plain(text: str) -> str:
+    """Heading text without inline markup (for the TOC)."""
+    return INLINE.sub(lambda m: m[1] or m[2] or m[3] or m[4], text).strip()
+
+
+class EpubWriter:
+    """Stream Markdown into an EPUB at ``path``; ``write`` accepts text in any pieces.
+
+    A new chapter file starts at every heading of level ``split_level`` or
+    above. The TOC lists headings down to ``toc_depth``; if the book has a
+    single ``#`` heading it is taken as the title and left out of the TOC.
+    ``language`` defaults to ``zh`` or ``en`` by which script dominates.
+    The zip is written to ``<path>.tmp`` and renamed on ``close``; leaving a
+    ``with`` block on an exception (or ``abort``) deletes it instead, so a
+    failed build never leaves a truncated EPUB behind.
+    """
+
+    def __init__(self, path: str | Path, title: str | None = None, language: str | None = None,
+                 toc_depth: int = 3, split_level: int = 2):
+        self.path = Path(path)
+        self._tmp = self.path.with_name(self.path.name + ".tmp")
+        self.title = title
+        self.language = language
+        self.toc_depth = toc_depth
+        self.split_level = split_level
+        self.chapters: list[tuple[str, str]] = []    # (文件名, 标题)
+        self.headings: list[tuple[int, str, str]] = []  # (级别, 标题, 链接)
+        self._zip: zipfile.ZipFile | None = None
+        self._file: IO[bytes] | None = None
+        self._line = ""       # 还没读到行尾的部分
+        self._para: list[str] = []
+        self._cjk = self._latin = 0
+
+    def _open(self) -> zipfile.ZipFile:
+        if self._zip is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._zip = zipfile.ZipFile(self._tmp, "w", zipfile.ZIP_DEFLATED)
+            # mimetype 必须是第一个文件，且不压缩
+            self._zip.writestr(zipfile.ZipInfo("mimetype"), "application/epub+zip", zipfile.ZIP_STORED)
+            self._zip.writestr("META-INF/container.xml", CONTAINER)
+            self._zip.writestr("OEBPS/style.css", STYLE)
+        return self._zip
+
+    def _emit(self, html: str) -> None:
+        if self._file is None:
+            self._new_chapter(self.title or self.path.stem)
+        self._file.write(html.encode("utf-8"))
+
+    def _new_chapter(self, title: str) -> None:
+        self._end_chapter()
+        name = f"c{len(self.chapters) + 1:04d}.xhtml"
+        self.chapters.append((name, title))
+        self._file = self._open().open(f"OEBPS/text/{name}", "w")
+        self._file.write(XHTML_HEAD.format(title=escape(title)).encode("utf-8"))
+
+    def _end_chapter(self) -> None:
+        if self._file is not None:
+            self._file.write(XHTML_TAIL.encode("utf-8"))
+            self._file.close()
+            self._file = None
+
+    def write(self, text: str) -> None:
+        lines = (self._line + text).split("\n")
+        self._line = lines.pop()
+        for line in lines:
+            self._feed(line)
+
+    def _flush_para(self) -> None:
+        if self._para:
+            self._emit("<p>" + "\n".join(inline(l) for l in self._para) + "</p>\n")
+            self._para = []
+
+    def _feed(self, line: str) -> None:
+        line = INVALID_XML.sub("", line.rstrip())
+        self._cjk += len(CJK_CHAR.findall(line))
+        self._latin += len(LATIN.findall(line))
+        m = HEADING.match(line)
+        if m:
+            self._flush_para()
+            level, title = len(m[1]), plain(m[2])
+            if level <= self.split_level:
+                self._new_chapter(title)
+                href = f"text/{self.chapters[-1][0]}"
+                anchor = ""
+            else:
+                anchor = f"h{len(self.headings) + 1}"
+                if self._file is None:
+                    self._new_chapter(self.title or self.path.stem)
+                href = f"text/{self.chapters[-1][0]}#{anchor}"
+            self.headings.append((level, title, href))
+            ident = f' id="{anchor}"' if anchor else ""
+            self._emit(f"<h{level}{ident}>{inline(m[2])}</h{level}>\n")
+        elif not line.strip():
+            self._flush_para()
+        elif RULE.match(line) and not self._para:
+            self._emit("<hr/>\n")
+        else:
+            self._para.append(line.strip())
+
+    # ---- 结尾：目录与包描述 ----
+
+    def _toc(self) -> tuple[str, list[tuple[int, str, str]]]:
+        """Book title and the headings that go into the TOC."""
+        tops = [h for h in self.headings if h[0] == 1]
+        title, headings = self.title, self.headings
+        if len(tops) == 1 and headings and headings[0][0] == 1:
+            title = title or tops[0][1]
+            headings = headings[1:]
+        return title or self.path.stem, [h for h in headings if h[0] <= self.toc_depth]
+
+    @staticmethod
+    def _tree(headings: list[tuple[int, str, str]]) -> list[tuple[str, str, list]]:
+        # 按级别嵌套：每一项挂在前面最近的更高一级标题下面
+        root: list = []
+        stack: list[tuple[int, list]] = [(0, root)]
+        for level, title, href in headings:
+            while stack[-1][0] >= level:
+                stack.pop()
+            node = (title, href, [])
+            stack[-1][1].append(node)
+            stack.append((level, node[2]))
+        return root
+
+    def _nav(self, title: str, tree: list) -> str:
+        def ol(nodes: list, indent: str) -> Iterator[str]:
+            yield f"{indent}<ol>"
+            for text, href, children in nodes:
+                link = f'<a href="{escape(href)}">{escape(text)}</a>'
+                if children:
+                    yield f"{indent}  <li>{link}"
+                    yield from ol(children, indent + "    ")
+                    yield f"{indent}  </li>"
+                else:
+                    yield f"{indent}  <li>{link}</li>"
+            yield f"{indent}</ol>"
+
+        body = "\n".join(ol(tree or [(title, f"text/{self.chapters[0][0]}", [])], "  "))
+        return (XHTML_HEAD.format(title=escape(title)).replace("../style.css", "style.css")
+                + f'<nav epub:type="toc" id="toc">\n  <h1>{escape(title)}</h1>\n{body}\n</nav>\n' + XHTML_TAIL)
+
+    def _ncx(self, title: str, uid: str, tree: list) -> str:
+        order = 0
+
+        def points(nodes: list, indent: str) -> Iterator[str]:
+            nonlocal order
+            for text, href, children in nodes:
+                order += 1
+                yield f'{indent}<navPoint id="p{order}" playOrder="{order}">'
+                yield f"{indent}  <navLabel><text>{escape(text)}</text></navLabel>"
+                yield f'{indent}  <content src="{escape(href)}"/>'
+                yield from points(children, indent + "  ")
+                yield f"{indent}</navPoint>"
+
+        body = "\n".join(points(tree or [(title, f"text/{self.chapters[0][0]}", [])], "    "))
+        return f"""<?xml version="1.0" encoding="utf-8"?>
+<ncx xmlns="http://www.daisy.org/z3986/2005/ncx/" version="2005-1">
+  <head><meta name="dtb:uid" content="{uid}"/></head>
+  <docTitle><text>{escape(title)}</text></docTitle>
+  <navMap>
+{body}
+  </navMap>
+</ncx>
+"""
+
+    def _opf(self, title: str, uid: str, language: str) -> str:
+        items = "\n".join(f'    <item id="c{i}" href="text/{name}" media-type="application/xhtml+xml"/>'
+                          for i, (name, _) in enumerate(self.chapters, start=1))
+        spine = "\n".join(f'    <itemref idref="c{i}"/>' for i in range(1, len(self.chapters) + 1))
+        modified = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        return f"""<?xml version="1.0" encoding="utf-8"?>
+<package xmlns="http://www.idpf.org/2007/opf" version="3.0" unique-identifier="uid">
+  <metadata xmlns:dc="http://purl.org/dc/elements/1.1/">
+    <dc:identifier id="uid">{uid}</dc:identifier>
+    <dc:title>{escape(title)}</dc:title>
+    <dc:language>{language}</dc:language>
+    <meta property="dcterms:modified">{modified}</meta>
+  </metadata>
+  <manifest>
+    <item id="nav" href="nav.xhtml" media-type="application/xhtml+xml" properties="nav"/>
+    <item id="ncx" href="toc.ncx" media-type="application/x-dtbncx+xml"/>
+    <item id="css" href="style.css" media-type="text/css"/>
+{items}
+  </manifest>
+  <spine toc="ncx">
+{spine}
+  </spine>
+</package>
+"""
+
+    def close(self) -> None:
+        if self._line:
+            self._feed(self._line)
+            self._line = ""
+        self._flush_para()
+        if self._zip is None:
+            # 什么都没写就不创建文件
+            return
+        if not self.chapters:
+            self._new_chapter(self.title or self.path.stem)
+        self._end_chapter()
+        title, headings = self._toc()
+        tree = self._tree(headings)
+        # 同一本书重新生成时标识符不变，阅读器里的进度和笔记不会丢
+        uid = f"urn:uuid:{uuid.uuid5(uuid.NAMESPACE_URL, 'spider:' + title)}"
+        language = self.language or ("zh" if self._cjk >= self._latin else "en")
+        self._zip.writestr("OEBPS/nav.xhtml", self._nav(title, tree))
+        self._zip.writestr("OEBPS/toc.ncx", self._ncx(title, uid, tree))
+        self._zip.writestr("OEBPS/content.opf", self._opf(title, uid, language))
+        self._zip.close()
+        self._zip = None
+        os.replace(self._tmp, self.path)
+
+    def abort(self) -> None:
+        """Drop what was written; an existing EPUB at ``path`` is left untouched."""
+        if self._zip is None:
+            return
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._zip.close()
+        self._zip = None
+        os.unlink(self._tmp)
+
+    def __enter__(self) -> "EpubWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description="Convert a generated Markdown book to EPUB")
+    ap.add_argument("markdown", help="the generated book, e.g. 十二篮.md")
+    ap.add_argument("--out", default=None, help="output file (default: the book with .epub)")
+    ap.add_argument("--title", default=None, help="book title (default: the single # heading, else the file name)")
+    ap.add_argument("--language", default=None, help="dc:language, e.g. zh-Hant (default: zh or en by content)")
+    ap.add_argument("--toc-depth", type=int, default=3, help="deepest heading level in the TOC (default 3)")
+    args = ap.parse_args(argv)
+
+    src = Path(args.markdown)
+    out = Path(args.out) if args.out else src.with_suffix(".epub")
+    started = time.perf_counter()
+    with open(src, encoding="utf-8") as f, \
+            EpubWriter(out, args.title, args.language, args.toc_depth) as book:
+        for line in f:
+            book.write(line)
+    print(f"✅ 已生成：{out} ({len(book.chapters)} chapters, {out.stat().st_size / 1e6:.1f} MB "
+          f"in {time.perf_counter() - started:.2f}s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
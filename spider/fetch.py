@@ -0,0 +1,476 @@
+"""Shared asyncio fetch engine.
+
+All scrapers submit their page URLs here instead of calling ``requests.get``
+one at a time. The engine owns one event loop running in a background thread,
+so plain synchronous scripts (and several scripts running side by side in one
+process) share the same per-host concurrency limits.
+
+Blocking HTTP calls run in a thread pool; a per-host limit caps how many of
+them are in flight against any single site. By default that limit adapts to
+the host (``spider.concurrency.AdaptiveLimit``); ``set_host_limit`` pins it.
+Results always come back in the order the URLs were submitted (i.e. TOC
+order).
+"""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Iterable, Iterator
+from urllib.parse import urlsplit
+
+import requests
+from requests.utils import get_encoding_from_headers
+
+from . import metrics
+from .cache import CacheEntry, ResponseCache
+from .concurrency import THROTTLE_STATUSES, AdaptiveLimit
+from .profile import stage
+from .ratelimit import HostLimiter
+from .retry import (CIRCUIT_OPEN, CONNECTION, REQUEST, RETRYABLE, TIMEOUT, CircuitBreaker, Failure,
+                    RetryPolicy, classify, default_retries)
+from .session import connect_timings, make_session, pool_stats, set_host_pool_size
+
+if TYPE_CHECKING:
+    from .warc import WarcArchive, WarcWriter
+
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36"
+}
+
+# 响应缓存目录；可用环境变量 SPIDER_CACHE_DIR 覆盖，SPIDER_NO_CACHE=1 关闭缓存
+DEFAULT_CACHE_DIR = ".spider-cache/http"
+
+
+@dataclass
+class FetchResult:
+    """One fetched page: raw bytes plus enough metadata to decode it."""
+    url: str
+    status: int
+    content: bytes = b""
+    headers: dict[str, str] = field(default_factory=dict)
+    encoding: str = "utf-8"
+    error: str | None = None
+    from_cache: bool = False
+    # 失败类别（见 spider.retry.classify），成功时为 None
+    failure: str | None = None
+    # 各阶段耗时（秒）：dns / connect（仅新建连接时）、ttfb、download
+    timings: dict[str, float] = field(default_factory=dict, repr=False)
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and 200 <= self.status < 300
+
+    def raise_for_status(self) -> None:
+        """Raise ``FetchError`` unless the page was fetched successfully."""
+        if not self.ok:
+            raise FetchError(self)
+
+    @property
+    def text(self) -> str:
+        # 与 requests 在显式指定 encoding 时的行为一致：无法解码的字节替换掉
+        return self.content.decode(self.encoding, errors="replace")
+
+
+class FetchError(Exception):
+    """A page that could not be fetched (after the retries of ``spider.retry``)."""
+
+    def __init__(self, result: FetchResult):
+        self.result = result
+        kind = classify(result) or "error"
+        super().__init__(f"Failed to fetch {result.url} [{kind}]: {result.error or f'HTTP {result.status}'}")
+
+
+def host_of(url: str) -> str:
+    return urlsplit(url).netloc.lower()
+
+
+def _latency(result: FetchResult) -> float | None:
+    """Time until the response headers arrived, if the request got that far."""
+    if not result.timings:
+        return None
+    return sum(result.timings.get(k, 0.0) for k in ("dns", "connect", "ttfb"))
+
+
+class Fetcher:
+    """Concurrent fetcher with per-host limits.
+
+    ``per_host`` is the default number of simultaneous requests to one host.
+    With ``adaptive`` (the default, ``SPIDER_ADAPTIVE=0`` turns it off) that
+    is only the starting point: each host's limit moves between 1 and
+    ``max_per_host`` with the host's responses (see ``spider.concurrency``).
+    ``set_host_limit`` fixes the limit for a specific host and sizes that
+    host's keep-alive connection pool to match. Request *rate* is
+    governed separately by ``limiter`` (see ``spider.ratelimit``); responses
+    served from ``cache`` take neither a slot's time nor a token.
+    ``max_total`` additionally caps simultaneous requests over all hosts
+    (several books built at once, see ``spider.library``). Failed requests
+    are retried and hosts that keep failing are cut off according to
+    ``retry`` and per-host circuit breakers (see ``spider.retry``).
+
+    Every response handed out is also appended to ``archive`` (a
+    ``spider.warc.WarcWriter``) when one is set. With ``replay`` (a
+    ``spider.warc.WarcArchive``) all requests are answered from that archive
+    and the network is never used.
+    """
+
+    def __init__(
+        self,
+        per_host: int = 4,
+        timeout: float = 25,
+        max_workers: int = 32,
+        headers: dict[str, str] | None = None,
+        cache: ResponseCache | None = None,
+        limiter: HostLimiter | None = None,
+        archive: WarcWriter | None = None,
+        replay: WarcArchive | None = None,
+        max_total: int | None = None,
+        adaptive: bool | None = None,
+        max_per_host: int = 16,
+        retry: RetryPolicy | None = None,
+    ):
+        self.per_host = per_host
+        self.adaptive = os.environ.get("SPIDER_ADAPTIVE", "1") != "0" if adaptive is None else adaptive
+        self.max_per_host = max(per_host, max_per_host)
+        self.max_total = max_total
+        self.timeout = timeout
+        self.headers = dict(headers or DEFAULT_HEADERS)
+        self.cache = cache
+        self.limiter = limiter or HostLimiter(robots=self._fetch_robots)
+        self.archive = archive
+        self.replay = replay
+        # 自适应时连接池按上限开，名额涨上去时多出来的连接也能复用
+        self.session = make_session(pool_size=self.max_per_host if self.adaptive else per_host)
+        self._host_limits: dict[str, int] = {}
+        self._semaphores: dict[str, asyncio.Semaphore | AdaptiveLimit] = {}
+        self.retry = retry or RetryPolicy(default_retries())
+        self._breakers: dict[str, CircuitBreaker] = {}
+        # 重试之后仍然失败的页面，运行结束时列出来
+        self.failures: dict[str, Failure] = {}
+        self._waiting: dict[str, int] = {}  # 每个站点排队等空位的请求数（只在事件循环线程里改）
+        self._total = asyncio.Semaphore(max_total) if max_total else contextlib.nullcontext()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fetch")
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="fetch-loop", daemon=True)
+        self._thread.start()
+
+    # ---- configuration -------------------------------------------------
+
+    def set_host_limit(self, host: str, limit: int) -> None:
+        self._host_limits[host.lower()] = max(1, int(limit))
+        self._semaphores.pop(host.lower(), None)
+        set_host_pool_size(self.session, host.lower(), max(1, int(limit)))
+
+    def _semaphore(self, host: str) -> asyncio.Semaphore | AdaptiveLimit:
+        sem = self._semaphores.get(host)
+        if sem is None:
+            if host in self._host_limits or not self.adaptive:
+                sem = asyncio.Semaphore(self._host_limits.get(host, self.per_host))
+            else:
+                sem = AdaptiveLimit(self.per_host, maximum=self.max_per_host)
+            self._semaphores[host] = sem
+        return sem
+
+    # ---- blocking workers ----------------------------------------------
+
+    def _cached(self, entry: CacheEntry, encoding: str | None) -> FetchResult:
+        assert self.cache is not None
+        encoding = encoding or get_encoding_from_headers(entry.headers) or "utf-8"
+        return FetchResult(entry.url, entry.status, self.cache.load_body(entry), dict(entry.headers), encoding, from_cache=True)
+
+    def _lookup(self, url: str, encoding: str | None) -> tuple[FetchResult | None, CacheEntry | None]:
+        """Fresh cached result if any, else the stale entry to revalidate."""
+        entry = self.cache.lookup(url) if self.cache else None
+        if entry and entry.is_fresh(self.cache.max_age):
+            return self._cached(entry, encoding), entry
+        return None, entry
+
+    def _get(self, url: str, headers: dict[str, str], encoding: str | None, entry: CacheEntry | None) -> FetchResult:
+        if entry:
+            headers = {**headers, **entry.validators()}
+        connect_timings.last = {}
+        t0 = time.perf_counter()
+        try:
+            with stage("fetch"):
+                r = self.session.get(url, headers=headers, timeout=self.timeout)
+        except requests.RequestException as e:
+            if entry:
+                # 网络不可用时退回到过期缓存，总比空章节好
+                return self._cached(entry, encoding)
+            if isinstance(e, requests.Timeout):
+                failure = TIMEOUT
+            elif isinstance(e, requests.ConnectionError):
+                failure = CONNECTION
+            else:
+                failure = REQUEST
+            return FetchResult(url, 0, encoding=encoding or "utf-8", error=str(e), failure=failure)
+        # r.elapsed 到收到响应头为止（含新建连接）；之后是读取正文
+        timings = dict(connect_timings.last)
+        elapsed = r.elapsed.total_seconds()
+        timings["ttfb"] = max(0.0, elapsed - timings.get("dns", 0.0) - timings.get("connect", 0.0))
+        timings["download"] = max(0.0, time.perf_counter() - t0 - elapsed)
+        if r.status_code == 304 and entry:
+            self.cache.touch(entry, dict(r.headers))
+            result = self._cached(entry, encoding)
+            result.timings = timings
+            return result
+        if r.status_code == 200 and self.cache:
+            self.cache.store(url, r.status_code, dict(r.headers), r.content)
+        # encoding=None：与 r.text 相同，按响应头推断，必要时猜测
+        encoding = encoding or r.encoding or r.apparent_encoding or "utf-8"
+        return FetchResult(url, r.status_code, r.content, dict(r.headers), encoding, timings=timings)
+
+    # ---- async API -----------------------------------------------------
+
+    async def _fetch_robots(self, url: str) -> str | None:
+        if self.replay is not None:
+            return None
+        # robots.txt 不占令牌：它决定的正是该站点的令牌速率
+        loop = asyncio.get_running_loop()
+        cached, entry = await loop.run_in_executor(self._executor, self._lookup, url, "utf-8")
+        result = cached or await loop.run_in_executor(self._executor, self._get, url, self.headers, "utf-8", entry)
+        return result.text if result.ok else None
+
+    async def fetch(
+        self,
+        url: str,
+        encoding: str | None = None,
+        headers: dict[str, str] | None = None,
+        retries: int | None = None,
+    ) -> FetchResult:
+        """Fetch ``url``; ``retries`` overrides the engine's ``RetryPolicy`` for this call."""
+        if self.replay is not None:
+            # 回放：不联网、不限速，只剩解析的开销
+            result = self.replay.get(url, encoding)
+            self._record(result, 0, 0.0, 0)
+            attempts = 1
+        else:
+            result, attempts = await self._fetch_live(url, encoding, headers, retries)
+            if self.archive is not None and result.status:
+                await asyncio.get_running_loop().run_in_executor(self._executor, self.archive.write_response, result)
+        result.failure = classify(result)
+        if result.failure:
+            self.failures[url] = Failure(url, result.failure, result.error or f"HTTP {result.status}", attempts)
+        else:
+            self.failures.pop(url, None)
+        return result
+
+    async def _fetch_live(
+        self,
+        url: str,
+        encoding: str | None,
+        headers: dict[str, str] | None,
+        retries: int | None,
+    ) -> tuple[FetchResult, int]:
+        """The result and the number of attempts it took (0 if none was sent)."""
+        parts = urlsplit(url)
+        host = parts.netloc.lower()
+        hdrs = {**self.headers, **(headers or {})}
+        retries = self.retry.retries if retries is None else retries
+        loop = asyncio.get_running_loop()
+        cached, entry = await loop.run_in_executor(self._executor, self._lookup, url, encoding)
+        if cached:
+            self._record(cached, 0, 0.0, 0)
+            return cached, 1
+        breaker = self._breakers.setdefault(host, CircuitBreaker())
+        if breaker.is_open:
+            # 站点连续失败，不再排队等超时
+            return self._circuit_open(url, host, encoding, breaker), 0
+        queued = self._waiting[host] = self._waiting.get(host, 0) + 1
+        t0 = time.perf_counter()
+        slot = self._semaphore(host)
+        async with slot, self._total:
+            self._waiting[host] -= 1
+            for attempt in range(retries + 1):
+                if not breaker.allow():
+                    return self._circuit_open(url, host, encoding, breaker), attempt
+                await self.limiter.acquire(parts.scheme, host)
+                wait = time.perf_counter() - t0
+                if isinstance(slot, AdaptiveLimit):
+                    started = slot.start()
+                    try:
+                        result = await loop.run_in_executor(self._executor, self._get, url, hdrs, encoding, entry)
+                    except BaseException:
+                        slot.done(started, None, False)
+                        raise
+                    slot.done(started, _latency(result), result.status in THROTTLE_STATUSES or result.failure == TIMEOUT)
+                else:
+                    result = await loop.run_in_executor(self._executor, self._get, url, hdrs, encoding, entry)
+                self._record(result, attempt, wait, queued)
+                failure = classify(result)
+                breaker.record(failure)
+                if failure not in RETRYABLE or attempt == retries:
+                    break
+                # 服务器给了 Retry-After 就让整个站点暂停；否则指数退避（带随机抖动）
+                if self.limiter.retry_after(host, result.headers.get("Retry-After")) is None:
+                    await asyncio.sleep(self.retry.delay(attempt))
+                t0 = time.perf_counter()
+        return result, attempt + 1
+
+    def _circuit_open(self, url: str, host: str, encoding: str | None, breaker: CircuitBreaker) -> FetchResult:
+        return FetchResult(
+            url, 0, encoding=encoding or "utf-8", failure=CIRCUIT_OPEN,
+            error=f"{host} failed {breaker.failures} times in a row; not retrying for {breaker.cooldown:.0f}s",
+        )
+
+    def _record(self, result: FetchResult, attempt: int, wait: float, queued: int) -> None:
+        m = metrics.get()
+        if m is not None:
+            # 缓存 / 回放命中没有网络耗时；304 重新验证的有
+            timings = {} if result.from_cache and not result.timings else {**result.timings, "wait": wait}
+            m.request(host_of(result.url), result.url, result.status, len(result.content), attempt,
+                      result.from_cache, result.error, timings, queued)
+
+    async def fetch_all(self, urls: Iterable[str], **kwargs) -> list[FetchResult]:
+        return list(await asyncio.gather(*(self.fetch(u, **kwargs) for u in urls)))
+
+    # ---- sync bridge ---------------------------------------------------
+
+    def run(self, coro):
+        """Run a coroutine on the engine loop from any (non-loop) thread."""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    def fetch_many(self, urls: Iterable[str], **kwargs) -> list[FetchResult]:
+        return self.run(self.fetch_all(list(urls), **kwargs))
+
+    def iter_fetch(self, urls: Iterable[str], window: int | None = None, **kwargs) -> Iterator[tuple[int, FetchResult]]:
+        """Yield ``(index, result)`` in completion order, not submission order.
+
+        With ``window`` at most that many pages are in flight or fetched but
+        not yet taken by the caller; a slow consumer therefore slows the crawl
+        down instead of piling up page bodies in memory.
+        """
+        todo = iter(enumerate(urls))
+        futures = {}
+
+        def submit(n: int | None) -> None:
+            for idx, url in todo:
+                futures[asyncio.run_coroutine_threadsafe(self.fetch(url, **kwargs), self._loop)] = idx
+                if n is not None:
+                    n -= 1
+                    if n == 0:
+                        return
+
+        submit(window)
+        try:
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    # 交出结果后不再持有它，页面内容只在调用方手里存在
+                    idx = futures.pop(fut)
+                    if window:
+                        submit(1)
+                    yield idx, fut.result()
+        finally:
+            # 调用方提前退出（例如抽取出错）时，不再继续抓剩下的页面
+            for fut in futures:
+                fut.cancel()
+
+    def report(self, max_failures: int = 20) -> str:
+        """Connection reuse (and adaptive concurrency) per host, then the pages that failed."""
+        lines = []
+        for st in pool_stats(self.session):
+            lines.append(f"🔌 {st.host}: {st.requests} requests over {st.connections} connections ({st.reused} reused)")
+        for host, sem in sorted(self._semaphores.items()):
+            if isinstance(sem, AdaptiveLimit) and sem.samples:
+                lines.append(f"🎚️ {host}: concurrency {sem.capacity} at the end "
+                             f"(peak {int(sem.peak)}, cut back {sem.cuts} times)")
+        for host, breaker in sorted(self._breakers.items()):
+            if breaker.trips:
+                lines.append(f"⛔ {host}: circuit breaker opened {breaker.trips} time(s) after repeated failures")
+        if self.failures:
+            kinds = Counter(f.kind for f in self.failures.values())
+            lines.append(f"❌ {len(self.failures)} pages failed after retries "
+                         f"({', '.join(f'{n} {kind}' for kind, n in kinds.most_common())}); "
+                         "rerun with --resume to fetch only these:")
+            for f in list(self.failures.values())[:max_failures]:
+                lines.append(f"   [{f.kind}] {f.url}: {f.detail}")
+            if len(self.failures) > max_failures:
+                lines.append(f"   … and {len(self.failures) - max_failures} more")
+        return "\n".join(lines)
+
+
+_default: Fetcher | None = None
+_default_lock = threading.Lock()
+
+
+def default_cache() -> ResponseCache | None:
+    if os.environ.get("SPIDER_NO_CACHE"):
+        return None
+    max_age = float(os.environ.get("SPIDER_CACHE_MAX_AGE", 7 * 86400))
+    compress = os.environ.get("SPIDER_CACHE_COMPRESS", "1") != "0"
+    return ResponseCache(os.environ.get("SPIDER_CACHE_DIR", DEFAULT_CACHE_DIR), max_age=max_age, compress=compress)
+
+
+def default_rate() -> float:
+    """Default per-host requests/sec budget (``SPIDER_RATE``)."""
+    return float(os.environ.get("SPIDER_RATE", 2.0))
+
+
+def get_fetcher() -> Fetcher:
+    """Process-wide engine shared by every scraper."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = configure()
+        return _default
+
+
+def configure(**kwargs) -> Fetcher:
+    """Replace the shared engine; call before the first fetch.
+
+    Accepts the ``Fetcher`` constructor arguments plus ``rate`` and
+    ``host_rates`` for the limiter. ``cache`` defaults to the
+    environment-configured disk cache (none when replaying an archive).
+    """
+    global _default
+    kwargs.setdefault("cache", None if kwargs.get("replay") else default_cache())
+    rate = kwargs.pop("rate", default_rate())
+    host_rates = kwargs.pop("host_rates", None)
+    fetcher = Fetcher(**kwargs)
+    if "limiter" not in kwargs:
+        user_agent = fetcher.headers.get("User-Agent", "*")
+        fetcher.limiter = HostLimiter(rate, host_rates=host_rates, robots=fetcher._fetch_robots, user_agent=user_agent)
+    _default = fetcher
+    return fetcher
+
+
+def fetch_many(urls: Iterable[str], **kwargs) -> list[FetchResult]:
+    """Fetch all ``urls`` concurrently; results are in submission order.
+
+    Keyword arguments are passed to ``Fetcher.fetch`` (``encoding``,
+    ``headers``, ``retries``).
+    """
+    return get_fetcher().fetch_many(urls, **kwargs)
+
+
+def iter_fetch(urls: Iterable[str], window: int | None = None, **kwargs) -> Iterator[tuple[int, FetchResult]]:
+    """Fetch concurrently, yielding ``(index, result)`` as each page completes."""
+    return get_fetcher().iter_fetch(urls, window=window, **kwargs)
+
+
+def fetch_one(url: str, **kwargs) -> FetchResult:
+    return fetch_many([url], **kwargs)[0]
+
+
+def print_report() -> None:
+    """Print the shared engine's per-host summary (if anything was fetched)."""
+    if _default is not None:
+        text = _default.report()
+        if text:
+            print(text)
+
+
+if __name__ == "__main__":
+    import sys
+
+    t0 = time.perf_counter()
+    for res in fetch_many(sys.argv[1:]):
+        print(res.status, len(res.content), res.url, res.error or "")
+    print(f"{time.perf_counter() - t0:.2f}s")
+    print_report()
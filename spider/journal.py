@@ -0,0 +1,202 @@
+"""Resumable crawl journal backed by SQLite.
+
+Each finished page is written to the journal as soon as it has been fetched
+and extracted: its URL, HTTP status, the chapter Markdown the extractor
+produced and timestamps. With ``resume=True`` pages already marked done are
+served from the journal, so an interrupted build only fetches what is missing.
+
+Every chapter is also stored with the SHA-256 of the page it came from, the
+extractor version (``spider.pipeline.extractor_version``) and the SHA-256 of
+its Markdown. With ``incremental=True`` every page is fetched again (cheap
+from the response cache: a fresh hit or a 304) but only chapters whose page
+or extractor changed are extracted; the rest reuse their stored Markdown.
+"""
+from __future__ import annotations
+
+import hashlib
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Iterator
+
+from . import pipeline
+from .fetch import FetchResult, iter_fetch
+
+DEFAULT_JOURNAL = ".spider-cache/journal.sqlite3"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    book        TEXT NOT NULL,
+    url         TEXT NOT NULL,
+    status      INTEGER,
+    done        INTEGER NOT NULL DEFAULT 0,
+    markdown    TEXT,
+    error       TEXT,
+    started_at  REAL,
+    finished_at REAL,
+    source_sha256 TEXT,
+    extractor     TEXT,
+    md_sha256     TEXT,
+    PRIMARY KEY (book, url)
+)
+"""
+
+# 旧版日志没有这几列
+ADDED_COLUMNS = {"source_sha256": "TEXT", "extractor": "TEXT", "md_sha256": "TEXT"}
+
+
+def _sha256(data: bytes | str) -> str:
+    return hashlib.sha256(data.encode("utf-8") if isinstance(data, str) else data).hexdigest()
+
+
+class CrawlJournal:
+    def __init__(self, path: str | Path, book: str, resume: bool = False, incremental: bool = False):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.book = book
+        self.incremental = incremental
+        self.started_at = time.time()
+        # 进度（spider.library 的汇总用）：本次构建要处理的页数、已完成和失败的页数
+        self.total = 0
+        self.finished = 0
+        self.failed = 0
+        # 增量构建：沿用的章节数，以及重新抽取后内容真的变了的章节
+        self.reused = 0
+        self.changed: list[str] = []
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(SCHEMA)
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(pages)")}
+        for name, kind in ADDED_COLUMNS.items():
+            if name not in columns:
+                self._db.execute(f"ALTER TABLE pages ADD COLUMN {name} {kind}")
+        if not resume and not incremental:
+            # 不续跑时清掉这本书以前的记录，避免把旧内容混进新的构建
+            self._db.execute("DELETE FROM pages WHERE book = ?", (book,))
+        self._db.commit()
+
+    def get(self, url: str) -> str | None:
+        """Markdown of a finished page, or ``None`` if it still has to be fetched."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT markdown FROM pages WHERE book = ? AND url = ? AND done = 1", (self.book, url)
+            ).fetchone()
+        return row[0] if row else None
+
+    def reusable(self, url: str, source_sha256: str, extractor: str) -> str | None:
+        """Stored Markdown of ``url`` if it was extracted from the same page by the same extractor."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT markdown FROM pages WHERE book = ? AND url = ? AND done = 1"
+                " AND source_sha256 = ? AND extractor = ?", (self.book, url, source_sha256, extractor)
+            ).fetchone()
+        return row[0] if row else None
+
+    def record(self, url: str, status: int, markdown: str | None, done: bool = True, error: str | None = None,
+               source_sha256: str | None = None, extractor: str | None = None) -> None:
+        md_sha256 = _sha256(markdown) if markdown is not None else None
+        with self._lock:
+            if not done:
+                # 增量构建重抓失败：上次完成的记录不动，只记下这次的状态和错误，下次再试
+                kept = self._db.execute(
+                    "UPDATE pages SET status = ?, error = ?, finished_at = ? WHERE book = ? AND url = ? AND done = 1",
+                    (status, error, time.time(), self.book, url),
+                ).rowcount
+                if kept:
+                    self._db.commit()
+                    self.failed += 1
+                    return
+            if self.incremental and done:
+                row = self._db.execute(
+                    "SELECT md_sha256 FROM pages WHERE book = ? AND url = ? AND done = 1", (self.book, url)
+                ).fetchone()
+                if row and row[0] != md_sha256:
+                    self.changed.append(url)
+            self._db.execute(
+                "INSERT OR REPLACE INTO pages (book, url, status, done, markdown, error, started_at, finished_at,"
+                " source_sha256, extractor, md_sha256) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (self.book, url, status, int(done), markdown, error, self.started_at, time.time(),
+                 source_sha256, extractor, md_sha256),
+            )
+            self._db.commit()
+            if done:
+                self.finished += 1
+            else:
+                self.failed += 1
+
+    def counts(self) -> tuple[int, int]:
+        """(finished, unfinished) pages recorded for this book."""
+        with self._lock:
+            rows = dict(self._db.execute(
+                "SELECT done, COUNT(*) FROM pages WHERE book = ? GROUP BY done", (self.book,)
+            ).fetchall())
+        return rows.get(1, 0), rows.get(0, 0)
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+def iter_chapters(
+    urls: list[str],
+    extract: Callable[[FetchResult], str],
+    journal: CrawlJournal | None = None,
+    **fetch_kwargs,
+) -> Iterator[tuple[int, str]]:
+    """Yield ``(index, markdown)`` for every URL as soon as it is ready.
+
+    Pages finished in ``journal`` come first without any fetch; the rest are
+    fetched concurrently, passed to ``extract`` (on the process pool with
+    ``--workers``, see ``spider.pipeline``) and recorded one by one.
+    Only successful responses that the extractor converted (it did not return
+    ``ExtractFailed``) are marked done, so failed pages (yielded as empty
+    Markdown) are retried on the next ``--resume``. An incremental
+    journal fetches every page and extracts only the changed ones; a page
+    that fails to refetch keeps, and yields, the Markdown of its last
+    successful build.
+    """
+    todo = []
+    if journal:
+        journal.total += len(urls)
+    for idx, url in enumerate(urls):
+        md = journal.get(url) if journal and not journal.incremental else None
+        if md is None:
+            todo.append(idx)
+        else:
+            journal.finished += 1
+            yield idx, md
+    if journal and len(todo) < len(urls):
+        print(f"⏩ Resuming: {len(urls) - len(todo)} pages already done, {len(todo)} to fetch")
+    version = pipeline.extractor_version(extract) if journal else ""
+
+    def reuse(result: FetchResult) -> str | None:
+        md = journal.reusable(result.url, _sha256(result.content), version)
+        if md is not None:
+            journal.reused += 1
+        return md
+
+    # 多进程抽取时，抓取窗口与进程池的排队上限一致（背压）
+    window = pipeline.max_pending() if pipeline.workers() > 1 else None
+    fetched = iter_fetch([urls[i] for i in todo], window=window, **fetch_kwargs)
+    extracted = pipeline.iter_extract(fetched, extract, journal.book if journal else "",
+                                      reuse=reuse if journal and journal.incremental else None)
+    for n, (j, result, md) in enumerate(extracted, start=1):
+        if journal:
+            error = None if result.ok else f"[{result.failure}] {result.error or f'HTTP {result.status}'}"
+            failed = isinstance(md, pipeline.ExtractFailed)
+            if failed:
+                # 抽取出错：本次跳过这一章，但不算完成，下次续跑会重新抽取
+                error = f"[extract] {md.error}"
+            source = _sha256(result.content) if result.ok else None
+            journal.record(result.url, result.status, None if failed else md, done=result.ok and not failed,
+                           error=error, source_sha256=source, extractor=version)
+            if not result.ok or failed:
+                # 抓取失败但以前完成过（增量构建）：交出上次的 Markdown，不让这一章变空
+                md = journal.get(result.url) or md
+            # 调用方（spider.writer.ordered）拿到最后一章就不再往下取，汇总要在交出它之前打印
+            if journal.incremental and n == len(todo):
+                print(f"♻️ {journal.book}: {journal.reused} chapters unchanged, {n - journal.reused} extracted, "
+                      f"{len(journal.changed)} with new Markdown")
+        yield todo[j], md
@@ -0,0 +1,224 @@
+"""Build several books at once in one process.
+
+Each registered ``Book`` wraps the ``build_book_markdown`` (or equivalent)
+function of one scraper script. ``python -m spider.library`` runs them in
+parallel threads on the shared fetch engine, so per-host limits, the response
+cache, connection pools and the extractor pool are shared, and
+``--max-connections`` caps the requests in flight over all sites. The six
+books live on different hosts, so a full rebuild takes about as long as the
+slowest book::
+
+    python -m spider.library                        # all books
+    python -m spider.library 十二篮 bible --resume
+    python -m spider.library --standin http://127.0.0.1:8800   # against python -m spider.standin
+
+What the scripts print goes to one log per book (``--log-dir``); the console
+shows a combined progress line and a summary at the end. The books that were
+built are then added to the full-text index (``spider.search``); unchanged
+books are skipped, so this costs little after a partial rebuild.
+"""
+from __future__ import annotations
+
+import io
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from types import ModuleType
+from typing import Callable, TextIO
+
+from .cli import apply_options, make_parser
+from .fetch import print_report
+from .journal import CrawlJournal
+from .scripts import load_script
+from .search import DEFAULT_INDEX, index_books
+from .standin import standin_url
+
+DEFAULT_LOG_DIR = ".spider-cache/logs"
+
+
+@dataclass
+class Book:
+    name: str    # 抓取日志中的书名，与单独运行脚本时相同，--resume 两边通用
+    title: str
+    script: str  # spider.scripts.SCRIPTS 的键
+    output: str
+    build: Callable[[ModuleType, str, CrawlJournal], object]
+
+
+BOOKS = [
+    Book("十二篮", "十二篮", "12-brackets", "十二篮.md",
+         lambda m, out, journal: m.build_book_markdown(out, journal=journal)),
+    Book("bible", "圣经（文理和合）", "wikisource", "bible.md",
+         lambda m, out, journal: m.build_book_markdown(out, journal=journal,
+                                                       verses=str(Path(out).with_suffix(".verses")))),
+    Book("fathers", "约翰福音讲道录", "newadvent", "fathers.md",
+         lambda m, out, journal: m.fetch_all_to_one_md(output_file=out, journal=journal)),
+    Book("马太福音查经记录", "马太福音查经记录", "matthew", "马太福音查经记录.md",
+         lambda m, out, journal: m.build_matthew_study_markdown(out, journal=journal)),
+    Book("教会的事务", "教会的事务", "church-affairs", "教会的事务.md",
+         lambda m, out, journal: m.build_book_markdown(out, journal=journal)),
+    Book("歌中之歌", "歌中之歌", "light-in-nj", "歌中之歌.md",
+         lambda m, out, journal: m.build_book_markdown(out, journal=journal)),
+]
+
+
+def find_books(names: list[str]) -> list[Book]:
+    """Books matching ``names`` (book name, title or script key); all books if empty."""
+    if not names:
+        return list(BOOKS)
+    books = []
+    for name in names:
+        matches = [b for b in BOOKS if name in (b.name, b.title, b.script)]
+        if not matches:
+            raise SystemExit(f"unknown book {name!r}; choose from: {', '.join(b.name for b in BOOKS)}")
+        books.extend(m for m in matches if m not in books)
+    return books
+
+
+class _ThreadOutput(io.TextIOBase):
+    """``sys.stdout`` stand-in that sends each registered thread's output to its own file."""
+
+    def __init__(self, stream: TextIO):
+        self.stream = stream
+        self.files: dict[int, TextIO] = {}
+
+    def write(self, s: str) -> int:
+        return self.files.get(threading.get_ident(), self.stream).write(s)
+
+    def flush(self) -> None:
+        self.files.get(threading.get_ident(), self.stream).flush()
+
+
+@dataclass
+class BookRun:
+    book: Book
+    journal: CrawlJournal
+    started: float = 0.0
+    finished: float = 0.0
+    error: str | None = None
+    done: bool = False
+
+    @property
+    def seconds(self) -> float:
+        return (self.finished or time.monotonic()) - self.started if self.started else 0.0
+
+    def status(self) -> str:
+        j = self.journal
+        total = f"/{j.total}" if j.total else ""
+        mark = "❌" if self.error else "✅" if self.done else ""
+        return f"{self.book.title} {j.finished}{total}{mark}"
+
+
+@dataclass
+class Library:
+    books: list[Book]
+    journal_path: str
+    resume: bool = False
+    output_dir: Path = Path(".")
+    log_dir: Path = Path(DEFAULT_LOG_DIR)
+    search_index: str | None = DEFAULT_INDEX
+    incremental: bool = False
+    runs: list[BookRun] = field(default_factory=list)
+
+    def _run(self, run: BookRun, module: ModuleType, out: _ThreadOutput) -> None:
+        log_path = self.log_dir / f"{run.book.name}.log"
+        with open(log_path, "w", encoding="utf-8") as log:
+            out.files[threading.get_ident()] = log
+            run.started = time.monotonic()
+            try:
+                if run.book.build(module, str(self.output_dir / run.book.output), run.journal) is False:
+                    run.error = f"build failed, see {log_path}"
+            except Exception as e:
+                run.error = f"{type(e).__name__}: {e}"
+                print(f"❌ {run.error}", file=log)
+            finally:
+                run.finished = time.monotonic()
+                run.done = True
+                del out.files[threading.get_ident()]
+
+    def build(self, interval: float = 5.0) -> bool:
+        """Build every book concurrently; True if all of them succeeded."""
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        # 先在主线程里载入全部脚本，抽取进程池启动时才能找到它们
+        modules = [load_script(book.script) for book in self.books]
+        self.runs = [BookRun(book, CrawlJournal(self.journal_path, book.name, resume=self.resume,
+                                             incremental=self.incremental)) for book in self.books]
+
+        out = _ThreadOutput(sys.stdout)
+        sys.stdout = out
+        started = time.monotonic()
+        try:
+            with ThreadPoolExecutor(max_workers=len(self.runs), thread_name_prefix="book") as pool:
+                futures = [pool.submit(self._run, run, m, out) for run, m in zip(self.runs, modules)]
+                next_report = started + interval
+                while not all(f.done() for f in futures):
+                    time.sleep(0.2)
+                    if time.monotonic() >= next_report:
+                        self.progress(time.monotonic() - started)
+                        next_report += interval
+        finally:
+            sys.stdout = out.stream
+            for run in self.runs:
+                run.journal.close()
+        self.summary(time.monotonic() - started)
+        built = [self.output_dir / run.book.output for run in self.runs if not run.error]
+        if self.search_index and built:
+            index_books(built, self.search_index)
+        return not any(run.error for run in self.runs)
+
+    def progress(self, elapsed: float) -> None:
+        pages = sum(run.journal.finished for run in self.runs)
+        books = " · ".join(run.status() for run in self.runs)
+        print(f"⏳ {elapsed:5.0f}s  {books}  | {pages / elapsed:.1f} pages/s", flush=True)
+
+    def summary(self, wall: float) -> None:
+        print(f"\n{'book':<20} {'pages':>6} {'failed':>6} {'time':>8} {'pages/s':>8}")
+        for run in self.runs:
+            j = run.journal
+            rate = j.finished / run.seconds if run.seconds else 0.0
+            note = f"  ❌ {run.error}" if run.error else ""
+            print(f"{run.book.title:<20} {j.finished:>6} {j.failed:>6} {run.seconds:>7.1f}s {rate:>8.1f}{note}")
+        pages = sum(run.journal.finished for run in self.runs)
+        slowest = max((run.seconds for run in self.runs), default=0.0)
+        serial = sum(run.seconds for run in self.runs)
+        print(f"📚 {len(self.runs)} books, {pages} pages in {wall:.1f}s "
+              f"({pages / wall if wall else 0:.1f} pages/s; slowest book {slowest:.1f}s, sum of book times {serial:.1f}s)")
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = make_parser("Build several books concurrently on one shared fetch engine", base_url=False)
+    ap.add_argument("books", nargs="*", help="book names (default: all): " + ", ".join(b.name for b in BOOKS))
+    ap.add_argument("--max-connections", type=int, default=16,
+                    help="requests in flight over all sites (default 16)")
+    ap.add_argument("--output-dir", type=Path, default=Path("."), help="where the .md files go (default: .)")
+    ap.add_argument("--log-dir", type=Path, default=Path(DEFAULT_LOG_DIR),
+                    help=f"one log per book with what the scripts print (default: {DEFAULT_LOG_DIR})")
+    ap.add_argument("--interval", type=float, default=5.0, help="seconds between progress lines (default 5)")
+    ap.add_argument("--search-index", default=DEFAULT_INDEX,
+                    help=f"full-text index updated after the build (default: {DEFAULT_INDEX}); see python -m spider.search")
+    ap.add_argument("--no-index", action="store_true", help="do not update the full-text index")
+    ap.add_argument("--standin", metavar="ROOT", default=None,
+                    help="build from a stand-in server (python -m spider.standin), e.g. http://127.0.0.1:8800")
+    args = ap.parse_args(argv)
+
+    books = find_books(args.books)
+    apply_options(args, max_total=args.max_connections)
+    if args.standin:
+        for book in books:
+            module = load_script(book.script)
+            module.BASE_URL = standin_url(args.standin, module.BASE_URL)
+
+    print(f"🚀 Building {len(books)} books: {', '.join(b.title for b in books)}")
+    search_index = None if args.no_index else args.search_index
+    ok = Library(books, args.journal, args.resume, args.output_dir, args.log_dir, search_index,
+                 incremental=args.incremental).build(args.interval)
+    print_report()
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
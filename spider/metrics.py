@@ -0,0 +1,234 @@
+"""Structured crawl metrics.
+
+With ``--metrics PREFIX`` (or ``SPIDER_METRICS=PREFIX``) every request and
+every extracted page becomes one JSON line in ``PREFIX.jsonl``, written as
+the crawl goes, and ``PREFIX.prom`` gets counters and histograms in the
+Prometheus text format when the run ends:
+
+- requests: DNS / connect (TCP + TLS) / TTFB / download time, time spent
+  queued for a slot and a rate-limit token, response bytes, status, attempt
+  number and cache hits, per host;
+- extraction: parse (building the soup) and convert (the rest of the
+  extractor) time per page, per extractor;
+- queue depths: requests waiting per host, pages pending on the extractor
+  pool.
+
+The console gets a short per-host / per-extractor summary at exit, which is
+usually enough to tell which site or extractor is the bottleneck.
+"""
+from __future__ import annotations
+
+import atexit
+import bisect
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+
+# 直方图的桶（秒）
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+REQUEST_PHASES = ("dns", "connect", "ttfb", "download", "wait")
+
+Labels = tuple[tuple[str, str], ...]
+
+
+class Histogram:
+    def __init__(self) -> None:
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else 0.0
+
+
+def _labels(**labels: object) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt_labels(labels: Labels, extra: str = "") -> str:
+    parts = [f'{k}="{_escape(v)}"' for k, v in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Metrics:
+    """Thread-safe registry; events go to ``PREFIX.jsonl`` as they happen."""
+
+    HELP = {
+        "spider_requests_total": ("counter", "HTTP responses by host and status (0 = network error)"),
+        "spider_retries_total": ("counter", "Repeated attempts after a failed response"),
+        "spider_cache_hits_total": ("counter", "Responses served from the disk cache or a WARC replay"),
+        "spider_response_bytes_total": ("counter", "Response body bytes"),
+        "spider_request_seconds": ("histogram", "Request time by phase"),
+        "spider_pages_total": ("counter", "Pages passed through an extractor"),
+        "spider_extract_seconds": ("histogram", "Extraction time per page by stage (parse, convert)"),
+        "spider_queue_depth_max": ("gauge", "Largest queue depth seen"),
+    }
+
+    def __init__(self, prefix: str | Path):
+        self.prefix = Path(prefix)
+        self.prefix.parent.mkdir(parents=True, exist_ok=True)
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._events = open(f"{self.prefix}.jsonl", "a", encoding="utf-8")
+        self.counters: dict[str, dict[Labels, float]] = defaultdict(lambda: defaultdict(float))
+        self.histograms: dict[str, dict[Labels, Histogram]] = defaultdict(lambda: defaultdict(Histogram))
+        self.gauges: dict[str, dict[Labels, float]] = defaultdict(dict)
+        self._closed = False
+
+    def _event(self, event: dict) -> None:
+        line = json.dumps(event, ensure_ascii=False)
+        with self._lock:
+            if not self._closed:
+                self._events.write(line + "\n")
+
+    def request(
+        self,
+        host: str,
+        url: str,
+        status: int,
+        nbytes: int,
+        attempt: int = 0,
+        from_cache: bool = False,
+        error: str | None = None,
+        timings: dict[str, float] | None = None,
+        queued: int = 0,
+    ) -> None:
+        timings = timings or {}
+        self._event({
+            "ts": round(time.time(), 4), "event": "request", "host": host, "url": url,
+            "status": status, "bytes": nbytes, "attempt": attempt, "from_cache": from_cache,
+            "error": error, "queued": queued, **{k: round(v, 6) for k, v in timings.items()},
+        })
+        with self._lock:
+            self.counters["spider_requests_total"][_labels(host=host, status=status)] += 1
+            self.counters["spider_response_bytes_total"][_labels(host=host)] += nbytes
+            if attempt:
+                self.counters["spider_retries_total"][_labels(host=host)] += 1
+            if from_cache:
+                self.counters["spider_cache_hits_total"][_labels(host=host)] += 1
+            for phase, seconds in timings.items():
+                self.histograms["spider_request_seconds"][_labels(host=host, phase=phase)].observe(seconds)
+        self.queue("fetch_waiting", queued, host=host)
+
+    def extract(self, extractor: str, url: str, parse: float, total: float, book: str = "") -> None:
+        convert = max(0.0, total - parse)
+        self._event({
+            "ts": round(time.time(), 4), "event": "extract", "extractor": extractor, "book": book,
+            "url": url, "parse": round(parse, 6), "convert": round(convert, 6),
+        })
+        with self._lock:
+            self.counters["spider_pages_total"][_labels(extractor=extractor)] += 1
+            self.histograms["spider_extract_seconds"][_labels(extractor=extractor, stage="parse")].observe(parse)
+            self.histograms["spider_extract_seconds"][_labels(extractor=extractor, stage="convert")].observe(convert)
+
+    def queue(self, name: str, depth: int, **labels: object) -> None:
+        key = _labels(queue=name, **labels)
+        with self._lock:
+            gauge = self.gauges["spider_queue_depth_max"]
+            if depth > gauge.get(key, -1):
+                gauge[key] = depth
+
+    # ---- export --------------------------------------------------------
+
+    def prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            for name, (kind, help_text) in self.HELP.items():
+                if kind == "histogram":
+                    series = self.histograms.get(name, {})
+                else:
+                    series = (self.counters if kind == "counter" else self.gauges).get(name, {})
+                if not series:
+                    continue
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in sorted(series.items()):
+                    if kind != "histogram":
+                        lines.append(f"{name}{_fmt_labels(labels)} {value:g}")
+                        continue
+                    cumulative = 0
+                    for le, n in zip((*BUCKETS, "+Inf"), value.counts):
+                        cumulative += n
+                        bucket = 'le="%s"' % le
+                        lines.append(f"{name}_bucket{_fmt_labels(labels, bucket)} {cumulative}")
+                    lines.append(f"{name}_sum{_fmt_labels(labels)} {value.sum:.6f}")
+                    lines.append(f"{name}_count{_fmt_labels(labels)} {value.count}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> str:
+        """Per-host and per-extractor means, one line each."""
+        lines = []
+        hosts = sorted({dict(k)["host"] for k in self.counters["spider_requests_total"]})
+        for host in hosts:
+            n = sum(v for k, v in self.counters["spider_requests_total"].items() if dict(k)["host"] == host)
+            retries = self.counters["spider_retries_total"].get(_labels(host=host), 0)
+            mib = self.counters["spider_response_bytes_total"].get(_labels(host=host), 0) / 2**20
+            means = {
+                phase: self.histograms["spider_request_seconds"][_labels(host=host, phase=phase)].mean * 1000
+                for phase in REQUEST_PHASES
+            }
+            lines.append(
+                f"📊 {host}: {n:.0f} requests ({retries:.0f} retries), {mib:.1f} MiB; mean ms "
+                + " ".join(f"{p}={means[p]:.1f}" for p in REQUEST_PHASES)
+            )
+        for labels, pages in sorted(self.counters["spider_pages_total"].items()):
+            extractor = dict(labels)["extractor"]
+            parse = self.histograms["spider_extract_seconds"][_labels(extractor=extractor, stage="parse")].mean
+            convert = self.histograms["spider_extract_seconds"][_labels(extractor=extractor, stage="convert")].mean
+            lines.append(f"📊 {extractor}: {pages:.0f} pages; mean ms parse={parse * 1000:.1f} convert={convert * 1000:.1f}")
+        return "\n".join(lines)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._events.close()
+        prom = Path(f"{self.prefix}.prom")
+        tmp = prom.with_suffix(".prom.tmp")
+        tmp.write_text(self.prometheus(), encoding="utf-8")
+        os.replace(tmp, prom)
+        text = self.summary()
+        if text:
+            print(text)
+        print(f"📊 Metrics written to {self.prefix}.jsonl and {prom}")
+
+
+_metrics: Metrics | None = None
+
+
+def enable(prefix: str | Path) -> Metrics:
+    """Start recording to ``PREFIX.jsonl`` / ``PREFIX.prom``."""
+    global _metrics
+    if _metrics is not None:
+        _metrics.close()
+    _metrics = Metrics(prefix)
+    return _metrics
+
+
+def get() -> Metrics | None:
+    return _metrics
+
+
+def close() -> None:
+    if _metrics is not None:
+        _metrics.close()
+
+
+atexit.register(close)
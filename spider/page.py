@@ -0,0 +1,82 @@
+"""Parse-once page object shared by all extraction steps.
+
+A ``Page`` holds the HTML of one fetched page and builds each tree at most
+once: ``soup`` is the whole document, ``region(strainer)`` a partial tree with
+only the subtrees an extractor needs (see ``Page.region``).
+Derived views of the whole document (``text``, ``links``) are
+computed on first use and cached, so several extraction functions can look
+at the same page without parsing or walking it again.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from functools import cached_property
+from urllib.parse import urljoin
+
+from bs4 import BeautifulSoup, SoupStrainer, Tag
+
+from .fetch import FetchResult
+from .parse import make_soup
+
+
+@dataclass(frozen=True)
+class Link:
+    text: str  # 去掉首尾空白的锚文本
+    href: str  # 原样的 href 属性
+    url: str   # 相对页面地址解析后的绝对地址
+
+
+class Page:
+    def __init__(self, html: str, url: str = ""):
+        self.html = html
+        self.url = url
+        self._regions: dict[int, tuple[SoupStrainer, BeautifulSoup]] = {}
+
+    @classmethod
+    def from_result(cls, result: FetchResult) -> "Page":
+        return cls(result.text, result.url)
+
+    @cached_property
+    def soup(self) -> BeautifulSoup:
+        """The whole document."""
+        return make_soup(self.html)
+
+    def region(self, target: SoupStrainer) -> BeautifulSoup:
+        """Tree with only the subtrees matching ``target``, built once per strainer.
+
+        Falls back to the whole document (``soup``) when nothing matches.
+        Extraction steps on the same page should share one strainer so the
+        page is only parsed once.
+        """
+        cached = self._regions.get(id(target))
+        if cached is not None:
+            return cached[1]
+        if "soup" in self.__dict__:
+            # 整页已经解析过了，直接复用，不再做部分解析
+            tree = self.soup
+        else:
+            tree = make_soup(self.html, parse_only=target)
+            if tree.find(True) is None:
+                tree = self.soup
+        # 连同 strainer 一起保存，保证 id() 在 Page 存活期间不被复用
+        self._regions[id(target)] = (target, tree)
+        return tree
+
+    @cached_property
+    def text(self) -> str:
+        """``get_text()`` of the whole document."""
+        return self.soup.get_text()
+
+    @cached_property
+    def links(self) -> list[Link]:
+        """Every ``<a href>`` in document order."""
+        return [
+            Link(a.get_text(strip=True), str(a["href"]), urljoin(self.url, str(a["href"])))
+            for a in self.soup.find_all("a", href=True)
+            if isinstance(a, Tag)
+        ]
+
+
+def as_page(page: Page | str, url: str = "") -> Page:
+    """Accept either a ``Page`` or raw HTML (for callers that only have a string)."""
+    return page if isinstance(page, Page) else Page(page, url)
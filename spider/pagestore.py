@@ -0,0 +1,507 @@
+"""Compressed store for raw page bodies, with a dictionary trained per host.
+
+Pages of one site share most of their bytes: the same ``<head>``, navigation,
+table layout and GB18030 boilerplate on every lightinnj page, the same
+``div.feature-title`` / ``div.main`` scaffolding on every ezoe chapter. A
+compressor primed with a dictionary of those shared pieces only has to encode
+what is new in each page. Layout under ``root``::
+
+    index.sqlite3           url → host, pack, codec, dictionary, offset, length, size, sha256
+    <host>/pack[.<n>]       compressed bodies back to back (append-only)
+    <host>/dict-<n>.<codec> dictionaries trained on the host's pages
+
+The first ``train_after`` pages of a host are compressed without a
+dictionary; then a dictionary is trained on them and used for every later
+page. ``compact`` trains a fresh one on a sample of all the host's pages,
+recompresses everything with it into a new pack and drops bodies that have
+been replaced; the old pack is deleted only after the index points at the new
+one. Identical bodies of one host (e.g. the same error page) are stored once.
+If a dictionary cannot be trained (too few or too small pages for zstd), pages
+keep being stored without one. Dictionary numbers are never reused: a
+dictionary trained in a transaction that rolls back is deleted, and new
+numbers skip any ``dict-<n>`` file left on disk.
+
+Several processes may share a store (two scrapers on the same site both use
+``.spider-cache/http``): every write holds SQLite's write lock
+(``BEGIN IMMEDIATE``) from the dedupe check through the pack append to the
+index insert, so appends to a pack never interleave.
+
+The codec is zstd (``pip install zstandard``) when available, else zlib with
+a preset dictionary (``zdict``, at most 32 KB is used). Both can be read back
+whichever is installed, except zstd entries without ``zstandard``.
+
+Reads are random access by URL: one index lookup, one read of the compressed
+record, one decompression. ``open`` streams the decompressed body instead, to
+hand a file object straight to a parser::
+
+    python -m spider.pagestore .spider-cache/http/pages stats
+    python -m spider.pagestore .spider-cache/http/pages compact
+    python -m spider.pagestore .spider-cache/http/pages get URL > page.html
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import io
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO, Iterator
+from urllib.parse import urlsplit
+
+try:
+    import zstandard
+except ImportError:  # 可选依赖
+    zstandard = None
+
+CODECS = ("zstd", "zlib")
+DEFAULT_CODEC = "zstd" if zstandard is not None else "zlib"
+TRAIN_AFTER = 16       # 每个站点先存这么多页，再用它们训练字典
+TRAIN_SAMPLES = 64     # 训练时最多取样的页数
+ZLIB_DICT_SIZE = 32 * 1024
+ZSTD_DICT_SIZE = 112 * 1024
+LEVEL = {"zlib": 9, "zstd": 19}
+CHUNK = 64 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    url       TEXT PRIMARY KEY,
+    host      TEXT NOT NULL,
+    pack      TEXT NOT NULL DEFAULT 'pack',
+    codec     TEXT NOT NULL,
+    dict      INTEGER NOT NULL,   -- 0：不用字典
+    offset    INTEGER NOT NULL,
+    length    INTEGER NOT NULL,
+    size      INTEGER NOT NULL,
+    sha256    TEXT NOT NULL,
+    stored_at REAL
+);
+CREATE INDEX IF NOT EXISTS pages_body ON pages (host, sha256);
+CREATE TABLE IF NOT EXISTS dicts (
+    host       TEXT NOT NULL,
+    id         INTEGER NOT NULL,
+    codec      TEXT NOT NULL,
+    size       INTEGER NOT NULL,
+    samples    INTEGER NOT NULL,
+    created_at REAL,
+    PRIMARY KEY (host, id)
+);
+CREATE TABLE IF NOT EXISTS packs (
+    host TEXT PRIMARY KEY,
+    name TEXT NOT NULL    -- 新页面追加到的 pack 文件
+);
+"""
+COLUMNS = "url, host, pack, codec, dict, offset, length, size, sha256, stored_at"
+
+# 训练 zlib 字典时把页面切成这些片段：标签边界或换行
+_SEGMENTS = re.compile(rb"(?<=>)|\n")
+
+
+def train_zlib_dict(samples: list[bytes], size: int = ZLIB_DICT_SIZE) -> bytes:
+    """A preset dictionary of the pieces that recur across ``samples``.
+
+    Picks tag-/line-sized segments that occur in at least half of the pages,
+    most widespread first, up to ``size`` bytes; the most common ones go last,
+    closest to the data, where deflate's back-references are cheapest.
+    """
+    pages_with = Counter()
+    for sample in samples:
+        pages_with.update({seg for seg in _SEGMENTS.split(sample) if len(seg) >= 8})
+    threshold = max(2, len(samples) // 2)
+    picked, total = [], 0
+    for seg, n in pages_with.most_common():
+        if n < threshold:
+            break
+        if total + len(seg) <= size:
+            picked.append(seg)
+            total += len(seg)
+    return b"".join(reversed(picked))
+
+
+def train_dict(codec: str, samples: list[bytes]) -> bytes | None:
+    """A dictionary for ``codec``, or ``None`` if the samples are not enough to train one."""
+    if codec == "zstd":
+        try:
+            return zstandard.train_dictionary(ZSTD_DICT_SIZE, samples).as_bytes()
+        except zstandard.ZstdError:
+            # 样本太少或太短时 zstd 训练不出字典，先不用字典
+            return None
+    return train_zlib_dict(samples)
+
+
+def compress(codec: str, data: bytes, zdict: bytes = b"") -> bytes:
+    if codec == "zstd":
+        cdict = zstandard.ZstdCompressionDict(zdict) if zdict else None
+        return zstandard.ZstdCompressor(level=LEVEL["zstd"], dict_data=cdict).compress(data)
+    c = zlib.compressobj(LEVEL["zlib"], zdict=zdict) if zdict else zlib.compressobj(LEVEL["zlib"])
+    return c.compress(data) + c.flush()
+
+
+def _decompressor(codec: str, zdict: bytes):
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("this page was stored with zstd; pip install zstandard to read it")
+        ddict = zstandard.ZstdCompressionDict(zdict) if zdict else None
+        return zstandard.ZstdDecompressor(dict_data=ddict).decompressobj()
+    return zlib.decompressobj(zdict=zdict) if zdict else zlib.decompressobj()
+
+
+class _Inflate(io.RawIOBase):
+    """Decompresses one stored record as it is read."""
+
+    def __init__(self, compressed: bytes, decompressor):
+        self._src = io.BytesIO(compressed)
+        self._d = decompressor
+        self._buf = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        while not self._buf:
+            chunk = self._src.read(CHUNK)
+            if not chunk:
+                return 0
+            self._buf = self._d.decompress(chunk)
+        n = min(len(b), len(self._buf))
+        b[:n] = self._buf[:n]
+        self._buf = self._buf[n:]
+        return n
+
+
+def _host_dir(host: str) -> str:
+    return re.sub(r"[^\w.-]", "_", host)
+
+
+class PageStore:
+    """Thread-safe; writes from several fetch threads go through one lock.
+
+    Writes from other processes are serialized by the index database's write
+    lock (see the module docstring).
+    """
+
+    def __init__(self, root: str | os.PathLike, codec: str | None = None, train_after: int = TRAIN_AFTER):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.codec = codec or DEFAULT_CODEC
+        if self.codec == "zstd" and zstandard is None:
+            raise RuntimeError("codec zstd needs pip install zstandard")
+        self.train_after = train_after
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.root / "index.sqlite3", timeout=30, check_same_thread=False)
+        # 几个进程同时新建索引时切换 WAL 会撞锁，而且不走 busy timeout，只能自己重试
+        for attempt in range(100):
+            try:
+                self._db.execute("PRAGMA journal_mode=WAL")
+                break
+            except sqlite3.OperationalError:
+                if attempt == 99:
+                    raise
+                time.sleep(0.05)
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        with self._db:
+            self._db.execute("BEGIN IMMEDIATE")
+            columns = {row[1] for row in self._db.execute("PRAGMA table_info(pages)")}
+            if "pack" not in columns:
+                # 旧版索引：所有页面都在 <host>/pack 里
+                self._db.execute("ALTER TABLE pages ADD COLUMN pack TEXT NOT NULL DEFAULT 'pack'")
+        self._dicts: dict[tuple[str, int], bytes] = {}
+        self._trained: list[tuple[tuple[str, int], Path]] = []  # 本事务里训练、还没提交的字典
+        self._train_failed: dict[str, int] = {}  # 站点 → 上次训练失败时无字典的页数
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def _pack(self, host: str, name: str | None = None) -> Path:
+        if name is None:
+            row = self._db.execute("SELECT name FROM packs WHERE host = ?", (host,)).fetchone()
+            name = row[0] if row else "pack"
+        return self.root / _host_dir(host) / name
+
+    @contextmanager
+    def _transaction(self) -> Iterator[None]:
+        """Hold the write lock (``BEGIN IMMEDIATE``) until commit; forget dictionaries trained in a rollback."""
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._db.rollback()
+            # 回滚后这些字典的编号没有记录，缓存和文件都不能留：否则下次训练拿到同一个编号，会用旧字典压缩新页面
+            for key, path in self._trained:
+                self._dicts.pop(key, None)
+                path.unlink(missing_ok=True)
+            raise
+        else:
+            self._db.commit()
+        finally:
+            self._trained.clear()
+
+    def _dict_path(self, host: str, dict_id: int, codec: str) -> Path:
+        return self.root / _host_dir(host) / f"dict-{dict_id}.{codec}"
+
+    def _dict(self, host: str, dict_id: int, codec: str) -> bytes:
+        if not dict_id:
+            return b""
+        key = (host, dict_id)
+        if key not in self._dicts:
+            self._dicts[key] = self._dict_path(host, dict_id, codec).read_bytes()
+        return self._dicts[key]
+
+    def _current_dict(self, host: str) -> int:
+        row = self._db.execute(
+            "SELECT MAX(id) FROM dicts WHERE host = ? AND codec = ?", (host, self.codec)
+        ).fetchone()
+        return row[0] or 0
+
+    # ---- write ---------------------------------------------------------
+
+    def put(self, url: str, body: bytes) -> None:
+        """Store (or replace) the body of ``url``."""
+        host = urlsplit(url).netloc
+        digest = hashlib.sha256(body).hexdigest()
+        with self._lock:
+            # 拿到数据库写锁再查重、追加、写索引，别的进程这期间不会往同一个 pack 里写
+            with self._transaction():
+                self._put(url, host, body, digest)
+
+    def _put(self, url: str, host: str, body: bytes, digest: str) -> None:
+        row = self._db.execute("SELECT sha256 FROM pages WHERE url = ?", (url,)).fetchone()
+        if row and row[0] == digest:
+            return
+        same = self._db.execute(
+            "SELECT pack, codec, dict, offset, length FROM pages WHERE host = ? AND sha256 = ? LIMIT 1", (host, digest)
+        ).fetchone()
+        if same:
+            # 同一站点已有一模一样的正文：指向同一条记录
+            self._db.execute(f"INSERT OR REPLACE INTO pages ({COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                             (url, host, *same, len(body), digest, time.time()))
+            return
+        dict_id = self._current_dict(host)
+        data = compress(self.codec, body, self._dict(host, dict_id, self.codec))
+        pack = self._pack(host)
+        pack.parent.mkdir(parents=True, exist_ok=True)
+        # 先写数据再写索引：中途崩溃只会在 pack 末尾留下没人引用的字节
+        with open(pack, "ab") as f:
+            f.write(data)
+            f.flush()
+            offset = os.fstat(f.fileno()).st_size - len(data)
+        self._db.execute(
+            f"INSERT OR REPLACE INTO pages ({COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (url, host, pack.name, self.codec, dict_id, offset, len(data), len(body), digest, time.time()),
+        )
+        if not dict_id:
+            undictionaried = self._db.execute(
+                "SELECT COUNT(*) FROM pages WHERE host = ? AND dict = 0", (host,)
+            ).fetchone()[0]
+            # 训练失败过的站点，再攒够 train_after 页才重试
+            if undictionaried >= self.train_after + self._train_failed.get(host, 0):
+                if not self._train(host):
+                    self._train_failed[host] = undictionaried
+
+    def _train(self, host: str) -> int:
+        """Train and record a dictionary (not committed); 0 if none could be trained."""
+        # 每份不同的正文取一个，均匀地抽 TRAIN_SAMPLES 份
+        urls = [r[0] for r in self._db.execute(
+            "SELECT MIN(url) FROM pages WHERE host = ? GROUP BY sha256 ORDER BY MIN(stored_at)", (host,)
+        )]
+        step = max(1, len(urls) // TRAIN_SAMPLES)
+        samples = [self._read(url) for url in urls[::step][:TRAIN_SAMPLES]]
+        zdict = train_dict(self.codec, [s for s in samples if s])
+        if zdict is None:
+            return 0
+        # 编号也要越过磁盘上已有的字典文件（崩溃时没提交的那些），同一个编号绝不对应两份字典
+        last = self._db.execute("SELECT COALESCE(MAX(id), 0) FROM dicts WHERE host = ?", (host,)).fetchone()[0]
+        for p in (self.root / _host_dir(host)).glob("dict-*"):
+            if m := re.fullmatch(r"dict-(\d+)\.\w+", p.name):
+                last = max(last, int(m[1]))
+        dict_id = last + 1
+        path = self._dict_path(host, dict_id, self.codec)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_bytes(zdict)
+        os.replace(tmp, path)
+        self._trained.append(((host, dict_id), path))
+        self._db.execute("INSERT INTO dicts VALUES (?, ?, ?, ?, ?, ?)",
+                         (host, dict_id, self.codec, len(zdict), len(samples), time.time()))
+        return dict_id
+
+    def train(self, host: str) -> int:
+        """Train a new dictionary for ``host`` now; later pages use it. 0 if training failed."""
+        with self._lock, self._transaction():
+            return self._train(host)
+
+    # ---- read ----------------------------------------------------------
+
+    def _record(self, url: str) -> tuple[str, str, int, bytes] | None:
+        for attempt in range(2):
+            row = self._db.execute(
+                "SELECT host, pack, codec, dict, offset, length FROM pages WHERE url = ?", (url,)
+            ).fetchone()
+            if row is None:
+                return None
+            host, pack, codec, dict_id, offset, length = row
+            try:
+                with open(self._pack(host, pack), "rb") as f:
+                    f.seek(offset)
+                    data = f.read(length)
+            except FileNotFoundError:
+                # 另一个进程刚压缩完这个站点，旧 pack 已删：重新查索引
+                if attempt:
+                    raise
+                continue
+            return host, codec, dict_id, data
+        return None
+
+    def _read(self, url: str) -> bytes | None:
+        rec = self._record(url)
+        if rec is None:
+            return None
+        host, codec, dict_id, data = rec
+        d = _decompressor(codec, self._dict(host, dict_id, codec))
+        return d.decompress(data) + (d.flush() if codec == "zlib" else b"")
+
+    def sha256(self, url: str) -> str | None:
+        with self._lock:
+            row = self._db.execute("SELECT sha256 FROM pages WHERE url = ?", (url,)).fetchone()
+        return row[0] if row else None
+
+    def __contains__(self, url: str) -> bool:
+        return self.sha256(url) is not None
+
+    def get(self, url: str) -> bytes | None:
+        """The stored body of ``url``, or ``None``."""
+        with self._lock:
+            return self._read(url)
+
+    def open(self, url: str) -> BinaryIO | None:
+        """The body of ``url`` as a file object, decompressed while it is read."""
+        with self._lock:
+            rec = self._record(url)
+            if rec is None:
+                return None
+            host, codec, dict_id, data = rec
+            d = _decompressor(codec, self._dict(host, dict_id, codec))
+        return io.BufferedReader(_Inflate(data, d), CHUNK)
+
+    # ---- maintenance ---------------------------------------------------
+
+    def hosts(self) -> list[str]:
+        with self._lock:
+            return [r[0] for r in self._db.execute("SELECT DISTINCT host FROM pages ORDER BY host")]
+
+    def stats(self) -> list[dict]:
+        """Per host: pages, raw and compressed bytes, pack file size, current dictionary."""
+        out = []
+        with self._lock:
+            # 共用一条记录的页面，压缩后的字节只算一次
+            rows = self._db.execute(
+                "SELECT host, COUNT(*), SUM(size), SUM(CASE WHEN first THEN length ELSE 0 END), SUM(dict > 0) FROM"
+                " (SELECT *, ROW_NUMBER() OVER (PARTITION BY host, pack, offset) = 1 AS first FROM pages)"
+                " GROUP BY host ORDER BY host"
+            ).fetchall()
+            for host, pages, raw, stored, with_dict in rows:
+                pack = self._pack(host)
+                out.append({
+                    "host": host, "pages": pages, "raw": raw, "stored": stored, "with_dict": with_dict,
+                    "pack": pack.stat().st_size if pack.exists() else 0,
+                    # 最新的字典，不管是哪种编码（CLI 默认的编码可能和写入时不同）
+                    "dict": self._db.execute("SELECT COALESCE(MAX(id), 0) FROM dicts WHERE host = ?",
+                                             (host,)).fetchone()[0],
+                })
+        return out
+
+    def compact(self, host: str) -> tuple[int, int]:
+        """Retrain ``host``'s dictionary and rewrite its pack with it; (bytes before, after).
+
+        The bodies go to a new pack file; the index switches to it in one
+        transaction and the old packs are deleted after that commits, so a
+        crash at any point leaves a readable store.
+        """
+        host_dir = self.root / _host_dir(host)
+        new = None
+        with self._lock:
+            try:
+                with self._transaction():
+                    before = sum(p.stat().st_size for p in host_dir.glob("pack*"))
+                    dict_id = self._train(host)
+                    zdict = self._dict(host, dict_id, self.codec)
+                    urls = self._db.execute(
+                        "SELECT url, sha256 FROM pages WHERE host = ? ORDER BY pack, offset", (host,)
+                    ).fetchall()
+                    # 新 pack 取一个没用过的编号，绝不覆盖正在读的文件
+                    used = [int(m[1]) for p in host_dir.glob("pack.*") if (m := re.fullmatch(r"pack\.(\d+)", p.name))]
+                    new = self._pack(host, f"pack.{max(used, default=0) + 1}")
+                    rows = []
+                    written: dict[str, tuple[int, int]] = {}
+                    with open(new, "wb") as f:
+                        for url, digest in urls:
+                            if digest not in written:
+                                data = compress(self.codec, self._read(url), zdict)
+                                written[digest] = (f.tell(), len(data))
+                                f.write(data)
+                            rows.append((new.name, self.codec, dict_id, *written[digest], url))
+                        f.flush()
+                        os.fsync(f.fileno())
+                    self._db.executemany(
+                        "UPDATE pages SET pack = ?, codec = ?, dict = ?, offset = ?, length = ? WHERE url = ?", rows
+                    )
+                    self._db.execute("INSERT OR REPLACE INTO packs VALUES (?, ?)", (host, new.name))
+            except BaseException:
+                # 索引还指着旧 pack，写了一半的新 pack 没用了
+                if new is not None:
+                    new.unlink(missing_ok=True)
+                raise
+            for old in host_dir.glob("pack*"):
+                if old != new:
+                    old.unlink()
+            return before, new.stat().st_size
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description="Inspect or compact a compressed page store")
+    ap.add_argument("root", help="store directory (the response cache keeps one in .spider-cache/http/pages)")
+    sub = ap.add_subparsers(dest="command", required=True)
+    sub.add_parser("stats", help="pages and compression ratio per host")
+    p_compact = sub.add_parser("compact", help="recompress with each host's dictionary and drop replaced bodies")
+    p_compact.add_argument("hosts", nargs="*", help="only these hosts (default: all)")
+    p_get = sub.add_parser("get", help="write a stored page to stdout")
+    p_get.add_argument("url")
+    args = ap.parse_args(argv)
+
+    if not Path(args.root, "index.sqlite3").exists():
+        print(f"❌ no page store in {args.root}", file=sys.stderr)
+        return 1
+    store = PageStore(args.root)
+    try:
+        if args.command == "get":
+            f = store.open(args.url)
+            if f is None:
+                print(f"❌ not in the store: {args.url}", file=sys.stderr)
+                return 1
+            with f:
+                while chunk := f.read(CHUNK):
+                    sys.stdout.buffer.write(chunk)
+        elif args.command == "compact":
+            for host in args.hosts or store.hosts():
+                before, after = store.compact(host)
+                print(f"🗜️ {host}: {before} → {after} bytes")
+        else:
+            for s in store.stats():
+                ratio = s["stored"] / s["raw"] if s["raw"] else 0.0
+                print(f"🗜️ {s['host']}: {s['pages']} pages, {s['raw']} → {s['stored']} bytes ({ratio:.1%}), "
+                      f"pack {s['pack']} bytes, dictionary #{s['dict']} ({s['with_dict']} pages use one)")
+    finally:
+        store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,191 @@
+"""Pluggable HTML parser backend for every extractor.
+
+All extractors build their tree through ``make_soup`` instead of calling
+``BeautifulSoup(html, "html.parser")`` directly, so the parser can be chosen
+once per run:
+
+* ``html.parser`` – the standard library parser (pure Python, slowest, always there)
+* ``lxml``        – libxml2 via bs4's lxml tree builder
+* ``selectolax``  – lexbor via the tree builder below, which walks the
+  selectolax tree and feeds it into bs4, so extractors keep the bs4 API
+* ``html5lib``    – spec-exact but even slower; mostly useful for comparison
+
+The backend comes from ``SPIDER_PARSER`` (or ``--parser``). A backend that is
+not installed falls back to ``html.parser`` with a warning. Check that a
+backend produces the same Markdown before switching to it::
+
+    python -m spider.parse church-affairs page.html --encoding utf-8
+"""
+from __future__ import annotations
+
+import os
+import re
+import sys
+import time
+import warnings
+
+from bs4 import BeautifulSoup, FeatureNotFound, SoupStrainer
+from bs4.builder import HTMLTreeBuilder, builder_registry
+from bs4.element import Comment
+
+from .profile import stage
+
+DEFAULT_BACKEND = "html.parser"
+BACKENDS = ("html.parser", "lxml", "selectolax", "html5lib")
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:  # pragma: no cover - optional dependency
+    LexborHTMLParser = None
+
+
+class SelectolaxTreeBuilder(HTMLTreeBuilder):
+    """bs4 tree builder that parses with selectolax (lexbor)."""
+
+    NAME = "selectolax"
+    ALTERNATE_NAMES = ["lexbor"]
+    features = [NAME, *ALTERNATE_NAMES, "html", "fast", "permissive"]
+
+    def prepare_markup(self, markup, user_specified_encoding=None,
+                       document_declared_encoding=None, exclude_encodings=None):
+        if isinstance(markup, bytes):
+            # 抓取层已经按站点编码解码过，这里只为直接传 bytes 的调用兜底
+            markup = markup.decode(user_specified_encoding or "utf-8", errors="replace")
+        yield markup, None, None, False
+
+    def feed(self, markup: str) -> None:
+        assert self.soup is not None
+        soup = self.soup
+        tree = LexborHTMLParser(markup)
+        root = tree.root
+        if root is None:
+            return
+        # 迭代式先序遍历，遇到元素先发 start，子节点处理完再发 end
+        stack = [(root, False)]
+        while stack:
+            node, closing = stack.pop()
+            if closing:
+                soup.endData()
+                soup.handle_endtag(node.tag)
+                continue
+            if node.is_text_node:
+                soup.handle_data(node.text_content or "")
+            elif node.is_comment_node:
+                soup.endData()
+                soup.handle_data((node.html or "")[4:-3])
+                soup.endData(Comment)
+            elif node.is_element_node:
+                attrs = {k: (v if v is not None else "") for k, v in node.attributes.items()}
+                soup.handle_starttag(node.tag, None, None, attrs)
+                stack.append((node, True))
+                children = list(node.iter(include_text=True))
+                stack.extend((child, False) for child in reversed(children))
+
+    def test_fragment_to_document(self, fragment: str) -> str:
+        return f"<html><body>{fragment}</body></html>"
+
+
+if LexborHTMLParser is not None:
+    builder_registry.register(SelectolaxTreeBuilder)
+
+
+def backend_available(name: str) -> bool:
+    try:
+        BeautifulSoup("", name)
+    except FeatureNotFound:
+        return False
+    return True
+
+
+def available_backends() -> list[str]:
+    return [name for name in BACKENDS if backend_available(name)]
+
+
+_backend = DEFAULT_BACKEND
+
+
+def set_backend(name: str | None) -> str:
+    """Select the parser for all later ``make_soup`` calls; returns the one in effect."""
+    global _backend
+    name = name or DEFAULT_BACKEND
+    if not backend_available(name):
+        warnings.warn(f"HTML parser backend {name!r} is not installed; using {DEFAULT_BACKEND}")
+        name = DEFAULT_BACKEND
+    _backend = name
+    return name
+
+
+def get_backend() -> str:
+    return _backend
+
+
+def make_soup(html: str | bytes, parse_only: SoupStrainer | None = None, backend: str | None = None) -> BeautifulSoup:
+    """Parse ``html`` with the selected backend."""
+    backend = backend or _backend
+    if backend == "html5lib":
+        # html5lib 不支持 parse_only，只能整页解析（抽取函数对整页和子树都适用）
+        parse_only = None
+    # 解析耗时单独记下，spider.metrics 据此把抽取时间拆成 parse / convert
+    with stage("parse"):
+        return BeautifulSoup(html, backend, parse_only=parse_only)
+
+
+def has_class(*names: str) -> re.Pattern[str]:
+    """Attribute matcher for any of ``names`` in a (possibly multi-valued) ``class``.
+
+    While parsing, a strainer sees the raw attribute string (``"main foo"``),
+    so ``class_="main"`` alone would miss it.
+    """
+    alternatives = "|".join(re.escape(name) for name in names)
+    return re.compile(rf"(?:^|\s)(?:{alternatives})(?:\s|$)")
+
+
+if os.environ.get("SPIDER_PARSER"):
+    set_backend(os.environ["SPIDER_PARSER"])
+
+
+def compare_backends(extract, html: str, backends: list[str] | None = None) -> dict[str, tuple[str, float]]:
+    """Run ``extract(html)`` on every backend; returns ``{backend: (markdown, seconds)}``."""
+    previous = get_backend()
+    out = {}
+    try:
+        for name in backends or available_backends():
+            set_backend(name)
+            t0 = time.perf_counter()
+            md = extract(html)
+            out[name] = (md, time.perf_counter() - t0)
+    finally:
+        set_backend(previous)
+    return out
+
+
+def main(argv: list[str] | None = None) -> int:
+    import argparse
+
+    from .scripts import EXTRACTORS, get_extractor
+
+    ap = argparse.ArgumentParser(description="Check that every parser backend gives identical Markdown")
+    ap.add_argument("extractor", choices=sorted(EXTRACTORS))
+    ap.add_argument("files", nargs="+", help="saved HTML pages")
+    ap.add_argument("--encoding", default="utf-8", help="encoding of the saved pages (lightinnj/uoregon: gb18030)")
+    args = ap.parse_args(argv)
+
+    extract = get_extractor(args.extractor)
+    failed = 0
+    for path in args.files:
+        with open(path, "rb") as f:
+            html = f.read().decode(args.encoding, errors="replace")
+        results = compare_backends(extract, html)
+        reference = results[DEFAULT_BACKEND][0]
+        for name, (md, seconds) in results.items():
+            same = md == reference
+            failed += not same
+            print(f"{'✅' if same else '❌'} {path} [{name}] {seconds * 1000:.1f} ms")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    # python -m 运行时本文件是 __main__，而抽取函数读的是 spider.parse 里的后端，
+    # 要在那个模块上切换，否则每个“后端”其实都是 html.parser
+    from spider.parse import main as parse_main
+    sys.exit(parse_main())
@@ -0,0 +1,218 @@
+"""Render a book to PDF one volume at a time.
+
+``md-to-pdf`` over a whole book is the slowest step after an edit. Here the
+finished Markdown is split at its volume headings (``## 第一辑`` … of 十二篮:
+a ``##`` heading ending in 辑, 卷, 册, 部 or 编; everything before the first
+one goes with the first part) into ``.spider-cache/pdf/<book>/NN.md``.
+Chapters are not split apart: every part starts on a new page, which a full
+render does not do between chapters, so a book without volumes (教会的事务,
+马太福音查经记录) stays one part and renders exactly as a whole.
+``--split-at`` takes another heading pattern. A manifest keeps the
+SHA-256 of each part and of the config file, so a rebuild renders only the
+parts whose text changed, all in one ``md-to-pdf`` call, and then merges the
+part PDFs into one::
+
+    python scraper-12-brackets.py --incremental --clean
+    python -m spider.pdf 十二篮.md --config-file md2pdf.json
+
+The merge needs ``pypdf`` (in requirements.txt). Each part's bookmarks
+(``"outline": true`` in md2pdf.json) are copied with their page numbers
+shifted, under one top-level bookmark for the book. Things that only work
+within one render do not cross parts: the page numbers in the footer restart
+for every part, and in-document links (a table of contents at the top) only
+reach headings of the first part.
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import shlex
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Iterable, Iterator
+
+try:
+    from pypdf import PdfReader, PdfWriter
+except ImportError:  # 只有合并时才需要
+    PdfReader = PdfWriter = None
+
+DEFAULT_DIR = ".spider-cache/pdf"
+DEFAULT_RENDERER = os.environ.get("SPIDER_MD2PDF", "md-to-pdf")
+MANIFEST = "manifest.json"
+# 卷一级的标题才拆开（十二篮的“## 第一辑”）；按章拆会在每章前多出分页
+VOLUME = r"## .*[辑卷册部编]\s*$"
+
+
+def split_parts(lines: Iterable[str], split_at: str = VOLUME) -> Iterator[list[str]]:
+    """Group Markdown lines into parts starting at each heading matching ``split_at`` (outside code fences)."""
+    boundary = re.compile(split_at)
+    part: list[str] = []
+    fenced = False
+    for line in lines:
+        if line.startswith("```"):
+            fenced = not fenced
+        if not fenced and boundary.match(line) and any(l.strip() and not l.startswith("# ") for l in part):
+            yield part
+            part = []
+        part.append(line)
+    if part:
+        yield part
+
+
+def book_title(path: Path) -> str:
+    """The book's ``#`` heading, else the file name."""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.startswith("# "):
+                return line[2:].strip()
+    return path.stem
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class PartBuild:
+    """The parts of one book under ``root/<book>`` and which of them need rendering."""
+
+    def __init__(self, markdown: str | Path, root: str | Path = DEFAULT_DIR, config_file: str | Path | None = None,
+                 split_at: str = VOLUME):
+        self.markdown = Path(markdown)
+        self.dir = Path(root) / self.markdown.stem
+        self.config_file = Path(config_file) if config_file else None
+        self.split_at = split_at
+        self.parts: list[Path] = []
+        self.stale: list[Path] = []
+        self._hashes: dict = {}
+
+    def _manifest(self) -> dict:
+        try:
+            return json.loads((self.dir / MANIFEST).read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def prepare(self, force: bool = False) -> list[Path]:
+        """Write the parts; returns the ones whose PDF is missing or out of date."""
+        self.dir.mkdir(parents=True, exist_ok=True)
+        old = self._manifest()
+        config = _sha256(self.config_file.read_bytes()) if self.config_file else ""
+        # 配置变了（页边距、页脚……）每一部分都要重新生成
+        if old.get("config") != config:
+            force = True
+        hashes: dict[str, str] = {}
+        with open(self.markdown, encoding="utf-8") as f:
+            for n, lines in enumerate(split_parts(f, self.split_at)):
+                part = self.dir / f"{n:03d}.md"
+                data = "".join(lines).encode("utf-8")
+                hashes[part.name] = digest = _sha256(data)
+                if old.get("parts", {}).get(part.name) != digest or not part.exists():
+                    part.write_bytes(data)
+                if force or old.get("parts", {}).get(part.name) != digest or not part.with_suffix(".pdf").exists():
+                    self.stale.append(part)
+                self.parts.append(part)
+        # 书变短了：多出来的旧部分删掉
+        for extra in self.dir.glob("*.md"):
+            if extra.name not in hashes:
+                extra.unlink()
+                extra.with_suffix(".pdf").unlink(missing_ok=True)
+        self._hashes = {"config": config, "parts": hashes}
+        return self.stale
+
+    def render(self, renderer: str = DEFAULT_RENDERER) -> None:
+        """Render the stale parts with one renderer call, then record them in the manifest."""
+        if self.stale:
+            cmd = shlex.split(renderer) + [str(p) for p in self.stale]
+            cmd += ["--basedir", str(self.markdown.resolve().parent)]
+            if self.config_file:
+                cmd += ["--config-file", str(self.config_file)]
+            subprocess.run(cmd, check=True)
+            missing = [p.name for p in self.stale if not p.with_suffix(".pdf").exists()]
+            if missing:
+                raise RuntimeError(f"{renderer} did not write {', '.join(missing)}")
+        # 全部生成成功才写清单，中途失败的部分下次还会重做
+        (self.dir / MANIFEST).write_text(json.dumps(self._hashes, ensure_ascii=False, indent=1), encoding="utf-8")
+
+
+def _copy_outline(writer, reader, items: list, offset: int, parent) -> None:
+    # pypdf 的书签列表：紧跟在某一项后面的子列表是它的下级
+    last = parent
+    for item in items:
+        if isinstance(item, list):
+            _copy_outline(writer, reader, item, offset, last)
+        else:
+            page = reader.get_destination_page_number(item)
+            last = writer.add_outline_item(item.title, page + offset, parent=parent)
+
+
+def merge(parts: list[Path], out: str | Path, title: str) -> int:
+    """Concatenate the part PDFs into ``out`` under one ``title`` bookmark; returns the page count."""
+    if PdfWriter is None:
+        raise RuntimeError("merging the parts needs pypdf: pip install pypdf")
+    writer = PdfWriter()
+    root = None
+    for part in parts:
+        reader = PdfReader(part)
+        offset = len(writer.pages)
+        writer.append(reader, import_outline=False)
+        outline = list(reader.outline)
+        if root is None:
+            # 第一部分的书签通常就是以书名为根（# 标题在第一部分里），直接沿用
+            if len(outline) in (1, 2) and not isinstance(outline[0], list) and outline[0].title.strip() == title:
+                root = writer.add_outline_item(title, reader.get_destination_page_number(outline[0]))
+                outline = outline[1] if len(outline) == 2 else []
+            else:
+                root = writer.add_outline_item(title, 0)
+        _copy_outline(writer, reader, outline, offset, root)
+    writer.page_mode = "/UseOutlines"
+    with open(out, "wb") as f:
+        writer.write(f)
+    return len(writer.pages)
+
+
+def build_pdf(markdown: str | Path, out: str | Path | None = None, config_file: str | Path | None = None,
+              root: str | Path = DEFAULT_DIR, renderer: str = DEFAULT_RENDERER, title: str | None = None,
+              force: bool = False, split_at: str = VOLUME) -> Path:
+    """Render the changed parts of ``markdown`` and merge them into ``out`` (default: next to it, .pdf)."""
+    markdown = Path(markdown)
+    out = Path(out) if out else markdown.with_suffix(".pdf")
+    build = PartBuild(markdown, root, config_file, split_at)
+    started = time.monotonic()
+    stale = build.prepare(force)
+    print(f"📄 {markdown.name}: {len(build.parts)} parts, {len(stale)} to render")
+    build.render(renderer)
+    rendered = time.monotonic()
+    pages = merge([p.with_suffix(".pdf") for p in build.parts], out, title or book_title(markdown))
+    print(f"✅ 已生成：{out} ({pages} pages; render {rendered - started:.1f}s, merge {time.monotonic() - rendered:.1f}s)")
+    return out
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description="Render a book to PDF per volume, re-rendering only changed volumes")
+    ap.add_argument("markdown", help="the generated book, e.g. 十二篮.md")
+    ap.add_argument("--config-file", default=None, help="md-to-pdf config, e.g. md2pdf.json")
+    ap.add_argument("--out", default=None, help="output PDF (default: the book with .pdf)")
+    ap.add_argument("--title", default=None, help="top-level bookmark (default: the book's # heading)")
+    ap.add_argument("--parts-dir", default=DEFAULT_DIR, help=f"where the parts are kept (default: {DEFAULT_DIR})")
+    ap.add_argument("--renderer", default=DEFAULT_RENDERER,
+                    help=f"Markdown→PDF command, e.g. 'npx md-to-pdf' (default: $SPIDER_MD2PDF or {DEFAULT_RENDERER})")
+    ap.add_argument("--split-at", default=VOLUME,
+                    help=f"regex of the headings that start a part (default: volumes, {VOLUME!r})")
+    ap.add_argument("--force", action="store_true", help="re-render every part")
+    args = ap.parse_args(argv)
+
+    try:
+        build_pdf(args.markdown, args.out, args.config_file, args.parts_dir, args.renderer, args.title, args.force,
+                  args.split_at)
+    except (RuntimeError, OSError, subprocess.CalledProcessError) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,221 @@
+"""Process pool for the HTML→Markdown step.
+
+Fetching is I/O-bound and runs on the engine's event loop; extraction is
+pure-Python BeautifulSoup work and holds the GIL. With ``--workers N`` the
+fetched pages are handed to a ``ProcessPoolExecutor`` of N extractor
+processes, so a large build (e.g. the 66 Bible books) uses every core.
+
+Backpressure keeps memory bounded: at most ``max_pending`` pages are queued
+in or running on the pool, and while the pool is full the caller stops taking
+fetch results, which in turn stops new fetches from being started (see
+``Fetcher.iter_fetch(window=...)``). Results come back in completion order;
+``spider.writer.ordered`` puts them back in chapter order.
+
+Extract functions must be picklable, i.e. module-level functions (or
+``functools.partial`` of one) taking a ``FetchResult``. With one worker (the
+default) everything runs in-process as before. An extractor that wants to skip
+a page it cannot convert, without ending the build, returns
+``ExtractFailed(reason)``: nothing is written for it and the journal keeps the
+page unfinished, so ``--resume`` tries it again.
+"""
+from __future__ import annotations
+
+import atexit
+import hashlib
+import multiprocessing
+import os
+import sys
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from functools import lru_cache, partial
+from pathlib import Path
+from typing import Callable, Iterable, Iterator
+
+from . import metrics
+from .fetch import FetchResult
+from .parse import get_backend, set_backend
+from .profile import Totals, collect, merge, stage, stage_seconds
+from .scripts import SCRIPTS, load_script, script_module_name
+
+Extract = Callable[[FetchResult], str]
+
+
+class ExtractFailed(str):
+    """Empty Markdown for a page the extractor gave up on; ``error`` says why."""
+
+    def __new__(cls, error: str = "") -> "ExtractFailed":
+        self = super().__new__(cls, "")
+        self.error = error
+        return self
+
+
+def default_workers() -> int:
+    """Extractor processes (``SPIDER_WORKERS``; 0 means one per CPU)."""
+    workers = int(os.environ.get("SPIDER_WORKERS", 1))
+    return workers if workers > 0 else os.cpu_count() or 1
+
+
+_workers = default_workers()
+_max_pending: int | None = None
+_pool: ProcessPoolExecutor | None = None
+_pool_lock = threading.Lock()
+
+
+def configure(workers: int | None = None, max_pending: int | None = None) -> None:
+    """Set the worker count (0 = one per CPU) and the in-flight page limit; call before the first build."""
+    global _workers, _max_pending
+    shutdown()
+    if workers is not None:
+        _workers = workers if workers > 0 else os.cpu_count() or 1
+    _max_pending = max_pending
+
+
+def workers() -> int:
+    return _workers
+
+
+def max_pending() -> int:
+    """Pages allowed in flight on the pool (default: two per worker)."""
+    return _max_pending or 2 * _workers
+
+
+def _mp_context():
+    # 抓取引擎的线程已经在跑，fork 出来的子进程可能继承到被占用的锁
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+def _init_worker(backend: str, scripts: list[str]) -> None:
+    # 子进程用同一个解析器后端，输出才与单进程一致
+    set_backend(backend)
+    # 以 spider.scripts.load_script 载入的脚本（spider.library），子进程里也要能按模块名找到
+    for name in scripts:
+        load_script(name)
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            loaded = [name for name in SCRIPTS if script_module_name(name) in sys.modules]
+            _pool = ProcessPoolExecutor(
+                max_workers=_workers, mp_context=_mp_context(),
+                initializer=_init_worker, initargs=(get_backend(), loaded),
+            )
+        return _pool
+
+
+def shutdown() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
+
+
+atexit.register(shutdown)
+
+
+def _timed(extract: Extract, result: FetchResult) -> tuple[str, Totals]:
+    """``extract(result)`` plus its stage times (see ``spider.profile``); runs in the worker."""
+    with collect() as stages, stage("extract"):
+        md = extract(result)
+    return md, stages
+
+
+def extractor_name(extract: Extract) -> str:
+    func = extract.func if isinstance(extract, partial) else extract
+    return getattr(func, "__qualname__", type(func).__name__)
+
+
+# 抽取结果除了脚本本身，还取决于这几个共用模块
+EXTRACT_MODULES = ("clean.py", "page.py", "parse.py")
+
+
+@lru_cache(maxsize=None)
+def _source_digest(paths: tuple[str, ...]) -> str:
+    h = hashlib.sha256()
+    for path in paths:
+        h.update(Path(path).read_bytes())
+    return h.hexdigest()[:16]
+
+
+def extractor_version(extract: Extract) -> str:
+    """Version of ``extract`` for the crawl journal: a digest of its source and the parser backend.
+
+    Editing the script that defines the extractor or the shared cleaning and
+    parsing modules changes the version, so ``--incremental`` re-extracts
+    every chapter; otherwise only chapters whose page changed are redone.
+    """
+    func = extract.func if isinstance(extract, partial) else extract
+    module = sys.modules.get(getattr(func, "__module__", ""))
+    here = Path(__file__).parent
+    paths = [getattr(module, "__file__", None) or ""] + [str(here / name) for name in EXTRACT_MODULES]
+    digest = _source_digest(tuple(p for p in paths if p and Path(p).is_file()))
+    return f"{extractor_name(extract)}@{digest}+{get_backend()}"
+
+
+def iter_extract(
+    results: Iterable[tuple[int, FetchResult]],
+    extract: Extract,
+    book: str = "",
+    reuse: Callable[[FetchResult], str | None] | None = None,
+) -> Iterator[tuple[int, FetchResult, str]]:
+    """Yield ``(index, result, markdown)`` for each fetched page, in completion order.
+
+    With more than one worker ``extract`` runs on the process pool, with at
+    most ``max_pending()`` pages submitted at a time. Pages that could not be
+    fetched are not extracted; they come back with empty Markdown (and are
+    listed by ``spider.fetch.print_report``). Parse and convert time per page
+    go to ``spider.profile`` and, when it is enabled, ``spider.metrics``.
+    When ``reuse`` returns Markdown for a page (an unchanged chapter, see
+    ``spider.journal``) that page is not extracted at all.
+    """
+    m = metrics.get()
+    name = extractor_name(extract)
+
+    def done(idx: int, result: FetchResult, out: tuple[str, Totals]) -> tuple[int, FetchResult, str]:
+        md, stages = out
+        merge(stages)
+        if m is not None:
+            m.extract(name, result.url, stage_seconds(stages, "parse"), stages["extract"][0], book)
+        return idx, result, md
+
+    if _workers <= 1:
+        for idx, result in results:
+            if not result.ok:
+                yield idx, result, ""
+            elif reuse and (md := reuse(result)) is not None:
+                yield idx, result, md
+            else:
+                yield done(idx, result, _timed(extract, result))
+        return
+
+    pool = get_pool()
+    limit = max_pending()
+    pending: dict[Future, tuple[int, FetchResult]] = {}
+
+    def drain(block_until: int) -> Iterator[tuple[int, FetchResult, str]]:
+        while len(pending) > block_until:
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                idx, result = pending.pop(fut)
+                yield done(idx, result, fut.result())
+
+    try:
+        for idx, result in results:
+            if not result.ok:
+                yield idx, result, ""
+                continue
+            if reuse and (md := reuse(result)) is not None:
+                yield idx, result, md
+                continue
+            pending[pool.submit(_timed, extract, result)] = (idx, result)
+            if m is not None:
+                m.queue("extract_pending", len(pending))
+            # 池子满了就先等一页做完，再去取下一个抓取结果
+            yield from drain(limit - 1)
+        yield from drain(0)
+    finally:
+        for fut in pending:
+            fut.cancel()
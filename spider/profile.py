@@ -0,0 +1,303 @@
+"""Stage timers and the ``--profile`` option.
+
+The engine wraps its stages in ``stage(name)``:
+
+- ``fetch``: one HTTP request (``Fetcher._get``, on the fetch threads);
+- ``extract``: one page through its extractor, with ``parse`` (building the
+  soup) and ``normalize`` (text clean-up) nested inside;
+- ``write``: ``MarkdownWriter``, with its ``normalize``, ``clean`` and ``epub``
+  steps.
+
+The timers are always on (two ``perf_counter`` calls per stage, at page or
+paragraph granularity) and ``spider.metrics`` reads the parse time from them.
+Stage times are busy time summed over threads, so with concurrent fetches
+``fetch`` can exceed the wall time. Pages extracted on the ``--workers`` pool
+bring their stage times back with the result.
+
+``--profile`` prints a per-stage breakdown when the run ends and writes it to
+``PREFIX.stages.txt``, plus ``PREFIX.collapsed``: one ``stage;substage µs``
+line per stage path (self time), the collapsed-stack format read by
+flamegraph.pl and speedscope. Modes:
+
+- ``stages`` (default): only the timers;
+- ``cprofile``: also cProfile over the main thread (where extraction runs
+  unless ``--workers`` > 1) → ``PREFIX.pstats`` and the top functions;
+- ``tracemalloc``: also peak memory and the top allocation sites →
+  ``PREFIX.tracemalloc.txt``;
+- ``sample``: also sample the stacks of every thread every few milliseconds;
+  ``PREFIX.collapsed`` then holds function-level stacks (sample counts)::
+
+    python scraper-12-brackets.py --profile sample
+    flamegraph.pl .spider-cache/profile/scraper-12-brackets.collapsed > 12.svg
+"""
+from __future__ import annotations
+
+import argparse
+import atexit
+import functools
+import io
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Callable, TypeVar
+
+MODES = ("stages", "cprofile", "tracemalloc", "sample")
+DEFAULT_DIR = ".spider-cache/profile"
+SAMPLE_INTERVAL = 0.005
+
+F = TypeVar("F", bound=Callable)
+
+# 路径 "extract;parse" → [秒, 次数]
+Totals = dict[str, list]
+
+_local = threading.local()
+_registry: list[Totals] = []  # 每个线程一份，汇总时相加
+_registry_lock = threading.Lock()
+_merged: Totals = {}          # 抽取进程带回来的
+
+
+def _totals() -> Totals:
+    totals = getattr(_local, "totals", None)
+    if totals is None:
+        totals = _local.totals = {}
+        _local.stack = []
+        with _registry_lock:
+            _registry.append(totals)
+    return totals
+
+
+class stage:
+    """``with stage("parse"): ...`` adds the elapsed time to this thread's totals."""
+
+    __slots__ = ("name", "t0", "path")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self) -> "stage":
+        _totals()
+        stack = _local.stack
+        self.path = f"{stack[-1]};{self.name}" if stack else self.name
+        stack.append(self.path)
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        elapsed = time.perf_counter() - self.t0
+        _local.stack.pop()
+        entry = _local.totals.get(self.path)
+        if entry is None:
+            _local.totals[self.path] = [elapsed, 1]
+        else:
+            entry[0] += elapsed
+            entry[1] += 1
+
+
+def timed(name: str) -> Callable[[F], F]:
+    """Decorator form of ``stage``."""
+    def wrap(func: F) -> F:
+        @functools.wraps(func)
+        def inner(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+        return inner  # type: ignore[return-value]
+    return wrap
+
+
+class collect:
+    """Record the stages of a block on their own (e.g. one page in a worker process).
+
+    ``with collect() as stages:`` gives a fresh ``Totals`` dict that is not
+    part of this thread's totals; hand it to ``merge`` where it should count.
+    """
+
+    def __enter__(self) -> Totals:
+        _totals()
+        self.saved = (_local.totals, _local.stack)
+        _local.totals, _local.stack = {}, []
+        return _local.totals
+
+    def __exit__(self, *exc) -> None:
+        _local.totals, _local.stack = self.saved
+
+
+def merge(stages: Totals) -> None:
+    with _registry_lock:
+        for path, (seconds, calls) in stages.items():
+            entry = _merged.setdefault(path, [0.0, 0])
+            entry[0] += seconds
+            entry[1] += calls
+
+
+def stage_seconds(stages: Totals, name: str) -> float:
+    """Total time of every ``name`` stage in ``stages``, wherever it is nested."""
+    return sum(v[0] for path, v in stages.items() if path.rpartition(";")[2] == name)
+
+
+def totals() -> Totals:
+    """All stage times of this process so far (every thread plus merged results)."""
+    out: Totals = {}
+    with _registry_lock:
+        for t in [*_registry, _merged]:
+            for path, (seconds, calls) in list(t.items()):
+                entry = out.setdefault(path, [0.0, 0])
+                entry[0] += seconds
+                entry[1] += calls
+    return out
+
+
+def _self_times(all_totals: Totals) -> dict[str, float]:
+    own = {path: v[0] for path, v in all_totals.items()}
+    for path, (seconds, _) in all_totals.items():
+        parent = path.rpartition(";")[0]
+        if parent in own:
+            own[parent] -= seconds
+    return {path: max(0.0, s) for path, s in own.items()}
+
+
+def breakdown(all_totals: Totals, wall: float) -> str:
+    own = _self_times(all_totals)
+    lines = [
+        f"⏱️  Stage breakdown: wall {wall:.2f}s (busy time, summed over threads)",
+        f"{'stage':<28} {'calls':>8} {'total s':>9} {'self s':>9} {'% wall':>7}",
+    ]
+    for path in sorted(all_totals):
+        seconds, calls = all_totals[path]
+        depth = path.count(";")
+        name = "  " * depth + path.rpartition(";")[2]
+        pct = 100 * seconds / wall if wall else 0.0
+        lines.append(f"{name:<28} {calls:>8} {seconds:>9.3f} {own[path]:>9.3f} {pct:>6.1f}%")
+    return "\n".join(lines)
+
+
+def collapsed(all_totals: Totals, root: str) -> str:
+    return "".join(
+        f"{root};{path} {round(s * 1e6)}\n" for path, s in sorted(_self_times(all_totals).items()) if s >= 1e-6
+    )
+
+
+class _Sampler(threading.Thread):
+    """Samples the Python stack of every other thread; counts collapsed stacks."""
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.interval = interval
+        self.stacks: Counter[str] = Counter()
+        self._halt = threading.Event()
+
+    def run(self) -> None:
+        names = {}
+        while not self._halt.wait(self.interval):
+            for t in threading.enumerate():
+                names[t.ident] = t.name
+            for ident, frame in sys._current_frames().items():
+                if ident == self.ident:
+                    continue
+                funcs = []
+                while frame is not None:
+                    code = frame.f_code
+                    funcs.append(f"{code.co_qualname} ({os.path.basename(code.co_filename)})")
+                    frame = frame.f_back
+                funcs.append(names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(funcs))] += 1
+
+    def stop(self) -> None:
+        self._halt.set()
+        self.join()
+
+
+class Profiler:
+    def __init__(self, mode: str, prefix: str | Path, root: str):
+        self.mode = mode
+        self.prefix = Path(prefix)
+        self.root = root
+        self.started = time.perf_counter()
+        self._cprofile = None
+        self._sampler: _Sampler | None = None
+        self._done = False
+        if mode == "cprofile":
+            import cProfile
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+        elif mode == "tracemalloc":
+            import tracemalloc
+            tracemalloc.start()
+        elif mode == "sample":
+            self._sampler = _Sampler()
+            self._sampler.start()
+
+    def finish(self) -> None:
+        if self._done:
+            return
+        self._done = True
+        wall = time.perf_counter() - self.started
+        self.prefix.parent.mkdir(parents=True, exist_ok=True)
+        written = [f"{self.prefix}.stages.txt", f"{self.prefix}.collapsed"]
+        report = [breakdown(totals(), wall)]
+
+        if self._cprofile is not None:
+            import pstats
+            self._cprofile.disable()
+            self._cprofile.dump_stats(f"{self.prefix}.pstats")
+            written.append(f"{self.prefix}.pstats")
+            buf = io.StringIO()
+            pstats.Stats(self._cprofile, stream=buf).sort_stats("cumulative").print_stats(25)
+            report.append(buf.getvalue().strip())
+        elif self.mode == "tracemalloc":
+            report.append(self._tracemalloc_report())
+            written.append(f"{self.prefix}.tracemalloc.txt")
+
+        if self._sampler is not None:
+            self._sampler.stop()
+            stacks = "".join(f"{stack} {n}\n" for stack, n in sorted(self._sampler.stacks.items()))
+        else:
+            stacks = collapsed(totals(), self.root)
+        Path(f"{self.prefix}.collapsed").write_text(stacks, encoding="utf-8")
+        Path(f"{self.prefix}.stages.txt").write_text(report[0] + "\n", encoding="utf-8")
+        # 写到 stderr：clean_12-brackets.py 可能正往 stdout 输出清洗结果
+        print("\n" + "\n\n".join(report), file=sys.stderr)
+        print(f"⏱️  Profile written to {', '.join(written)}", file=sys.stderr)
+
+    def _tracemalloc_report(self) -> str:
+        import tracemalloc
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        top = snapshot.statistics("lineno")[:25]
+        text = "\n".join(
+            [f"current {current / 2**20:.1f} MiB, peak {peak / 2**20:.1f} MiB; top allocation sites:"]
+            + [f"  {s}" for s in top]
+        )
+        Path(f"{self.prefix}.tracemalloc.txt").write_text(text + "\n", encoding="utf-8")
+        return text.splitlines()[0]
+
+
+_profiler: Profiler | None = None
+
+
+def start(mode: str = "stages", prefix: str | Path | None = None) -> Profiler:
+    """Start profiling this run; the report is written at exit."""
+    global _profiler
+    root = Path(sys.argv[0]).stem or "python"
+    if prefix is None:
+        prefix = Path(DEFAULT_DIR) / root
+    _profiler = Profiler(mode, prefix, root)
+    atexit.register(_profiler.finish)
+    return _profiler
+
+
+def add_arguments(ap: argparse.ArgumentParser) -> None:
+    ap.add_argument("--profile", nargs="?", const="stages", choices=MODES, default=None,
+                    help="print a per-stage time breakdown at the end and write a collapsed-stack file; "
+                         "cprofile / tracemalloc / sample add a profiler over the whole run (default mode: stages)")
+    ap.add_argument("--profile-out", metavar="PREFIX", default=None,
+                    help=f"where --profile writes its files (default: {DEFAULT_DIR}/<script>)")
+
+
+def start_from_args(args: argparse.Namespace) -> Profiler | None:
+    if not args.profile:
+        return None
+    return start(args.profile, args.profile_out)
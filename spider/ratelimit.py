@@ -0,0 +1,134 @@
+"""Per-host token-bucket rate limiting.
+
+Replaces the hard-coded ``time.sleep`` politeness in the scrapers. Every
+request to a host takes one token from that host's bucket; the bucket refills
+at the configured requests/sec. The budget is lowered automatically to honour
+``Crawl-delay`` from the host's robots.txt, and a ``Retry-After`` response
+header pauses the whole host (all workers) until the given time.
+"""
+from __future__ import annotations
+
+import asyncio
+import time
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable
+from urllib.robotparser import RobotFileParser
+
+# Retry-After 超过这个值就按上限处理，避免一次异常响应卡住整本书
+MAX_RETRY_AFTER = 300.0
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Seconds to wait from a ``Retry-After`` header (delta-seconds or HTTP-date)."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        seconds = float(value)
+    else:
+        try:
+            seconds = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    return min(max(seconds, 0.0), MAX_RETRY_AFTER)
+
+
+class TokenBucket:
+    """Async token bucket; must be used from a single event loop."""
+
+    def __init__(self, rate: float, burst: float = 1.0):
+        self.rate = rate
+        self.capacity = max(1.0, burst)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self) -> None:
+        while True:
+            now = time.monotonic()
+            if now < self.blocked_until:
+                await asyncio.sleep(self.blocked_until - now)
+                continue
+            self._refill(now)
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def block_for(self, seconds: float) -> None:
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+
+    def set_rate(self, rate: float) -> None:
+        self._refill(time.monotonic())
+        self.rate = rate
+
+
+class HostLimiter:
+    """One ``TokenBucket`` per host.
+
+    ``rate`` is the default requests/sec budget; ``host_rates`` overrides it
+    per host. When ``robots`` is given it is called once per host with the
+    robots.txt URL and should return the file's text (or ``None``); a
+    ``Crawl-delay`` found there caps that host's rate.
+    """
+
+    def __init__(
+        self,
+        rate: float = 2.0,
+        burst: float = 1.0,
+        host_rates: dict[str, float] | None = None,
+        robots: Callable[[str], Awaitable[str | None]] | None = None,
+        user_agent: str = "*",
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.host_rates = {h.lower(): r for h, r in (host_rates or {}).items()}
+        self.robots = robots
+        self.user_agent = user_agent
+        self._buckets: dict[str, TokenBucket] = {}
+        self._setup_locks: dict[str, asyncio.Lock] = {}
+
+    async def _bucket(self, scheme: str, host: str) -> TokenBucket:
+        bucket = self._buckets.get(host)
+        if bucket is not None:
+            return bucket
+        lock = self._setup_locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            if host not in self._buckets:
+                rate = self.host_rates.get(host, self.rate)
+                delay = await self._crawl_delay(scheme, host)
+                if delay:
+                    rate = min(rate, 1.0 / delay)
+                self._buckets[host] = TokenBucket(rate, self.burst)
+        return self._buckets[host]
+
+    async def _crawl_delay(self, scheme: str, host: str) -> float | None:
+        if self.robots is None:
+            return None
+        text = await self.robots(f"{scheme}://{host}/robots.txt")
+        if not text:
+            return None
+        parser = RobotFileParser()
+        parser.parse(text.splitlines())
+        delay = parser.crawl_delay(self.user_agent)
+        return float(delay) if delay else None
+
+    async def acquire(self, scheme: str, host: str) -> None:
+        await (await self._bucket(scheme, host)).acquire()
+
+    def retry_after(self, host: str, header: str | None) -> float | None:
+        """Pause ``host`` according to a ``Retry-After`` header; returns the pause."""
+        seconds = parse_retry_after(header)
+        bucket = self._buckets.get(host)
+        if seconds is not None and bucket is not None:
+            bucket.block_for(seconds)
+        return seconds
+
+    def host_rate(self, host: str) -> float | None:
+        bucket = self._buckets.get(host)
+        return bucket.rate if bucket else None
@@ -0,0 +1,120 @@
+"""Retry policy, failure classes and per-host circuit breakers.
+
+Every request of the fetch engine goes through the same rules instead of
+each script doing its own thing:
+
+- each failed response is classified (``classify``): ``timeout``,
+  ``connection``, ``throttled`` (403/429), ``server`` (5xx), ``client``
+  (other 4xx, e.g. 404), ``request`` (a malformed request, too many
+  redirects, ...) or ``circuit-open`` (not sent at all, see below);
+- ``timeout``, ``connection``, ``throttled`` and ``server`` are retried up to
+  ``RetryPolicy.retries`` times (``SPIDER_RETRIES``, default 3) with
+  exponential backoff and full jitter, unless the server sent
+  ``Retry-After`` (then the whole host waits that long instead);
+- a ``CircuitBreaker`` per host opens after ``threshold`` consecutive
+  timeouts / connection errors / 5xx: for ``cooldown`` seconds the host's
+  remaining requests fail at once instead of each burning timeout × retries.
+  After the cooldown one request is let through; a success closes the
+  breaker, another failure keeps it open.
+
+Pages that still fail are listed at the end by ``spider.fetch.print_report``
+and stay unfinished in the crawl journal, so ``--resume`` fetches just them.
+"""
+from __future__ import annotations
+
+import os
+import random
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .fetch import FetchResult
+
+TIMEOUT = "timeout"
+CONNECTION = "connection"
+THROTTLED = "throttled"
+SERVER = "server"
+CLIENT = "client"
+REQUEST = "request"
+CIRCUIT_OPEN = "circuit-open"
+
+RETRYABLE = frozenset({TIMEOUT, CONNECTION, THROTTLED, SERVER})
+# 这几类连续出现说明站点挂了（403/429/404 至少说明站点还在响应）
+HOST_DOWN = frozenset({TIMEOUT, CONNECTION, SERVER})
+
+
+def classify(result: FetchResult) -> str | None:
+    """Failure class of a result, ``None`` for a successful one."""
+    if result.failure:
+        return result.failure
+    if result.error:
+        return CONNECTION
+    if 200 <= result.status < 300:
+        return None
+    if result.status in (403, 429):
+        return THROTTLED
+    if result.status >= 500:
+        return SERVER
+    return CLIENT
+
+
+def default_retries() -> int:
+    """Retries per page after the first attempt (``SPIDER_RETRIES``)."""
+    return int(os.environ.get("SPIDER_RETRIES", 3))
+
+
+@dataclass
+class RetryPolicy:
+    retries: int = 3
+    base: float = 1.0   # 第一次重试前最多等这么多秒，之后每次翻倍
+    cap: float = 30.0
+
+    def delay(self, attempt: int) -> float:
+        """Seconds to wait before retry number ``attempt + 1`` (full jitter)."""
+        return random.uniform(0, min(self.cap, self.base * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """Per-host breaker; used from the engine's event loop only."""
+
+    def __init__(self, threshold: int = 5, cooldown: float = 30.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0  # 连续的“站点挂了”类失败
+        self.open_until = 0.0
+        self.trips = 0
+
+    @property
+    def is_open(self) -> bool:
+        return self.failures >= self.threshold and time.monotonic() < self.open_until
+
+    def allow(self) -> bool:
+        """Whether a request may go out now; after the cooldown lets one through."""
+        if self.failures < self.threshold:
+            return True
+        now = time.monotonic()
+        if now < self.open_until:
+            return False
+        # 半开：放这一个请求去试探，其余的再等一个冷却期
+        self.open_until = now + self.cooldown
+        return True
+
+    def record(self, failure: str | None) -> None:
+        if failure not in HOST_DOWN:
+            self.failures = 0
+            return
+        self.failures += 1
+        if self.failures >= self.threshold:
+            if self.failures == self.threshold:
+                self.trips += 1
+            self.open_until = max(self.open_until, time.monotonic() + self.cooldown)
+
+
+@dataclass
+class Failure:
+    """A page that still failed after all retries."""
+    url: str
+    kind: str
+    detail: str
+    attempts: int
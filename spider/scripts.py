@@ -0,0 +1,59 @@
+"""Import the scraper scripts (their file names are not valid module names)."""
+from __future__ import annotations
+
+import importlib.util
+import sys
+from pathlib import Path
+from types import ModuleType
+from typing import Callable
+
+from .page import Page
+
+ROOT = Path(__file__).resolve().parent.parent
+
+SCRIPTS = {
+    "12-brackets": "scraper-12-brackets.py",
+    "church-affairs": "scraper-church-affairs.py",
+    "light-in-nj": "scraper-light-in-nj-song.py",
+    "matthew": "scraper-Mattew-Study-Nee.py",
+    "newadvent": "scraper-lectures-on-the-Gospel-of-John.py",
+    "wikisource": "scraper-high-wenli-union-Bible.py",
+}
+
+
+def script_module_name(name: str) -> str:
+    return "scraper_" + name.replace("-", "_")
+
+
+def load_script(name: str) -> ModuleType:
+    """Load ``scraper-*.py`` by short name (see ``SCRIPTS``); cached in ``sys.modules``."""
+    modname = script_module_name(name)
+    if modname in sys.modules:
+        return sys.modules[modname]
+    spec = importlib.util.spec_from_file_location(modname, ROOT / SCRIPTS[name])
+    assert spec and spec.loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[modname] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+# 每个站点“一页 → Markdown”的抽取入口，参数是 spider.page.Page
+EXTRACTORS: dict[str, Callable[[ModuleType], Callable[[Page], str]]] = {
+    "12-brackets": lambda m: m.third_p_to_markdown,
+    "church-affairs": lambda m: m.chapter_to_markdown,
+    "light-in-nj": lambda m: m.extract_page_content,
+    "matthew": lambda m: m.extract_content,
+    "newadvent": lambda m: lambda page: m.article_to_markdown(page, "Article"),
+    "wikisource": lambda m: lambda page: "\n".join(m.extract_book(page)),
+}
+
+
+def get_extractor(name: str) -> Callable[[str], str]:
+    """``html → Markdown`` for the named site; each call wraps the HTML in a fresh ``Page``.
+
+    Relative links resolve against the script's ``BASE_URL``.
+    """
+    module = load_script(name)
+    extract = EXTRACTORS[name](module)
+    return lambda html: extract(Page(html, module.BASE_URL))
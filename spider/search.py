@@ -0,0 +1,328 @@
+"""Full-text search over the generated books.
+
+``index`` reads each book's Markdown into a SQLite FTS5 index: one row per
+paragraph, with the book, the heading path (``#`` … ``####``) it sits
+under and the source URL from its section's ``[原文链接](…)`` line. Chinese
+has no word boundaries, so CJK text is indexed as overlapping bigrams
+(约翰福音 → 约翰 翰福 福音 音) and a query becomes a phrase of its bigrams:
+any substring of two or more characters is found exactly, a single
+character matches as a prefix. Latin words are indexed as words::
+
+    python -m spider.search index 十二篮.md 教会的事务.md 歌中之歌.md 马太福音查经记录.md
+    python -m spider.search query 神的旨意
+    python -m spider.search query 神的旨意 --book 十二篮 --limit 5
+
+Terms separated by spaces must all occur in the same paragraph. Re-indexing
+is incremental: a book whose file is unchanged (size and mtime, else
+SHA-256) is skipped, a changed book is replaced in one transaction.
+``python -m spider.library`` indexes the books it built at the end.
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import re
+import sqlite3
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Iterator
+
+DEFAULT_INDEX = ".spider-cache/search.sqlite3"
+
+# 分词或分段规则变了就得整个重建（无内容 FTS 表删除时要重算原来的词）
+TOKENIZER_VERSION = "2"  # 2：教会的事务的原文链接
+
+CJK = "\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\U00020000-\U0002ffff"  # 中日韩统一表意文字（含扩展区）
+RUNS = re.compile(f"([{CJK}]+)|([^\\W_{CJK}]+)")
+HEADING = re.compile(r"(#{1,4}) +(.+?)\s*$")
+SOURCE_LINK = re.compile(r"\[原文链接\]\((.+?)\)")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS books (
+    name       TEXT PRIMARY KEY,
+    path       TEXT NOT NULL,
+    size       INTEGER,
+    mtime_ns   INTEGER,
+    sha256     TEXT,
+    paragraphs INTEGER,
+    indexed_at REAL
+);
+CREATE TABLE IF NOT EXISTS paragraphs (
+    id      INTEGER PRIMARY KEY,
+    book    TEXT NOT NULL,
+    heading TEXT NOT NULL,
+    url     TEXT,
+    line    INTEGER,
+    text    TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS paragraphs_book ON paragraphs (book);
+-- 词表只存在 FTS 里，原文在 paragraphs.text
+CREATE VIRTUAL TABLE IF NOT EXISTS paragraphs_fts USING fts5 (tokens, content='');
+"""
+
+
+def tokenize(text: str) -> str:
+    """Space-separated index terms: CJK bigrams (plus the last character of each run) and lower-case words."""
+    terms = []
+    for m in RUNS.finditer(text):
+        cjk, word = m.groups()
+        if word:
+            terms.append(word.lower())
+            continue
+        terms.extend(cjk[i:i + 2] for i in range(len(cjk) - 1))
+        terms.append(cjk[-1])
+    return " ".join(terms)
+
+
+def match_expression(query: str) -> str:
+    """FTS5 ``MATCH`` expression for a query: one phrase per CJK run / word, all required."""
+    parts = []
+    for m in RUNS.finditer(query):
+        cjk, word = m.groups()
+        if word:
+            parts.append(f'"{word.lower()}"')
+        elif len(cjk) == 1:
+            parts.append(f'"{cjk}"*')
+        else:
+            parts.append('"' + " ".join(cjk[i:i + 2] for i in range(len(cjk) - 1)) + '"')
+    if not parts:
+        raise ValueError(f"nothing to search for in {query!r}")
+    return " AND ".join(parts)
+
+
+@dataclass
+class Paragraph:
+    heading: str  # "第一辑 › 第一辑第一篇 › 一　平安心思属灵"
+    url: str | None
+    line: int
+    text: str
+
+
+def iter_paragraphs(lines: Iterable[str]) -> Iterator[Paragraph]:
+    """Paragraphs of a Markdown book with their heading path and source URL; headings count as paragraphs.
+
+    A ``[原文链接](…)`` line right under a heading covers that heading's section
+    (十二篮); one after the text (教会的事务) covers the ``##`` chapter it ends,
+    so a chapter's paragraphs are held back until its link or the next chapter.
+    """
+    # 标题栈：(级别, 标题, 该层的原文链接)
+    stack: list[tuple[int, str, str | None]] = []
+    pending: list[Paragraph] = []  # 本章还没有链接的段落，等章末的原文链接
+    after_heading = False
+    for lineno, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        heading = HEADING.match(line)
+        link = None if heading else SOURCE_LINK.fullmatch(line)
+        if link and after_heading:
+            # 紧跟在标题下：属于这个标题及其下级
+            level, title, _ = stack[-1]
+            stack[-1] = (level, title, link.group(1))
+            if pending and pending[-1].url is None:
+                pending[-1].url = link.group(1)
+        elif link and pending:
+            # 正文之后：属于上一个链接以来本章的所有段落
+            for para in pending:
+                if para.url is None:
+                    para.url = link.group(1)
+        elif link:
+            if stack:
+                level, title, _ = stack[-1]
+                stack[-1] = (level, title, link.group(1))
+            else:
+                stack.append((0, "", link.group(1)))
+        if link or heading and len(heading.group(1)) <= 2:
+            yield from pending
+            pending.clear()
+        after_heading = bool(heading)
+        if link:
+            continue
+        if heading:
+            level = len(heading.group(1))
+            while stack and stack[-1][0] >= level:
+                stack.pop()
+            url = stack[-1][2] if stack else None
+            stack.append((level, heading.group(2), url))
+            para = Paragraph(" › ".join(h for _, h, _ in stack if h), url, lineno, heading.group(2))
+        else:
+            para = Paragraph(" › ".join(h for _, h, _ in stack if h), stack[-1][2] if stack else None, lineno, line)
+        if para.url is None and any(level == 2 for level, _, _ in stack):
+            pending.append(para)
+        elif pending:
+            pending.append(para)
+        else:
+            yield para
+    yield from pending
+
+
+@dataclass
+class Hit:
+    book: str
+    heading: str
+    url: str | None
+    line: int
+    text: str
+
+    def snippet(self, query: str, width: int = 40) -> str:
+        """Text around the first occurrence of the query's first term."""
+        first = next((m.group() for m in RUNS.finditer(query)), "")
+        at = self.text.lower().find(first.lower()) if first else -1
+        if at < 0 or len(self.text) <= 2 * width:
+            return self.text[:2 * width] + ("…" if len(self.text) > 2 * width else "")
+        start = max(0, at - width // 2)
+        end = min(len(self.text), start + 2 * width)
+        return ("…" if start else "") + self.text[start:end] + ("…" if end < len(self.text) else "")
+
+
+class SearchIndex:
+    def __init__(self, path: str | Path = DEFAULT_INDEX):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(self.path, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+        version = self._db.execute("SELECT value FROM meta WHERE key = 'tokenizer'").fetchone()
+        if version is not None and version[0] != TOKENIZER_VERSION:
+            self._reset()
+        self._db.execute("INSERT OR REPLACE INTO meta VALUES ('tokenizer', ?)", (TOKENIZER_VERSION,))
+        self._db.commit()
+
+    def __enter__(self) -> "SearchIndex":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._db.close()
+
+    def _reset(self) -> None:
+        self._db.execute("DELETE FROM books")
+        self._db.execute("DELETE FROM paragraphs")
+        self._db.execute("INSERT INTO paragraphs_fts (paragraphs_fts) VALUES ('delete-all')")
+
+    def _remove(self, book: str) -> None:
+        # 无内容的 FTS 表删除一行时要给出它当初的词
+        rows = self._db.execute("SELECT id, text FROM paragraphs WHERE book = ?", (book,))
+        self._db.executemany(
+            "INSERT INTO paragraphs_fts (paragraphs_fts, rowid, tokens) VALUES ('delete', ?, ?)",
+            ((rowid, tokenize(text)) for rowid, text in rows.fetchall()),
+        )
+        self._db.execute("DELETE FROM paragraphs WHERE book = ?", (book,))
+        self._db.execute("DELETE FROM books WHERE name = ?", (book,))
+
+    def add(self, path: str | Path, book: str | None = None, force: bool = False) -> bool:
+        """Index one Markdown book (named after the file by default); False if it was unchanged."""
+        path = Path(path)
+        book = book or path.stem
+        st = path.stat()
+        row = self._db.execute("SELECT size, mtime_ns, sha256 FROM books WHERE name = ?", (book,)).fetchone()
+        if row and not force and row[:2] == (st.st_size, st.st_mtime_ns):
+            return False
+        digest = hashlib.sha256(path.read_bytes()).hexdigest()
+        if row and not force and row[2] == digest:
+            self._db.execute("UPDATE books SET path = ?, mtime_ns = ? WHERE name = ?", (str(path), st.st_mtime_ns, book))
+            self._db.commit()
+            return False
+
+        with self._db:
+            self._remove(book)
+            count = 0
+            with open(path, encoding="utf-8") as f:
+                for p in iter_paragraphs(f):
+                    cur = self._db.execute(
+                        "INSERT INTO paragraphs (book, heading, url, line, text) VALUES (?, ?, ?, ?, ?)",
+                        (book, p.heading, p.url, p.line, p.text),
+                    )
+                    self._db.execute("INSERT INTO paragraphs_fts (rowid, tokens) VALUES (?, ?)",
+                                     (cur.lastrowid, tokenize(p.text)))
+                    count += 1
+            self._db.execute(
+                "INSERT INTO books VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (book, str(path), st.st_size, st.st_mtime_ns, digest, count, time.time()),
+            )
+        return True
+
+    def remove(self, book: str) -> None:
+        with self._db:
+            self._remove(book)
+
+    def books(self) -> list[tuple[str, str, int]]:
+        """(name, path, paragraphs) of every indexed book."""
+        return self._db.execute("SELECT name, path, paragraphs FROM books ORDER BY name").fetchall()
+
+    def search(self, query: str, book: str | None = None, limit: int = 20) -> list[Hit]:
+        """Paragraphs containing every term of ``query``, best match (BM25) first."""
+        sql = ("SELECT p.book, p.heading, p.url, p.line, p.text FROM paragraphs_fts"
+               " JOIN paragraphs p ON p.id = paragraphs_fts.rowid WHERE paragraphs_fts MATCH ?")
+        params: list = [match_expression(query)]
+        if book:
+            sql += " AND p.book = ?"
+            params.append(book)
+        sql += " ORDER BY rank LIMIT ?"
+        params.append(limit)
+        return [Hit(*row) for row in self._db.execute(sql, params)]
+
+
+def index_books(paths: Iterable[str | Path], index: str | Path = DEFAULT_INDEX, force: bool = False) -> None:
+    """Bring the index up to date with ``paths``; prints one summary line."""
+    started = time.perf_counter()
+    updated, unchanged = [], 0
+    with SearchIndex(index) as idx:
+        for path in paths:
+            if idx.add(path, force=force):
+                updated.append(Path(path).stem)
+            else:
+                unchanged += 1
+    names = f": {', '.join(updated)}" if updated else ""
+    print(f"🔎 Search index {index}: {len(updated)} book(s) indexed{names}, "
+          f"{unchanged} unchanged ({time.perf_counter() - started:.2f}s)")
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description="Chinese full-text search over the generated books")
+    ap.add_argument("--index", default=DEFAULT_INDEX, help=f"index database (default: {DEFAULT_INDEX})")
+    sub = ap.add_subparsers(dest="command", required=True)
+    p_index = sub.add_parser("index", help="(re)index Markdown books; unchanged files are skipped")
+    p_index.add_argument("files", nargs="+", help="generated .md files; the book is named after the file")
+    p_index.add_argument("--force", action="store_true", help="re-index even unchanged files")
+    p_query = sub.add_parser("query", help="search the index")
+    p_query.add_argument("terms", nargs="+", help="text to find; separate terms that need not be adjacent with spaces")
+    p_query.add_argument("--book", default=None, help="only this book")
+    p_query.add_argument("--limit", type=int, default=20, help="most results to show (default 20)")
+    sub.add_parser("books", help="list the indexed books")
+    args = ap.parse_args(argv)
+
+    if args.command == "index":
+        index_books(args.files, args.index, args.force)
+        return 0
+    with SearchIndex(args.index) as idx:
+        if args.command == "books":
+            for name, path, paragraphs in idx.books():
+                print(f"{name}: {paragraphs} paragraphs ({path})")
+            return 0
+        query = " ".join(args.terms)
+        started = time.perf_counter()
+        try:
+            hits = idx.search(query, args.book, args.limit)
+        except ValueError as e:
+            print(f"❌ {e}", file=sys.stderr)
+            return 1
+        elapsed = time.perf_counter() - started
+        for hit in hits:
+            # 书名已经打印过，一级标题与书名相同时不再重复
+            heading = hit.heading.removeprefix(f"{hit.book} › ") if hit.heading != hit.book else ""
+            print(f"📖 {' › '.join(filter(None, [hit.book, heading]))} (line {hit.line})")
+            print(f"   {hit.snippet(query)}")
+            if hit.url:
+                print(f"   {hit.url}")
+        print(f"🔎 {len(hits)} result(s) in {elapsed * 1000:.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+"""Pooled keep-alive ``requests`` sessions.
+
+One ``Session`` is shared by every fetch worker. Each host gets a urllib3
+connection pool whose size matches the number of requests allowed in flight
+to that host, so connections (and TLS sessions) are reused across chapter
+pages instead of being set up again for each one.
+"""
+from __future__ import annotations
+
+import socket
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Callable
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.request import ACCEPT_ENCODING
+
+from . import metrics
+
+# urllib3 只在安装了 brotli / zstandard 时才把 br / zstd 加进去，避免收到解不开的响应
+ACCEPT_ENCODING_HEADER = ACCEPT_ENCODING
+
+
+# 每个 host:port 实际完成的 TCP 握手次数（服务器关闭后 urllib3 重连也会计入）
+_handshakes: Counter[str] = Counter()
+_handshakes_lock = threading.Lock()
+
+
+def _host_key(host: str, port: int | None) -> str:
+    return host if port in (None, 80, 443) else f"{host}:{port}"
+
+
+# 当前线程最近一次新建连接的 DNS / 建连（TCP + TLS）耗时，供 spider.metrics 使用；
+# 复用已有连接时不会写入
+connect_timings = threading.local()
+
+
+def _connect(conn: HTTPConnection, connect: Callable[[], None]) -> None:
+    timings = {}
+    if metrics.get() is not None:
+        # 单独解析一次来计 DNS 耗时；urllib3 建连时还会再解析一次，那部分计入 connect
+        t0 = time.perf_counter()
+        try:
+            socket.getaddrinfo(conn._dns_host, conn.port, 0, socket.SOCK_STREAM)
+        except OSError:
+            pass
+        timings["dns"] = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    connect()
+    timings["connect"] = time.perf_counter() - t0
+    connect_timings.last = timings
+    with _handshakes_lock:
+        _handshakes[_host_key(conn.host, conn.port)] += 1
+
+
+class _CountingHTTPConnection(HTTPConnection):
+    def connect(self) -> None:
+        _connect(self, super().connect)
+
+
+class _CountingHTTPSConnection(HTTPSConnection):
+    def connect(self) -> None:
+        _connect(self, super().connect)
+
+
+class _CountingHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _CountingHTTPConnection
+
+
+class _CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _CountingHTTPSConnection
+
+
+class _PooledAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs) -> None:
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _CountingHTTPConnectionPool,
+            "https": _CountingHTTPSConnectionPool,
+        }
+
+
+@dataclass
+class PoolStats:
+    host: str
+    requests: int
+    connections: int
+
+    @property
+    def reused(self) -> int:
+        return max(0, self.requests - self.connections)
+
+
+def _adapter(pool_size: int, max_hosts: int) -> HTTPAdapter:
+    return _PooledAdapter(pool_connections=max_hosts, pool_maxsize=pool_size)
+
+
+def make_session(pool_size: int = 4, max_hosts: int = 16, headers: dict[str, str] | None = None) -> requests.Session:
+    """Session with keep-alive, compressed transfer and ``pool_size`` connections per host."""
+    session = requests.Session()
+    adapter = _adapter(pool_size, max_hosts)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({
+        "Accept-Encoding": ACCEPT_ENCODING_HEADER,
+        "Connection": "keep-alive",
+    })
+    if headers:
+        session.headers.update(headers)
+    return session
+
+
+def set_host_pool_size(session: requests.Session, host: str, pool_size: int) -> None:
+    """Give ``host`` its own connection pool of ``pool_size`` connections."""
+    adapter = _adapter(pool_size, 1)
+    for scheme in ("http", "https"):
+        session.mount(f"{scheme}://{host}/", adapter)
+
+
+def pool_stats(session: requests.Session) -> list[PoolStats]:
+    """Requests vs. TCP handshakes per host, summed over all mounted adapters."""
+    totals: dict[str, PoolStats] = {}
+    seen = set()
+    for adapter in session.adapters.values():
+        if id(adapter) in seen or not isinstance(adapter, HTTPAdapter):
+            continue
+        seen.add(id(adapter))
+        pools = adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            host = _host_key(pool.host, pool.port)
+            stats = totals.setdefault(host, PoolStats(host, 0, 0))
+            stats.requests += pool.num_requests
+    with _handshakes_lock:
+        for host, stats in totals.items():
+            stats.connections = _handshakes[host]
+    return sorted(totals.values(), key=lambda s: s.host)
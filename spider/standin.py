@@ -0,0 +1,464 @@
+"""Local stand-in for the six source sites, for repeatable end-to-end crawls.
+
+Serves copies of every site's page tree with the same URL layout and
+encodings as the real thing, mounted under the site's host name:
+
+* uoregon 十二篮: the ``table3`` index, 12 volume pages, 12 chapters each (GB2312)
+* ezoe.work: ``books/3/3007.html`` and the ``3007-N.html`` chapters (UTF-8)
+* lightinnj.org: the 歌中之歌 index and its sections, the 马太福音 TOC and chapters (GB2312)
+* newadvent.org: ``fathers/1701001.htm`` … ``1701124.htm`` (UTF-8)
+* zh.wikisource.org: the 文理和合 index and its 66 book pages (UTF-8), plus
+  the MediaWiki API's ``action=parse`` at ``/w/api.php`` (``page=`` or
+  ``text=`` with ``{{:Title}}`` transclusions)
+
+Index pages are generated to match what the extractors expect; chapter pages
+are the recorded pages from ``bench/fixtures``, used in turn. Faults can be
+injected per request: latency, 403/429 (optionally with ``Retry-After``) and
+timeouts (the request hangs until the client gives up). Fault decisions depend
+only on ``--seed``, the path and the attempt number, so a run is repeatable.
+
+Start it and point a scraper's ``BASE_URL`` at it::
+
+    python -m spider.standin --latency 0.05 --error-rate 0.05 --timeout-rate 0.01
+    SPIDER_RATE=200 SPIDER_NO_CACHE=1 python scraper-church-affairs.py \\
+        --base-url http://127.0.0.1:8800/ezoe.work/books/3/3007.html
+
+The ``--base-url`` for every scraper is printed on startup. ``/_stats`` (and
+the summary printed on Ctrl-C) shows requests, pages delivered and how many
+requests were spent on retries.
+"""
+from __future__ import annotations
+
+import argparse
+import functools
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, unquote, urljoin, urlsplit
+
+from bs4 import BeautifulSoup
+
+from .bench import load_fixtures
+from .scripts import SCRIPTS, load_script
+
+DEFAULT_PORT = 8800
+
+CN_NUM = "一二三四五六七八九十"
+
+# 文理和合译本的 66 卷书名（维基文库子页面名）
+BIBLE_BOOKS = [
+    "創世記", "出埃及記", "利未記", "民數記", "申命記", "約書亞記", "士師記", "路得記",
+    "撒母耳記上", "撒母耳記下", "列王紀上", "列王紀下", "歷代志上", "歷代志下", "以斯拉記",
+    "尼希米記", "以斯帖記", "約伯記", "詩篇", "箴言", "傳道書", "雅歌", "以賽亞書",
+    "耶利米書", "耶利米哀歌", "以西結書", "但以理書", "何西阿書", "約珥書", "阿摩司書",
+    "俄巴底亞書", "約拿書", "彌迦書", "那鴻書", "哈巴谷書", "西番雅書", "哈該書",
+    "撒迦利亞書", "瑪拉基書", "馬太福音", "馬可福音", "路加福音", "約翰福音", "使徒行傳",
+    "羅馬書", "哥林多前書", "哥林多後書", "加拉太書", "以弗所書", "腓立比書", "歌羅西書",
+    "帖撒羅尼迦前書", "帖撒羅尼迦後書", "提摩太前書", "提摩太後書", "提多書", "腓利門書",
+    "希伯來書", "雅各書", "彼得前書", "彼得後書", "約翰一書", "約翰二書", "約翰三書",
+    "猶大書", "啟示錄",
+]
+
+
+def cn_number(n: int) -> str:
+    """1..99 → 一..九十九"""
+    tens, ones = divmod(n, 10)
+    head = "" if tens == 0 else ("十" if tens == 1 else CN_NUM[tens - 1] + "十")
+    return head + (CN_NUM[ones - 1] if ones else "")
+
+
+@dataclass
+class Resource:
+    body: bytes
+    content_type: str
+
+    @property
+    def etag(self) -> str:
+        return '"' + hashlib.sha256(self.body).hexdigest()[:16] + '"'
+
+
+def _key(url: str) -> str:
+    parts = urlsplit(url)
+    return parts.netloc + unquote(parts.path)
+
+
+class SiteTree:
+    """Every page of the stand-in sites, keyed by ``host/path`` (unquoted)."""
+
+    def __init__(self):
+        self.pages: dict[str, Resource] = {}
+        self.wiki: dict[str, dict[str, str]] = {}  # host → 页面标题 → 解析后的正文 HTML（API 用）
+        self.start_urls: dict[str, str] = {}  # 抓取脚本 → 真实 BASE_URL
+        self._fixtures = {}
+
+    def add(self, url: str, html: str | bytes, charset: str) -> None:
+        if isinstance(html, bytes):
+            body = html
+        else:
+            # 这些站点声明 gb2312，实际内容按 GB18030 编码
+            body = html.encode("gb18030" if charset == "gb2312" else charset)
+        self.pages[_key(url)] = Resource(body, f"text/html; charset={charset}")
+
+    def recorded(self, site: str, i: int) -> bytes:
+        """The i-th recorded page of ``site`` (cycling through the fixtures)."""
+        if site not in self._fixtures:
+            self._fixtures[site] = [f.path.read_bytes() for f in load_fixtures(site)]
+        pages = self._fixtures[site]
+        return pages[i % len(pages)]
+
+    def get(self, path: str) -> Resource | None:
+        return self.pages.get(unquote(path.lstrip("/")))
+
+    def add_wiki(self, host: str, title: str, content: str) -> None:
+        self.wiki.setdefault(host, {})[_wiki_title(title)] = content
+
+    def api(self, host: str, query: str) -> Resource:
+        """A MediaWiki ``api.php`` response; only ``action=parse`` is supported."""
+        params = {k: v[-1] for k, v in parse_qs(query, keep_blank_values=True).items()}
+        pages = self.wiki.get(host, {})
+        if params.get("action") != "parse":
+            return _api_error("badvalue", f"Unrecognized value for parameter \"action\": {params.get('action')}.")
+        if "page" in params:
+            title = _wiki_title(params["page"])
+            if title not in pages:
+                return _api_error("missingtitle", "The page you specified doesn't exist.")
+            content = pages[title]
+        elif "text" in params:
+            title = _wiki_title(params.get("title", "API"))
+            content = re.sub(r"\{\{:([^{}|]+)\}\}", lambda m: _transclude(pages, m.group(1)), params["text"])
+        else:
+            return _api_error("params", "One of the parameters \"title\", \"page\" and \"text\" is required.")
+        if "disableeditsection" in params:
+            content = re.sub(r'<span class="mw-editsection">.*?</span></span>', "", content)
+        text = f'<div class="mw-content-ltr mw-parser-output" lang="zh" dir="ltr">{content}</div>'
+        return _api_json({"parse": {"title": title, "pageid": 0, "text": text}})
+
+
+def _wiki_title(title: str) -> str:
+    return title.replace("_", " ").strip()
+
+
+def _transclude(pages: dict[str, str], title: str) -> str:
+    title = _wiki_title(title)
+    if title in pages:
+        return pages[title]
+    # 不存在的页面被嵌入时显示为红链
+    return f'<a href="/w/index.php?title={quote(title)}&amp;action=edit&amp;redlink=1" class="new">{title}</a>'
+
+
+def _api_json(data: dict) -> Resource:
+    return Resource(json.dumps(data, ensure_ascii=False).encode("utf-8"), "application/json; charset=utf-8")
+
+
+def _api_error(code: str, info: str) -> Resource:
+    # 和 MediaWiki 一样：出错也是 HTTP 200，错误在 JSON 里
+    return _api_json({"error": {"code": code, "info": info}})
+
+
+@functools.lru_cache(maxsize=None)  # 66 卷书轮流用那几份录制页面
+def _parser_output(html: bytes) -> str:
+    """The parsed wikitext of a recorded page (what ``action=parse`` returns), without the skin."""
+    content = BeautifulSoup(html, "html.parser").select_one(".mw-parser-output")
+    return content.decode_contents() if content is not None else ""
+
+
+def _html(title: str, body: str, charset: str = "utf-8") -> str:
+    return (f'<html>\n<head>\n<meta http-equiv="Content-Type" content="text/html; charset={charset}">\n'
+            f"<title>{title}</title>\n</head>\n<body>\n{body}\n</body>\n</html>\n")
+
+
+def build_twelve_baskets(tree: SiteTree, base_url: str) -> None:
+    rows = ['<tr><td><a href="../index.htm">灵粮</a></td></tr>']
+    for vol in range(1, 13):
+        vol_page = quote(f"第{cn_number(vol)}辑/第{cn_number(vol)}辑 目录.htm")
+        rows.append(f'<tr><td><a href="{vol_page}">第{cn_number(vol)}辑</a></td></tr>')
+        anchors = "".join(
+            f'<a href="{no}.htm">{no}、第{cn_number(vol)}辑第{cn_number(no)}篇</a><br>\n' for no in range(1, 13)
+        )
+        vol_url = urljoin(base_url, vol_page)
+        tree.add(vol_url, _html(f"十二篮 第{cn_number(vol)}辑", f'<table><tr><td colspan="5">\n{anchors}</td></tr></table>', "gb2312"), "gb2312")
+        for no in range(1, 13):
+            tree.add(urljoin(vol_url, f"{no}.htm"), tree.recorded("12-brackets", vol * 12 + no), "gb2312")
+    tree.add(base_url, _html("十二篮 目录", '<table id="table3">\n' + "\n".join(rows) + "\n</table>", "gb2312"), "gb2312")
+
+
+def build_church_affairs(tree: SiteTree, base_url: str, chapters: int = 20) -> None:
+    links = "\n".join(f'<li><a href="3007-{i}.html">第{cn_number(i)}篇</a></li>' for i in range(1, chapters + 1))
+    tree.add(base_url, _html("教会的事务 - 倪柝声文集", f"<ul>\n{links}\n</ul>"), "utf-8")
+    for i in range(1, chapters + 1):
+        tree.add(urljoin(base_url, f"3007-{i}.html"), tree.recorded("church-affairs", i), "utf-8")
+
+
+def build_song_of_songs(tree: SiteTree, base_url: str, sections: int = 30) -> None:
+    links = ['<p><a href="../../index.htm">回首页</a></p>', '<p><a href="../目录.htm">读经类</a></p>']
+    links += [f'<p><a href="4004-{i:02d}.htm">第{cn_number(i + 1)}段</a></p>' for i in range(sections)]
+    tree.add(base_url, _html("歌中之歌 目录", "\n".join(links), "gb2312"), "gb2312")
+    for i in range(sections):
+        tree.add(urljoin(base_url, f"4004-{i:02d}.htm"), tree.recorded("light-in-nj", i), "gb2312")
+
+
+def build_matthew(tree: SiteTree, base_url: str, chapters: int = 28) -> None:
+    links = "\n".join(f'<p><a href="{i:02d}.htm">第{cn_number(i)}章</a></p>' for i in range(1, chapters + 1))
+    tree.add(base_url, _html("马太福音查经记录 目录", links, "gb2312"), "gb2312")
+    for i in range(1, chapters + 1):
+        tree.add(urljoin(base_url, f"{i:02d}.htm"), tree.recorded("matthew", i), "gb2312")
+
+
+def build_newadvent(tree: SiteTree, base_url: str, articles: int = 124) -> None:
+    links = "\n".join(f'<a href="1701{i:03d}.htm">Tractate {i}</a><br>' for i in range(1, articles + 1))
+    tree.add(urljoin(base_url, "fathers/1701.htm"), _html("Tractates on the Gospel of John", links), "utf-8")
+    for i in range(1, articles + 1):
+        tree.add(urljoin(base_url, f"fathers/1701{i:03d}.htm"), tree.recorded("newadvent", i), "utf-8")
+
+
+def build_wikisource(tree: SiteTree, base_url: str) -> None:
+    host = urlsplit(base_url).netloc
+    index_title = unquote(urlsplit(base_url).path).rsplit("/", 1)[-1]
+    wiki = quote(f"/wiki/{index_title}")
+    # 目录前三项（整部圣经、旧约、新约）被 extract_book_titles 跳过
+    items = [f'<li><a href="{wiki}">{index_title}</a></li>',
+             f'<li><a href="{wiki}#舊約">舊約</a></li>',
+             f'<li><a href="{wiki}#新約">新約</a></li>']
+    items += [f'<li><a href="{wiki}/{quote(book)}">{book}</a></li>' for book in BIBLE_BOOKS]
+    index = "<ul>\n" + "\n".join(items) + "\n</ul>"
+    tree.add(base_url, _html(index_title, index), "utf-8")
+    tree.add_wiki(host, index_title, index)
+    for i, book in enumerate(BIBLE_BOOKS):
+        page = tree.recorded("wikisource", i)
+        tree.add(f"{base_url}/{quote(book)}", page, "utf-8")
+        tree.add_wiki(host, f"{index_title}/{book}", _parser_output(page))
+
+
+BUILDERS = {
+    "12-brackets": build_twelve_baskets,
+    "church-affairs": build_church_affairs,
+    "light-in-nj": build_song_of_songs,
+    "matthew": build_matthew,
+    "newadvent": build_newadvent,
+    "wikisource": build_wikisource,
+}
+
+
+def build_tree() -> SiteTree:
+    """Stand-in copies of every site, laid out under each scraper's real ``BASE_URL``."""
+    tree = SiteTree()
+    for name, build in BUILDERS.items():
+        base_url = load_script(name).BASE_URL
+        tree.start_urls[name] = base_url
+        build(tree, base_url)
+    return tree
+
+
+@dataclass
+class Faults:
+    latency: float = 0.0        # 每个请求固定延迟（秒）
+    jitter: float = 0.0         # 额外随机延迟上限（秒）
+    error_rate: float = 0.0     # 返回 error_status 的比例
+    error_status: int = 429
+    retry_after: str | None = None
+    timeout_rate: float = 0.0   # 不响应、挂起 hang 秒的比例
+    hang: float = 60.0
+    crawl_delay: float | None = None
+    seed: int = 0
+
+    def decide(self, path: str, attempt: int) -> tuple[float, str | None]:
+        """(delay, fault) for this attempt; fault is None, "error" or "timeout"."""
+        rnd = random.Random(f"{self.seed}:{path}:{attempt}")
+        delay = self.latency + rnd.random() * self.jitter
+        roll = rnd.random()
+        if roll < self.timeout_rate:
+            return delay, "timeout"
+        if roll < self.timeout_rate + self.error_rate:
+            return delay, "error"
+        return delay, None
+
+
+@dataclass
+class Stats:
+    requests: int = 0
+    bytes_sent: int = 0
+    statuses: Counter = field(default_factory=Counter)
+    attempts: Counter = field(default_factory=Counter)
+    delivered: set = field(default_factory=set)
+    started: float = field(default_factory=time.monotonic)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def to_json(self) -> dict:
+        with self.lock:
+            elapsed = time.monotonic() - self.started
+            pages = len(self.delivered)
+            return {
+                "requests": self.requests,
+                "pages_delivered": pages,
+                "retries": self.requests - pages,
+                "efficiency": round(pages / self.requests, 3) if self.requests else None,
+                "statuses": {str(k): v for k, v in sorted(self.statuses.items(), key=lambda kv: str(kv[0]))},
+                "bytes": self.bytes_sent,
+                "elapsed": round(elapsed, 2),
+                "pages_per_sec": round(pages / elapsed, 1) if elapsed else None,
+            }
+
+    def summary(self) -> str:
+        s = self.to_json()
+        statuses = ", ".join(f"{k}: {v}" for k, v in s["statuses"].items())
+        return (f"📊 {s['requests']} requests → {s['pages_delivered']} pages delivered "
+                f"({s['retries']} retries, efficiency {s['efficiency']}), {s['bytes']} bytes; {statuses}")
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "StandinServer"
+
+    def log_message(self, format, *args) -> None:
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, status: int, body: bytes, content_type: str = "text/plain; charset=utf-8",
+              headers: dict[str, str] | None = None) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+        stats = self.server.stats
+        with stats.lock:
+            stats.bytes_sent += len(body)
+            stats.statuses[status] += 1
+
+    def do_GET(self) -> None:
+        parts = urlsplit(self.path)
+        path = parts.path
+        if path == "/_stats":
+            body = json.dumps(self.server.stats.to_json(), ensure_ascii=False, indent=2).encode("utf-8")
+            self._send(200, body, "application/json")
+            return
+        if path == "/robots.txt":
+            lines = ["User-agent: *", "Allow: /"]
+            if self.server.faults.crawl_delay:
+                lines.append(f"Crawl-delay: {self.server.faults.crawl_delay:g}")
+            self._send(200, ("\n".join(lines) + "\n").encode())
+            return
+
+        api = path.endswith("/w/api.php")
+        # API 请求靠查询串区分，重试计数和故障也按完整地址算
+        key = f"{path}?{parts.query}" if api else path
+        stats = self.server.stats
+        with stats.lock:
+            stats.requests += 1
+            stats.attempts[key] += 1
+            attempt = stats.attempts[key]
+        delay, fault = self.server.faults.decide(key, attempt)
+        if delay:
+            time.sleep(delay)
+        if fault == "timeout":
+            # 一直不响应，直到客户端超时；然后断开连接
+            time.sleep(self.server.faults.hang)
+            with stats.lock:
+                stats.statuses["timeout"] += 1
+            self.close_connection = True
+            return
+        if fault == "error":
+            status = self.server.faults.error_status
+            headers = {"Retry-After": self.server.faults.retry_after} if self.server.faults.retry_after else {}
+            self._send(status, f"{status} injected by stand-in\n".encode(), headers=headers)
+            return
+
+        if api:
+            resource = self.server.tree.api(unquote(path.lstrip("/")).split("/", 1)[0], parts.query)
+        else:
+            resource = self.server.tree.get(path)
+        if resource is None:
+            self._send(404, b"not found\n")
+            return
+        if self.headers.get("If-None-Match") == resource.etag:
+            self._send(304, b"", resource.content_type, {"ETag": resource.etag})
+        else:
+            self._send(200, resource.body, resource.content_type, {"ETag": resource.etag})
+        with stats.lock:
+            stats.delivered.add(key)
+
+
+def standin_url(root: str, real_url: str) -> str:
+    """Address of ``real_url`` on a stand-in server at ``root`` (``http://host:port``)."""
+    parts = urlsplit(real_url)
+    return f"{root.rstrip('/')}/{parts.netloc}{parts.path}" + (f"?{parts.query}" if parts.query else "")
+
+
+class StandinServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = DEFAULT_PORT,
+                 faults: Faults | None = None, tree: SiteTree | None = None, verbose: bool = False):
+        super().__init__((host, port), StandinHandler)
+        self.tree = tree or build_tree()
+        self.faults = faults or Faults()
+        self.stats = Stats()
+        self.verbose = verbose
+        self._thread: threading.Thread | None = None
+
+    @property
+    def root(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def url_for(self, real_url: str) -> str:
+        """Stand-in address of a page on one of the real sites."""
+        return standin_url(self.root, real_url)
+
+    def base_urls(self) -> dict[str, str]:
+        """``--base-url`` for each scraper."""
+        return {name: self.url_for(url) for name, url in self.tree.start_urls.items()}
+
+    def start(self) -> "StandinServer":
+        """Serve in a background thread (for tests and benchmarks)."""
+        self._thread = threading.Thread(target=self.serve_forever, name="standin", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description="Serve local stand-in copies of the scraped sites")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=DEFAULT_PORT)
+    ap.add_argument("--latency", type=float, default=0.0, help="delay before every response (seconds)")
+    ap.add_argument("--jitter", type=float, default=0.0, help="extra random delay up to this many seconds")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with --error-status")
+    ap.add_argument("--error-status", type=int, default=429, choices=(403, 429, 500, 502, 503, 504))
+    ap.add_argument("--retry-after", default=None, help="Retry-After header sent with injected errors")
+    ap.add_argument("--timeout-rate", type=float, default=0.0, help="fraction of requests that never get an answer")
+    ap.add_argument("--hang", type=float, default=60.0, help="how long a timed-out request hangs (seconds)")
+    ap.add_argument("--crawl-delay", type=float, default=None, help="Crawl-delay to announce in robots.txt")
+    ap.add_argument("--seed", type=int, default=0, help="seed for the fault decisions")
+    ap.add_argument("-v", "--verbose", action="store_true", help="log every request")
+    args = ap.parse_args(argv)
+
+    faults = Faults(args.latency, args.jitter, args.error_rate, args.error_status, args.retry_after,
+                    args.timeout_rate, args.hang, args.crawl_delay, args.seed)
+    server = StandinServer(args.host, args.port, faults, verbose=args.verbose)
+    print(f"🧪 Stand-in sites on {server.root} ({len(server.tree.pages)} pages)")
+    for name, url in server.base_urls().items():
+        print(f"   python {SCRIPTS[name]} --base-url {url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print("\n" + server.stats.summary())
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
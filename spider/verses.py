@@ -0,0 +1,338 @@
+"""Verse-addressable store for the Bible build.
+
+``scraper-high-wenli-union-Bible.py`` writes ``bible.verses`` next to
+``bible.md``: every numbered verse, addressable by book, chapter and verse,
+in one file that is opened with ``mmap`` and never read as a whole. Looking
+up a verse touches a few table entries and the verse's own bytes::
+
+    python -m spider.verses bible.verses 约翰福音 3:16
+    python -m spider.verses bible.verses 约翰福音 3:16-18
+    python -m spider.verses bible.verses 约翰福音 3:36-4:2
+    python -m spider.verses bible.verses 约翰福音 3        # whole chapter
+    python -m spider.verses bible.verses --books
+
+    from spider.verses import VerseStore
+    with VerseStore("bible.verses") as bible:
+        bible.lookup("约翰福音 3:16")     # [((43, 3, 16), "…")]
+
+Books can be named by display title, wiki subpage name (traditional), the
+simplified form of either (约翰福音 for 約翰福音) or 1-based number. File layout (little-endian, offsets in bytes)::
+
+    header   b"SPVERSE1", then u32 books, chapters, verses, names length
+    books    u32 × (books + 1)      first chapter of each book
+    chapters u32 × (chapters + 1)   first verse of each chapter
+             u16 × chapters         chapter number (from the h2 heading)
+    verses   u16 × verses           verse number
+             u32 × (verses + 1)     start of each verse in the text blob
+    names    JSON [[title, subpage], ...]
+    text     UTF-8, the verses back to back
+
+Chapter ``c`` of a book sits at ``first chapter + c - 1`` and verse ``v`` at
+``first verse + v - 1`` unless the numbering has gaps, in which case the
+chapter is scanned; either way no more than one chapter is looked at.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import mmap
+import os
+import re
+import shutil
+import struct
+import sys
+import tempfile
+from array import array
+from pathlib import Path
+from typing import BinaryIO
+
+MAGIC = b"SPVERSE1"
+HEADER = struct.Struct("<8s4I")
+
+CN_DIGITS = {c: i for i, c in enumerate("〇一二三四五六七八九")} | {"零": 0, "两": 2}
+CN_UNITS = {"十": 10, "百": 100, "千": 1000}
+
+# "第三章"、"第一百十九篇"：章标题里的章号
+CHAPTER_HEADING = re.compile(r"第([〇零一二两三四五六七八九十百千]+|\d+)[章篇]")
+VERSE_LINE = re.compile(r"(\d+) (.*)")
+REFERENCE = re.compile(
+    r"\s*(?P<book>.+?)\s*(?P<c1>\d+)(?:[:：](?P<v1>\d+))?"
+    r"(?:\s*[-–—~]\s*(?:(?P<c2>\d+)[:：])?(?P<v2>\d+))?\s*$"
+)
+
+Ref = tuple[int, int, int]  # (卷号, 章, 节)，均从 1 开始
+
+# 和合本 66 卷书名里出现的繁体字 → 简体，够查书名用，不是通用的繁简转换
+SIMPLIFIED = str.maketrans(
+    "創記數約書亞師歷詩傳賽結彌鴻該瑪馬羅後來猶啟錄紀門",
+    "创记数约书亚师历诗传赛结弥鸿该玛马罗后来犹启录纪门",
+)
+
+
+def simplified(name: str) -> str:
+    """Book name in simplified characters: 約翰福音 → 约翰福音."""
+    return name.translate(SIMPLIFIED)
+
+
+def cn_int(text: str) -> int:
+    """十九 → 19, 一百五十 → 150, 一一九 → 119."""
+    if text.isdigit():
+        return int(text)
+    if not any(c in CN_UNITS for c in text):
+        return int("".join(str(CN_DIGITS[c]) for c in text))
+    total, digit = 0, 0
+    for c in text:
+        if c in CN_UNITS:
+            total += (digit or 1) * CN_UNITS[c]
+            digit = 0
+        else:
+            digit = CN_DIGITS[c]
+    return total + digit
+
+
+def chapter_number(heading: str) -> int | None:
+    m = CHAPTER_HEADING.search(heading)
+    return cn_int(m.group(1)) if m else None
+
+
+class VerseStoreWriter:
+    """Collects books verse by verse and writes the store on ``close``.
+
+    The verse text is spooled to a temporary file next to the target, so only
+    the (small) tables are held in memory; the file appears atomically.
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._text: BinaryIO = tempfile.TemporaryFile(dir=self.path.parent)
+        self._size = 0
+        self.names: list[tuple[str, str]] = []
+        self.book_chapters = array("I")
+        self.chapter_verses = array("I")
+        self.chapter_numbers = array("H")
+        self.verse_numbers = array("H")
+        self.offsets = array("I", [0])
+
+    def __enter__(self) -> "VerseStoreWriter":
+        return self
+
+    def __exit__(self, exc_type, *exc) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self._text.close()
+
+    def add_book(self, title: str, subpage: str = "") -> None:
+        self.names.append((title, subpage or title))
+        self.book_chapters.append(len(self.chapter_numbers))
+
+    def add_chapter(self, number: int) -> None:
+        self.chapter_numbers.append(number)
+        self.chapter_verses.append(len(self.verse_numbers))
+
+    def add_verse(self, number: int, text: str) -> None:
+        if not self.names:
+            raise ValueError("add_verse before add_book")
+        if self.book_chapters[-1] == len(self.chapter_numbers):
+            # 没有章标题的书（如俄巴底亚书、腓利门书）只有一章
+            self.add_chapter(1)
+        data = text.encode("utf-8")
+        self._text.write(data)
+        self._size += len(data)
+        self.verse_numbers.append(number)
+        self.offsets.append(self._size)
+
+    def add_markdown(self, title: str, subpage: str, markdown: str) -> None:
+        """Add one book from the Markdown of ``extract_book`` (``## 第N章`` + ``N text`` lines).
+
+        Built from the Markdown rather than the page, so books restored from
+        the crawl journal by ``--resume`` end up in the store as well. Headings
+        that are not chapter numbers and lines without a verse number are
+        skipped.
+        """
+        self.add_book(title, subpage)
+        for line in markdown.splitlines():
+            if line.startswith("## "):
+                number = chapter_number(line[3:])
+                if number is not None:
+                    self.add_chapter(number)
+                continue
+            m = VERSE_LINE.fullmatch(line)
+            if m:
+                self.add_verse(int(m.group(1)), m.group(2))
+
+    def close(self) -> None:
+        names = json.dumps(self.names, ensure_ascii=False).encode("utf-8")
+        book_chapters = array("I", [*self.book_chapters, len(self.chapter_numbers)])
+        chapter_verses = array("I", [*self.chapter_verses, len(self.verse_numbers)])
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            f.write(HEADER.pack(MAGIC, len(self.names), len(self.chapter_numbers), len(self.verse_numbers), len(names)))
+            for table in (book_chapters, chapter_verses, self.chapter_numbers, self.verse_numbers, self.offsets):
+                if sys.byteorder != "little":
+                    table = array(table.typecode, table)
+                    table.byteswap()
+                f.write(table.tobytes())
+            f.write(names)
+            self._text.seek(0)
+            shutil.copyfileobj(self._text, f)
+        self._text.close()
+        os.replace(tmp, self.path)
+
+
+class VerseStore:
+    """Read-only view of a store written by ``VerseStoreWriter``; lookups go straight to the mmap."""
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.n_books, self.n_chapters, self.n_verses, names_len = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            self._mm.close()
+            raise ValueError(f"{self.path} is not a verse store")
+        self._books_at = HEADER.size
+        self._chapters_at = self._books_at + 4 * (self.n_books + 1)
+        self._chapter_numbers_at = self._chapters_at + 4 * (self.n_chapters + 1)
+        self._verse_numbers_at = self._chapter_numbers_at + 2 * self.n_chapters
+        self._offsets_at = self._verse_numbers_at + 2 * self.n_verses
+        names_at = self._offsets_at + 4 * (self.n_verses + 1)
+        self._text_at = names_at + names_len
+        self.names: list[tuple[str, str]] = [tuple(n) for n in json.loads(self._mm[names_at:self._text_at])]
+        self._book_ids: dict[str, int] = {}
+        for i, (title, subpage) in enumerate(self.names, 1):
+            for name in (title, subpage):
+                self._book_ids.setdefault(name, i)
+                self._book_ids.setdefault(simplified(name), i)
+
+    def __enter__(self) -> "VerseStore":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._mm.close()
+
+    def _u32(self, base: int, i: int) -> int:
+        return struct.unpack_from("<I", self._mm, base + 4 * i)[0]
+
+    def _u16(self, base: int, i: int) -> int:
+        return struct.unpack_from("<H", self._mm, base + 2 * i)[0]
+
+    def book_id(self, book: str | int) -> int:
+        """1-based number of a book given by title, subpage name or number."""
+        if isinstance(book, int) or book.isdigit():
+            number = int(book)
+            if 1 <= number <= self.n_books:
+                return number
+        elif book in self._book_ids:
+            return self._book_ids[book]
+        elif simplified(book) in self._book_ids:
+            return self._book_ids[simplified(book)]
+        raise KeyError(f"unknown book {book!r}")
+
+    def _chapters(self, book: int) -> range:
+        return range(self._u32(self._books_at, book - 1), self._u32(self._books_at, book))
+
+    def _verses(self, chapter_index: int) -> range:
+        return range(self._u32(self._chapters_at, chapter_index), self._u32(self._chapters_at, chapter_index + 1))
+
+    def _chapter_index(self, book: int, chapter: int) -> int:
+        chapters = self._chapters(book)
+        guess = chapters.start + chapter - 1
+        if guess in chapters and self._u16(self._chapter_numbers_at, guess) == chapter:
+            return guess
+        for i in chapters:
+            if self._u16(self._chapter_numbers_at, i) == chapter:
+                return i
+        raise KeyError(f"{self.names[book - 1][0]} has no chapter {chapter}")
+
+    def _verse_index(self, chapter_index: int, verse: int) -> int:
+        verses = self._verses(chapter_index)
+        guess = verses.start + verse - 1
+        if guess in verses and self._u16(self._verse_numbers_at, guess) == verse:
+            return guess
+        for i in verses:
+            if self._u16(self._verse_numbers_at, i) == verse:
+                return i
+        raise KeyError(f"no verse {verse} in chapter {self._u16(self._chapter_numbers_at, chapter_index)}")
+
+    def _text(self, i: int) -> str:
+        start = self._text_at + self._u32(self._offsets_at, i)
+        end = self._text_at + self._u32(self._offsets_at, i + 1)
+        return self._mm[start:end].decode("utf-8")
+
+    def verse(self, book: str | int, chapter: int, verse: int) -> str:
+        """Text of one verse; ``KeyError`` if there is no such verse."""
+        return self._text(self._verse_index(self._chapter_index(self.book_id(book), chapter), verse))
+
+    def passage(self, book: str | int, chapter: int, verse: int | None = None,
+              end_chapter: int | None = None, end_verse: int | None = None) -> list[tuple[Ref, str]]:
+        """Verses from ``chapter:verse`` to ``end_chapter:end_verse`` (inclusive) within one book.
+
+        Without ``verse`` the whole chapter; without an end just the one verse.
+        """
+        b = self.book_id(book)
+        first_chapter = self._chapter_index(b, chapter)
+        if verse is None:
+            first = self._verses(first_chapter).start
+            last = self._verses(first_chapter).stop - 1
+            last_chapter = first_chapter
+        else:
+            first = self._verse_index(first_chapter, verse)
+            last_chapter = first_chapter if end_chapter is None else self._chapter_index(b, end_chapter)
+            last = first if end_verse is None else self._verse_index(last_chapter, end_verse)
+        out = []
+        c = first_chapter
+        for i in range(first, last + 1):
+            while i >= self._verses(c).stop:
+                c += 1
+            out.append(((b, self._u16(self._chapter_numbers_at, c), self._u16(self._verse_numbers_at, i)), self._text(i)))
+        return out
+
+    def lookup(self, reference: str) -> list[tuple[Ref, str]]:
+        """Verses for a reference such as ``约翰福音 3:16``, ``3:16-18``, ``3:36-4:2`` or ``3``."""
+        m = REFERENCE.match(reference)
+        if not m:
+            raise ValueError(f"cannot parse reference {reference!r}")
+        c1, v1, c2, v2 = (int(g) if g else None for g in m.group("c1", "v1", "c2", "v2"))
+        if v1 is None:
+            if v2 is not None:
+                raise ValueError(f"a range needs a starting verse: {reference!r}")
+            return self.passage(m.group("book"), c1)
+        if v2 is None:
+            return self.passage(m.group("book"), c1, v1)
+        return self.passage(m.group("book"), c1, v1, c2 if c2 is not None else c1, v2)
+
+    def title(self, book: int) -> str:
+        return self.names[book - 1][0]
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description="Look up verses in a store written by the Bible build")
+    ap.add_argument("store", help="the .verses file (e.g. bible.verses)")
+    ap.add_argument("reference", nargs="*", help="e.g. 约翰福音 3:16, 约翰福音 3:16-18, 约翰福音 3")
+    ap.add_argument("--books", action="store_true", help="list the books and their chapter counts")
+    args = ap.parse_args(argv)
+
+    with VerseStore(args.store) as store:
+        if args.books:
+            for i, (title, subpage) in enumerate(store.names, 1):
+                print(f"{i:>3} {title} ({subpage}): {len(store._chapters(i))} chapters")
+            return 0
+        if not args.reference:
+            ap.error("give a reference or --books")
+        try:
+            verses = store.lookup(" ".join(args.reference))
+        except (KeyError, ValueError) as e:
+            print(f"❌ {e.args[0]}", file=sys.stderr)
+            return 1
+        for (book, chapter, verse), text in verses:
+            print(f"{store.title(book)} {chapter}:{verse} {text}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
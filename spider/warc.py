@@ -0,0 +1,199 @@
+"""WARC archive output and offline replay.
+
+``WarcWriter`` appends every response the fetch engine hands out to a
+``.warc.gz`` file (WARC/1.1, one gzip member per record). It stores the
+status line, the response headers and the body bytes as they came off the
+wire, *before* the gb18030 / utf-8 decode. The transfer compression is
+already undone, so ``Content-Encoding`` is dropped and ``Content-Length``
+matches the stored body.
+
+``WarcArchive`` indexes such a file and serves the archived responses back
+as ``FetchResult`` objects. With ``--replay`` the engine answers every request
+from the archive and never touches the network, so a rebuild is bound only
+by parsing speed::
+
+    python scraper-light-in-nj-song.py --warc lightinnj.warc.gz
+    python scraper-light-in-nj-song.py --replay lightinnj.warc.gz
+"""
+from __future__ import annotations
+
+import base64
+import gzip
+import hashlib
+import threading
+import uuid
+import zlib
+from datetime import datetime, timezone
+from http import HTTPStatus
+from pathlib import Path
+
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers, requote_uri
+
+from .fetch import FetchResult
+
+WARC_VERSION = "WARC/1.1"
+
+# 正文已经解压过，这些头不再与存下来的字节相符
+_DROPPED_HEADERS = {"content-encoding", "transfer-encoding", "content-length"}
+
+
+def _warc_date() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _record_id() -> str:
+    return f"<urn:uuid:{uuid.uuid4()}>"
+
+
+def _digest(data: bytes) -> str:
+    return "sha1:" + base64.b32encode(hashlib.sha1(data).digest()).decode("ascii")
+
+
+def _record(headers: dict[str, str], block: bytes) -> bytes:
+    lines = [WARC_VERSION, *(f"{k}: {v}" for k, v in headers.items()), f"Content-Length: {len(block)}"]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("utf-8") + block + b"\r\n\r\n"
+
+
+def http_block(result: FetchResult) -> tuple[bytes, bytes]:
+    """(HTTP header block, payload) of a response as stored in the archive."""
+    try:
+        reason = HTTPStatus(result.status).phrase
+    except ValueError:
+        reason = ""
+    lines = [f"HTTP/1.1 {result.status} {reason}".rstrip()]
+    lines += [f"{k}: {v}" for k, v in result.headers.items() if k.lower() not in _DROPPED_HEADERS]
+    lines.append(f"Content-Length: {len(result.content)}")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("iso-8859-1", errors="replace"), result.content
+
+
+class WarcWriter:
+    """Append-only ``.warc.gz`` writer; safe to call from the fetch worker threads."""
+
+    def __init__(self, path: str | Path, software: str = "Practicing-simple-spider"):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.records = 0
+        self._lock = threading.Lock()
+        self._file = open(self.path, "ab")
+        info = f"software: {software}\r\nformat: WARC File Format 1.1\r\n".encode("utf-8")
+        self._write({
+            "WARC-Type": "warcinfo",
+            "WARC-Date": _warc_date(),
+            "WARC-Filename": self.path.name,
+            "WARC-Record-ID": _record_id(),
+            "Content-Type": "application/warc-fields",
+        }, info)
+
+    def _write(self, headers: dict[str, str], block: bytes) -> None:
+        # 每条记录单独一个 gzip 成员，中途中断也只丢最后一条
+        data = gzip.compress(_record(headers, block))
+        with self._lock:
+            self._file.write(data)
+            self._file.flush()
+
+    def write_response(self, result: FetchResult) -> None:
+        head, payload = http_block(result)
+        self._write({
+            "WARC-Type": "response",
+            "WARC-Record-ID": _record_id(),
+            "WARC-Date": _warc_date(),
+            "WARC-Target-URI": requote_uri(result.url),
+            "WARC-Payload-Digest": _digest(payload),
+            "Content-Type": "application/http;msgtype=response",
+        }, head + payload)
+        self.records += 1
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+def iter_members(path: str | Path, offset: int = 0):
+    """Yield ``(offset, data)`` for every gzip member of ``path``, starting at ``offset``."""
+    with open(path, "rb") as f:
+        while True:
+            f.seek(offset)
+            d = zlib.decompressobj(wbits=31)
+            chunks = []
+            read = 0
+            while not d.eof:
+                chunk = f.read(1 << 16)
+                if not chunk:
+                    break
+                read += len(chunk)
+                chunks.append(d.decompress(chunk))
+            if not d.eof:
+                return
+            yield offset, b"".join(chunks)
+            offset += read - len(d.unused_data)
+
+
+def parse_record(data: bytes) -> tuple[dict[str, str], bytes]:
+    """WARC headers and content block of one record."""
+    head, _, rest = data.partition(b"\r\n\r\n")
+    lines = head.decode("utf-8").split("\r\n")
+    if not lines[0].startswith("WARC/"):
+        raise ValueError(f"not a WARC record: {lines[0][:40]!r}")
+    headers = {}
+    for line in lines[1:]:
+        k, _, v = line.partition(":")
+        headers[k.strip()] = v.strip()
+    length = int(headers.get("Content-Length", len(rest)))
+    return headers, rest[:length]
+
+
+def parse_http(block: bytes) -> tuple[int, CaseInsensitiveDict, bytes]:
+    """Status, headers and body of an ``application/http`` response block."""
+    head, _, body = block.partition(b"\r\n\r\n")
+    lines = head.decode("iso-8859-1").split("\r\n")
+    status = int(lines[0].split()[1])
+    headers = CaseInsensitiveDict()
+    for line in lines[1:]:
+        k, _, v = line.partition(":")
+        headers[k.strip()] = v.strip()
+    return status, headers, body
+
+
+class WarcArchive:
+    """Read-side index of a ``.warc.gz``: target URI → archived response.
+
+    When a URL was archived more than once the last successful response wins
+    (or the last response at all, if none succeeded).
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self._offsets: dict[str, int] = {}
+        ok: set[str] = set()
+        for offset, data in iter_members(self.path):
+            headers, block = parse_record(data)
+            if headers.get("WARC-Type") != "response":
+                continue
+            uri = headers["WARC-Target-URI"]
+            status = int(block.split(b" ", 2)[1])
+            if 200 <= status < 300:
+                ok.add(uri)
+            elif uri in ok:
+                continue
+            self._offsets[uri] = offset
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def __contains__(self, url: str) -> bool:
+        return requote_uri(url) in self._offsets
+
+    def urls(self) -> list[str]:
+        return list(self._offsets)
+
+    def get(self, url: str, encoding: str | None = None) -> FetchResult:
+        """The archived response for ``url``; an error result if it is missing."""
+        offset = self._offsets.get(requote_uri(url))
+        if offset is None:
+            return FetchResult(url, 0, encoding=encoding or "utf-8", error=f"not in archive {self.path.name}")
+        _, data = next(iter_members(self.path, offset))
+        _, block = parse_record(data)
+        status, headers, body = parse_http(block)
+        encoding = encoding or get_encoding_from_headers(headers) or "utf-8"
+        return FetchResult(url, status, body, dict(headers), encoding, from_cache=True)
@@ -0,0 +1,194 @@
+"""Streaming, ordered Markdown output.
+
+Instead of collecting a whole book in a list and joining it at the end, the
+scrapers hand each piece to a ``MarkdownWriter`` as soon as it is ready. The
+writer appends it to the output file right away, so memory stays flat and the
+first chapter is on disk while the rest are still being fetched. The text
+goes to ``<book>.md.tmp`` and replaces ``<book>.md`` only when the build
+finishes, so an interrupted build leaves the previous book in place.
+
+Chapters that finish out of order go through ``ordered``, a small reorder
+buffer that releases them in TOC order.
+
+After ``configure(epub=True)`` (``--epub``) every writer with an output path
+also streams the same text into an EPUB next to it (see ``spider.epub``),
+which is likewise written to a ``.tmp`` file and renamed only on success.
+"""
+from __future__ import annotations
+
+import io
+import os
+import re
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator, TextIO, TypeVar
+
+from .epub import EpubWriter
+from .profile import stage
+
+if TYPE_CHECKING:
+    from .clean import Cleaner
+
+T = TypeVar("T")
+
+# 片段末尾保留在缓冲里的部分：结尾空白加其前面一个字符，
+# 这样跨越片段边界的规范化（如 \n{3,}、“。 +”）和整本书一次处理的结果一致
+_CARRY_RE = re.compile(r"\S?\s*\Z")
+
+_epub = False
+
+
+def configure(epub: bool | None = None) -> None:
+    """Also write ``<book>.epub`` beside every ``<book>.md``."""
+    global _epub
+    if epub is not None:
+        _epub = epub
+
+
+def ordered(items: Iterable[tuple[int, T]], start: int = 0) -> Iterator[T]:
+    """Re-order ``(index, item)`` pairs, yielding items as soon as they are contiguous."""
+    pending: dict[int, T] = {}
+    nxt = start
+    for idx, item in items:
+        pending[idx] = item
+        while nxt in pending:
+            yield pending.pop(nxt)
+            nxt += 1
+    # 输入里有缺号时，剩下的按序号输出
+    for idx in sorted(pending):
+        yield pending[idx]
+
+
+class MarkdownWriter:
+    """Write Markdown pieces to ``out`` as they arrive.
+
+    Pieces are separated by ``joiner`` like ``joiner.join(pieces)``.
+    ``normalize`` is applied per piece (it must be a text→text function whose
+    matches only span whitespace and one preceding character across piece
+    boundaries, e.g. collapsing blank lines). With ``trim`` the output is
+    stripped at both ends and ends with exactly one newline, matching the old
+    ``md.strip() + "\\n"``. ``clean`` (a ``spider.clean.Cleaner``) is run over
+    the final text as it is written, giving the same file as cleaning it
+    afterwards. Output to a path is written to a temporary file next to it
+    and moved into place by ``close()``; ``abort()`` (or an exception inside
+    the ``with`` block) discards it.
+    """
+
+    def __init__(
+        self,
+        out: str | Path | TextIO,
+        joiner: str = "\n",
+        normalize: Callable[[str], str] | None = None,
+        trim: bool = True,
+        clean: Cleaner | None = None,
+    ):
+        self._path = None if isinstance(out, io.TextIOBase) or hasattr(out, "write") else Path(out)
+        self._tmp = self._path.with_name(self._path.name + ".tmp") if self._path else None
+        self._file: TextIO | None = None if self._path else out  # type: ignore[assignment]
+        self.joiner = joiner
+        self.normalize = normalize
+        self.trim = trim
+        self.clean = clean
+        self.pieces = 0
+        self.chars = 0
+        self._carry = ""
+        self._epub: EpubWriter | None = None
+
+    def _open(self) -> TextIO:
+        if self._file is None:
+            assert self._tmp is not None
+            self._file = open(self._tmp, "w", encoding="utf-8")
+            if _epub:
+                self._epub = EpubWriter(self._path.with_suffix(".epub"))
+        return self._file
+
+    def write(self, piece: str) -> None:
+        with stage("write"):
+            self._write(piece)
+
+    def _write(self, piece: str) -> None:
+        text = (self.joiner if self.pieces else "") + piece
+        self.pieces += 1
+        if self.normalize is None and not self.trim:
+            self._emit(text)
+            return
+        text = self._carry + text
+        if self.normalize:
+            with stage("normalize"):
+                text = self.normalize(text)
+        if self.trim and not self.chars:
+            text = text.lstrip()
+        m = _CARRY_RE.search(text)
+        cut = m.start() if m else len(text)
+        self._carry = text[cut:]
+        self._emit(text[:cut])
+
+    def writelines(self, pieces: Iterable[str]) -> None:
+        for piece in pieces:
+            self.write(piece)
+
+    def _emit(self, text: str) -> None:
+        if not text:
+            return
+        f = self._open()
+        if self.clean:
+            with stage("clean"):
+                out = self.clean.feed(text)
+        else:
+            out = text
+        f.write(out)
+        f.flush()
+        if self._epub:
+            with stage("epub"):
+                self._epub.write(out)
+        self.chars += len(text)
+
+    def close(self) -> None:
+        with stage("write"):
+            self._close()
+
+    def _close(self) -> None:
+        if not self.pieces:
+            # 什么都没写（例如目录页抓取失败）就不创建输出文件
+            if self._path is None and self._file is not None:
+                self._file.flush()
+            return
+        if self.trim:
+            tail = self._carry.rstrip()
+            self._emit((tail if self.chars else tail.lstrip()) + "\n")
+        else:
+            self._emit(self._carry)
+        self._carry = ""
+        if self.clean:
+            with stage("clean"):
+                tail = self.clean.flush()
+            self._open().write(tail)
+            if self._epub:
+                self._epub.write(tail)
+        if self._epub:
+            with stage("epub"):
+                self._epub.close()
+            self._epub = None
+            print(f"📚 已生成：{self._path.with_suffix('.epub')}")
+        if self._path and self._file:
+            self._file.close()
+            os.replace(self._tmp, self._path)
+
+    def abort(self) -> None:
+        """Drop what was written; an existing output file is left untouched."""
+        if self._epub:
+            self._epub.abort()
+            self._epub = None
+        if self._path and self._file:
+            self._file.close()
+            self._file = None
+            os.unlink(self._tmp)
+
+    def __enter__(self) -> "MarkdownWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
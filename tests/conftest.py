@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# 脚本和 spider 包都在仓库根目录，不需要安装
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,41 @@
+"""The EPUB is only replaced when a build finishes."""
+import zipfile
+
+import pytest
+
+from spider import writer
+from spider.epub import EpubWriter
+
+
+def test_epub_is_renamed_on_close(tmp_path):
+    out = tmp_path / "书.epub"
+    with EpubWriter(out) as book:
+        book.write("# 书\n\n## 第一章\n\n正文\n")
+        assert not out.exists()
+    assert zipfile.ZipFile(out).read("mimetype") == b"application/epub+zip"
+    assert not (tmp_path / "书.epub.tmp").exists()
+
+
+def test_failed_build_keeps_the_old_epub(tmp_path):
+    out = tmp_path / "书.epub"
+    out.write_bytes(b"old")
+    with pytest.raises(RuntimeError):
+        with EpubWriter(out) as book:
+            book.write("# 书\n\n## 第一章\n\n正文")
+            raise RuntimeError("network")
+    assert out.read_bytes() == b"old"
+    assert list(tmp_path.iterdir()) == [out]
+
+
+def test_markdown_writer_aborts_the_epub(tmp_path, monkeypatch):
+    monkeypatch.setattr(writer, "_epub", True)
+    md = tmp_path / "书.md"
+    with pytest.raises(RuntimeError):
+        with writer.MarkdownWriter(md) as w:
+            w.write("# 书\n\n## 第一章\n\n正文\n")
+            raise RuntimeError("network")
+    assert list(tmp_path.iterdir()) == []
+
+    with writer.MarkdownWriter(md) as w:
+        w.write("# 书\n\n## 第一章\n\n正文\n")
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["书.epub", "书.md"]
@@ -0,0 +1,89 @@
+"""What the journal records for failed fetches and failed extractions."""
+import pytest
+
+from spider import journal as journal_mod
+from spider.fetch import FetchResult
+from spider.journal import CrawlJournal, iter_chapters
+from spider.pipeline import ExtractFailed
+
+URLS = ["https://ezoe.work/1.html", "https://ezoe.work/2.html"]
+
+
+def extract(result: FetchResult) -> str:
+    return f"## {result.text}\n"
+
+
+@pytest.fixture
+def responses(monkeypatch):
+    """Status per URL served by a fake ``iter_fetch``."""
+    status = {url: 200 for url in URLS}
+
+    def fake_iter_fetch(urls, window=None, **kwargs):
+        for idx, url in enumerate(urls):
+            code = status[url]
+            yield idx, FetchResult(url, code, f"第{URLS.index(url) + 1}章".encode() if code == 200 else b"",
+                                   error=None if code == 200 else "Service Unavailable")
+
+    monkeypatch.setattr(journal_mod, "iter_fetch", fake_iter_fetch)
+    return status
+
+
+def build(path, **kwargs) -> tuple[CrawlJournal, list[str]]:
+    journal = CrawlJournal(path, "教会的事务", **kwargs)
+    chapters = dict(iter_chapters(URLS, extract, journal))
+    return journal, [chapters[i] for i in range(len(URLS))]
+
+
+def test_failed_refetch_keeps_the_stored_chapter(tmp_path, responses):
+    path = tmp_path / "journal.sqlite3"
+    journal, chapters = build(path)
+    assert chapters == ["## 第1章\n", "## 第2章\n"]
+    journal.close()
+
+    responses[URLS[1]] = 503
+    journal, chapters = build(path, incremental=True)
+    assert chapters == ["## 第1章\n", "## 第2章\n"]
+    assert (journal.finished, journal.failed, journal.changed) == (1, 1, [])
+    assert journal.get(URLS[1]) == "## 第2章\n"
+    status, error = journal._db.execute(
+        "SELECT status, error FROM pages WHERE url = ?", (URLS[1],)).fetchone()
+    assert status == 503 and "Service Unavailable" in error
+    journal.close()
+
+
+def test_failed_first_fetch_is_retried_on_resume(tmp_path, responses):
+    path = tmp_path / "journal.sqlite3"
+    responses[URLS[1]] = 503
+    journal, chapters = build(path)
+    assert chapters == ["## 第1章\n", ""]
+    assert journal.counts() == (1, 1)
+    journal.close()
+
+    responses[URLS[1]] = 200
+    journal, chapters = build(path, resume=True)
+    assert chapters == ["## 第1章\n", "## 第2章\n"]
+    assert journal.counts() == (2, 0)
+    journal.close()
+
+
+def crashing(result: FetchResult) -> str:
+    if result.url == URLS[1]:
+        return ExtractFailed("IndexError: list index out of range")
+    return extract(result)
+
+
+def test_failed_extraction_is_not_marked_done(tmp_path, responses):
+    path = tmp_path / "journal.sqlite3"
+    journal = CrawlJournal(path, "歌中之歌")
+    chapters = dict(iter_chapters(URLS, crashing, journal))
+    assert [chapters[0], chapters[1]] == ["## 第1章\n", ""]
+    assert journal.counts() == (1, 1)
+    assert journal._db.execute("SELECT error FROM pages WHERE url = ?", (URLS[1],)).fetchone() == (
+        "[extract] IndexError: list index out of range",)
+    journal.close()
+
+    journal = CrawlJournal(path, "歌中之歌", resume=True)
+    chapters = dict(iter_chapters(URLS, extract, journal))
+    assert [chapters[0], chapters[1]] == ["## 第1章\n", "## 第2章\n"]
+    assert journal.counts() == (2, 0)
+    journal.close()
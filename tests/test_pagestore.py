@@ -0,0 +1,130 @@
+"""Round trips, dictionary training, concurrent writers and compaction of the page store."""
+import multiprocessing
+import random
+
+import pytest
+
+from spider import pagestore
+from spider.pagestore import PageStore
+
+CODECS = [
+    "zlib",
+    pytest.param("zstd", marks=pytest.mark.skipif(pagestore.zstandard is None, reason="zstandard is not installed")),
+]
+
+
+def page(n: int, seed: int = 0) -> bytes:
+    rnd = random.Random(seed * 100000 + n)
+    text = "".join(rnd.choice("主神灵恩典平安喜乐") for _ in range(rnd.randint(200, 2000)))
+    return (f"<html><head><title>第{n}篇</title></head><body><div class='feature-title'>教会的事务</div>"
+            f"<div class='main'>{text}</div></body></html>").encode("utf-8")
+
+
+@pytest.mark.parametrize("codec", CODECS)
+def test_round_trip(tmp_path, codec):
+    store = PageStore(tmp_path, codec=codec, train_after=8)
+    urls = {f"https://ezoe.work/books/3/3007-{n}.html": page(n) for n in range(40)}
+    for url, body in urls.items():
+        store.put(url, body)
+    assert store.stats()[0]["dict"] > 0
+    for url, body in urls.items():
+        assert store.get(url) == body
+        with store.open(url) as f:
+            assert f.read() == body
+    store.close()
+
+
+@pytest.mark.skipif(pagestore.zstandard is None, reason="zstandard is not installed")
+def test_zstd_training_failure_keeps_storing(tmp_path):
+    # 几页很短的正文训练不出 zstd 字典，put 不能因此失败
+    store = PageStore(tmp_path, codec="zstd", train_after=2)
+    bodies = {f"https://example.org/{n}": f"<p>{n}</p>".encode() for n in range(6)}
+    for url, body in bodies.items():
+        store.put(url, body)
+    assert store.stats()[0]["dict"] == 0
+    assert all(store.get(url) == body for url, body in bodies.items())
+    assert store.compact("example.org")[1] > 0
+    assert all(store.get(url) == body for url, body in bodies.items())
+    store.close()
+
+
+def _writer(root: str, seed: int) -> None:
+    store = PageStore(root, codec="zlib", train_after=16)
+    for n in range(150):
+        store.put(f"https://ezoe.work/{seed}/{n}.html", page(n, seed))
+    store.close()
+
+
+def test_processes_share_a_pack(tmp_path):
+    ctx = multiprocessing.get_context("spawn")
+    procs = [ctx.Process(target=_writer, args=(str(tmp_path), seed)) for seed in range(3)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+        assert p.exitcode == 0
+    store = PageStore(tmp_path, codec="zlib")
+    for seed in range(3):
+        for n in range(150):
+            assert store.get(f"https://ezoe.work/{seed}/{n}.html") == page(n, seed)
+    store.close()
+
+
+def test_failed_compaction_leaves_the_store_readable(tmp_path, monkeypatch):
+    store = PageStore(tmp_path, codec="zlib", train_after=8)
+    urls = {f"https://ezoe.work/{n}.html": page(n) for n in range(30)}
+    for url, body in urls.items():
+        store.put(url, body)
+
+    calls = 0
+    compress = pagestore.compress
+
+    def failing(*args):
+        nonlocal calls
+        calls += 1
+        if calls > 10:
+            raise OSError("disk full")
+        return compress(*args)
+
+    monkeypatch.setattr(pagestore, "compress", failing)
+    with pytest.raises(OSError):
+        store.compact("ezoe.work")
+    monkeypatch.setattr(pagestore, "compress", compress)
+    assert all(store.get(url) == body for url, body in urls.items())
+
+    store.compact("ezoe.work")
+    assert all(store.get(url) == body for url, body in urls.items())
+    # 失败那次写了一半的 pack 已删掉；压缩成功后只剩新的 pack
+    assert [p.name for p in (tmp_path / "ezoe.work").glob("pack*")] == ["pack.1"]
+    store.close()
+
+
+@pytest.mark.parametrize("codec", CODECS)
+def test_failed_compaction_does_not_reuse_its_dictionary(tmp_path, monkeypatch, codec):
+    store = PageStore(tmp_path, codec=codec, train_after=8)
+    urls = {f"https://ezoe.work/{n}.html": page(n) for n in range(30)}
+    for url, body in urls.items():
+        store.put(url, body)
+
+    compress = pagestore.compress
+
+    def failing(*args):
+        raise OSError("disk full")
+
+    # 压缩失败时新字典已经训练好了，回滚后它不能再被别的字典顶替编号
+    monkeypatch.setattr(pagestore, "compress", failing)
+    with pytest.raises(OSError):
+        store.compact("ezoe.work")
+    monkeypatch.setattr(pagestore, "compress", compress)
+    for n in range(30, 90):
+        urls[f"https://ezoe.work/{n}.html"] = page(n, 1)
+        store.put(f"https://ezoe.work/{n}.html", page(n, 1))
+    store.compact("ezoe.work")
+    for n in range(90, 100):
+        urls[f"https://ezoe.work/{n}.html"] = page(n, 2)
+        store.put(f"https://ezoe.work/{n}.html", page(n, 2))
+    store.close()
+
+    store = PageStore(tmp_path, codec=codec)
+    assert all(store.get(url) == body for url, body in urls.items())
+    store.close()
@@ -0,0 +1,80 @@
+"""Every parser backend gives the same Markdown as html.parser on the fixture pages."""
+import json
+
+import pytest
+
+from spider import parse
+from spider.bench import FIXTURES
+from spider.scripts import get_extractor
+
+PAGES = json.loads((FIXTURES / "manifest.json").read_text(encoding="utf-8"))
+OTHER_BACKENDS = [name for name in parse.BACKENDS if name != parse.DEFAULT_BACKEND]
+
+
+def read_fixture(entry: dict) -> str:
+    return (FIXTURES / entry["file"]).read_bytes().decode(entry["encoding"], errors="replace")
+
+
+@pytest.fixture
+def backend(request):
+    name = request.param
+    if not parse.backend_available(name):
+        pytest.skip(f"{name} is not installed")
+    previous = parse.get_backend()
+    parse.set_backend(name)
+    yield name
+    parse.set_backend(previous)
+
+
+@pytest.mark.parametrize("backend", OTHER_BACKENDS, indirect=True)
+@pytest.mark.parametrize("entry", PAGES, ids=[entry["file"] for entry in PAGES])
+def test_backend_matches_html_parser(entry, backend):
+    extract = get_extractor(entry["site"])
+    html = read_fixture(entry)
+    md = extract(html)
+    parse.set_backend(parse.DEFAULT_BACKEND)
+    reference = extract(html)
+    assert reference.strip()
+    assert md == reference
+
+
+def test_compare_backends_switches_the_parser():
+    seen = []
+
+    def extract(html):
+        seen.append((parse.get_backend(), type(parse.make_soup(html).builder).__module__))
+        return ""
+
+    backends = parse.available_backends()
+    results = parse.compare_backends(extract, "<p>x</p>", backends)
+    assert list(results) == backends
+    assert [name for name, _ in seen] == backends
+    # 每个后端用的是各自的 tree builder，不是全都落到 html.parser
+    assert len({module for _, module in seen}) == len(backends)
+
+
+# runpy 提醒 spider.parse 已经导入过；这里要的正是这种情况
+@pytest.mark.filterwarnings("ignore:'spider.parse' found in sys.modules")
+def test_cli_runs_every_backend(monkeypatch, capsys):
+    import runpy
+    import sys
+
+    import bs4
+
+    features = []
+    init = bs4.BeautifulSoup.__init__
+
+    def recording_init(self, markup="", *args, **kwargs):
+        if markup:
+            features.append(args[0] if args else kwargs.get("features"))
+        init(self, markup, *args, **kwargs)
+
+    monkeypatch.setattr(bs4.BeautifulSoup, "__init__", recording_init)
+    entry = next(e for e in PAGES if e["site"] == "church-affairs")
+    monkeypatch.setattr(sys, "argv", ["spider.parse", "church-affairs", str(FIXTURES / entry["file"])])
+    with pytest.raises(SystemExit) as exit_info:
+        runpy.run_module("spider.parse", run_name="__main__")
+    assert exit_info.value.code == 0
+    # python -m spider.parse 运行在 __main__ 里，切换的必须是 spider.parse 的后端
+    assert features == parse.available_backends()
+    assert "❌" not in capsys.readouterr().out
@@ -0,0 +1,132 @@
+"""Splitting a book into parts, rendering only changed parts, and merging the part PDFs."""
+import sys
+import textwrap
+
+import pytest
+
+from spider import pdf
+
+pytestmark = pytest.mark.skipif(pdf.PdfWriter is None, reason="pypdf is not installed")
+
+
+def test_split_at_volumes_only():
+    twelve = "# 十二篮\n\n## 第一辑\n\n### 第一篇\n\n正文\n\n## 第二辑\n\n### 第一篇\n\n正文\n"
+    assert ["".join(p).split("\n")[0] for p in pdf.split_parts(twelve.splitlines(True))] == ["# 十二篮", "## 第二辑"]
+    # 按章的书不拆：拆开后每章都会另起一页，页码也从 1 重新开始
+    chapters = "# 教会的事务\n\n## 灵，将来。\n\n正文\n\n## 我们盼望\n\n正文\n"
+    assert len(list(pdf.split_parts(chapters.splitlines(True)))) == 1
+    assert len(list(pdf.split_parts(chapters.splitlines(True), r"## "))) == 2
+
+
+def write_part(path, pages: int, outline: list) -> None:
+    """A blank PDF with ``pages`` pages and bookmarks given as (title, page, [children])."""
+    writer = pdf.PdfWriter()
+    for _ in range(pages):
+        writer.add_blank_page(width=200, height=200)
+
+    def add(items, parent=None):
+        for title, page, children in items:
+            add(children, writer.add_outline_item(title, page, parent=parent))
+
+    add(outline)
+    with open(path, "wb") as f:
+        writer.write(f)
+
+
+def flatten(reader, items, depth=0) -> list[tuple[int, str, int]]:
+    out = []
+    for item in items:
+        if isinstance(item, list):
+            out += flatten(reader, item, depth + 1)
+        else:
+            out.append((depth, item.title, reader.get_destination_page_number(item)))
+    return out
+
+
+def test_merge_shifts_bookmarks(tmp_path):
+    first, second, out = tmp_path / "000.pdf", tmp_path / "001.pdf", tmp_path / "十二篮.pdf"
+    # 第一部分带着书名这一级书签（# 标题在第一部分里），第二部分没有
+    write_part(first, 3, [("十二篮", 0, [("第一册", 0, [("第一篇", 1, []), ("第二篇", 2, [])])])])
+    write_part(second, 2, [("第二册", 0, [("第一篇", 1, [])])])
+
+    assert pdf.merge([first, second], out, "十二篮") == 5
+
+    reader = pdf.PdfReader(out)
+    assert len(reader.pages) == 5
+    assert flatten(reader, reader.outline) == [
+        (0, "十二篮", 0),
+        (1, "第一册", 0),
+        (2, "第一篇", 1),
+        (2, "第二篇", 2),
+        (1, "第二册", 3),
+        (2, "第一篇", 4),
+    ]
+
+
+def test_merge_adds_a_title_bookmark(tmp_path):
+    first, second, out = tmp_path / "000.pdf", tmp_path / "001.pdf", tmp_path / "book.pdf"
+    write_part(first, 2, [("第一章", 0, []), ("第二章", 1, [])])
+    write_part(second, 1, [("第三章", 0, [])])
+
+    assert pdf.merge([first, second], out, "教会的事务") == 3
+
+    reader = pdf.PdfReader(out)
+    assert flatten(reader, reader.outline) == [
+        (0, "教会的事务", 0),
+        (1, "第一章", 0),
+        (1, "第二章", 1),
+        (1, "第三章", 2),
+    ]
+
+
+RENDERER = '''
+import sys
+from pypdf import PdfWriter
+
+# md-to-pdf 的替身：每个 .md 生成一页，书签是其中的 ## 标题
+args = sys.argv[1:]
+for md in args[:args.index("--basedir")]:
+    writer = PdfWriter()
+    writer.add_blank_page(width=200, height=200)
+    for line in open(md, encoding="utf-8"):
+        if line.startswith("## "):
+            writer.add_outline_item(line[3:].strip(), 0)
+    with open(md[:-3] + ".pdf", "wb") as f:
+        writer.write(f)
+    print(md)
+'''
+
+
+def test_build_renders_only_changed_parts(tmp_path, capfd):
+    renderer = tmp_path / "renderer.py"
+    renderer.write_text(RENDERER, encoding="utf-8")
+    book = tmp_path / "书.md"
+    book.write_text(textwrap.dedent("""\
+        # 书
+
+        ## 第一辑
+
+        一
+
+        ## 第二辑
+
+        二
+
+        ## 第三辑
+
+        三
+        """), encoding="utf-8")
+    root = tmp_path / "parts"
+    command = f"{sys.executable} {renderer}"
+
+    out = pdf.build_pdf(book, root=root, renderer=command)
+    reader = pdf.PdfReader(out)
+    assert len(reader.pages) == 3
+    assert flatten(reader, reader.outline) == [(0, "书", 0), (1, "第一辑", 0), (1, "第二辑", 1), (1, "第三辑", 2)]
+    assert "3 to render" in capfd.readouterr().out
+
+    book.write_text(book.read_text(encoding="utf-8").replace("二\n", "贰\n"), encoding="utf-8")
+    pdf.build_pdf(book, root=root, renderer=command)
+    rendered = capfd.readouterr().out
+    assert "1 to render" in rendered
+    assert "001.md" in rendered and "000.md" not in rendered
@@ -0,0 +1,80 @@
+"""Which source URL each indexed paragraph gets."""
+import textwrap
+
+from spider.search import iter_paragraphs
+
+
+def urls(markdown: str) -> list[tuple[str, str | None]]:
+    return [(p.text, p.url) for p in iter_paragraphs(textwrap.dedent(markdown).splitlines())]
+
+
+def test_link_after_the_chapter_covers_the_chapter():
+    # 教会的事务：链接写在每章正文之后
+    assert urls("""\
+        # 教会的事务
+
+        ## 第一章
+
+        ### 壹　复活
+
+        #### 一　盼望
+
+        第一段
+
+        第二段
+
+        [原文链接](https://ezoe.work/1.html)
+
+        ## 第二章
+
+        第三段
+
+        [原文链接](https://ezoe.work/2.html)
+
+        第四段
+
+        [原文链接](https://ezoe.work/3.html)
+        """) == [
+        ("教会的事务", None),
+        ("第一章", "https://ezoe.work/1.html"),
+        ("壹　复活", "https://ezoe.work/1.html"),
+        ("一　盼望", "https://ezoe.work/1.html"),
+        ("第一段", "https://ezoe.work/1.html"),
+        ("第二段", "https://ezoe.work/1.html"),
+        ("第二章", "https://ezoe.work/2.html"),
+        ("第三段", "https://ezoe.work/2.html"),
+        # 抓不到标题的一章：正文接在上一章的链接之后
+        ("第四段", "https://ezoe.work/3.html"),
+    ]
+
+
+def test_link_under_a_heading_covers_its_section():
+    # 十二篮：链接紧跟在每篇的标题下
+    assert urls("""\
+        # 十二篮
+
+        ## 第一辑
+
+        ### 第一篇
+
+        [原文链接](http://example.org/1.htm)
+
+        正文一
+
+        ### 第二篇
+
+        [原文链接](http://example.org/2.htm)
+
+        正文二
+        """) == [
+        ("十二篮", None),
+        ("第一辑", None),
+        ("第一篇", "http://example.org/1.htm"),
+        ("正文一", "http://example.org/1.htm"),
+        ("第二篇", "http://example.org/2.htm"),
+        ("正文二", "http://example.org/2.htm"),
+    ]
+
+
+def test_book_without_links():
+    assert urls("# 书\n\n## 一\n\n正文\n") == [("书", None), ("一", None), ("正文", None)]
@@ -0,0 +1,35 @@
+"""Verse store lookups by traditional and simplified book names."""
+import pytest
+
+from spider.verses import VerseStore, VerseStoreWriter
+
+# 维基文库子页面用的繁体书名，以及常见的简体写法
+BOOKS = {
+    "創世記": "创世记", "民數記": "民数记", "約書亞記": "约书亚记", "列王紀上": "列王纪上",
+    "歷代志下": "历代志下", "詩篇": "诗篇", "傳道書": "传道书", "以賽亞書": "以赛亚书",
+    "以西結書": "以西结书", "彌迦書": "弥迦书", "那鴻書": "那鸿书", "哈該書": "哈该书",
+    "瑪拉基書": "玛拉基书", "馬太福音": "马太福音", "約翰福音": "约翰福音", "使徒行傳": "使徒行传",
+    "羅馬書": "罗马书", "哥林多後書": "哥林多后书", "腓利門書": "腓利门书", "希伯來書": "希伯来书",
+    "猶大書": "犹大书", "啟示錄": "启示录",
+}
+
+
+@pytest.fixture
+def store(tmp_path):
+    path = tmp_path / "bible.verses"
+    with VerseStoreWriter(path) as writer:
+        for title in BOOKS:
+            writer.add_markdown(title, title, f"# {title}\n\n## 第三章\n\n16 {title}三章十六节\n17 下一节\n")
+    with VerseStore(path) as store:
+        yield store
+
+
+@pytest.mark.parametrize("traditional, simple", BOOKS.items())
+def test_simplified_names_find_the_book(store, traditional, simple):
+    assert store.book_id(simple) == store.book_id(traditional)
+    assert store.lookup(f"{simple} 3:16") == [((store.book_id(traditional), 3, 16), f"{traditional}三章十六节")]
+
+
+def test_unknown_book(store):
+    with pytest.raises(KeyError):
+        store.book_id("多俾亚传")